@@ -0,0 +1,358 @@
+#!/usr/local/bin/python
+# Module bench_graphingBFS.py
+""" Benchmarks for graphingBFS.py.
+
+    Measures the memory held per edge by the node object and compact (CSR) Graph backends once a graph has been
+    connected and routed. The user supplied adjacency dictionary is built before measuring starts, so only the
+    memory owned by the Graph is counted.
+
+    Times minimum hop-count routing with the node object (legacy) BFS, the index based BFS and, when NumPy is
+    installed, the vectorised frontier BFS.
+
+    Times graph startup: building from the adjacency dictionary versus reloading a memory mapped snapshot.
+
+    Times the k = 8 best routes between random node pairs for each Routing type, on the random graph and on a
+    torus of the same size: the torus' long routes give Yen's algorithm hundreds of spur nodes per route.
+
+    The suite mode runs every phase of a graph's life (Graph.__init__, connectAdj, routing for each Routing type
+    and path extraction) over seeded synthetic topologies - random sparse, scale-free, grid, torus and fat-tree -
+    across sizes, directed and undirected, recording wall time and peak memory in a JSON file. Given a baseline
+    JSON file from an earlier run it reports the phases that got slower than the tolerance and exits non-zero.
+    The default sizes stop at 1e5 nodes so a run fits a CI job: at 1e6 nodes the node object backend and the
+    memory tracing of every topology take far longer, so name the topologies and backends to measure, e.g.
+        python bench_graphingBFS.py suite --sizes 100 1000 10000 100000 1000000 --topologies random torus \
+            --backends compact --no-memory
+
+    Usage: python bench_graphingBFS.py [numNodes] [avgDegree]
+           python bench_graphingBFS.py suite [--sizes 100 1000 ...] [--topologies random torus ...]
+                                             [--backends object compact] [--output results.json]
+                                             [--baseline baseline.json] [--tolerance 0.25] [--min-seconds 0.005]
+                                             [--repeat 1] [--no-memory]
+"""
+from graphingBFS import *
+import argparse
+import gc
+import json
+import logging
+import math
+import platform
+import random
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def randomAdjDict(numNodes, avgDegree, seed=1):
+    """ Returns a seeded random sparse node adjacency dictionary with about numNodes * avgDegree edges """
+    rand = random.Random(seed)
+    names = ["n%i" % i for i in range(numNodes)]
+    return {nodeName: [(names[rand.randrange(numNodes)], rand.randint(1, 100)) for _ in range(avgDegree)]
+            for nodeName in names}
+
+
+def scaleFreeAdjDict(numNodes, edgesPerNode=2, seed=1):
+    """ Returns a seeded scale-free node adjacency dictionary grown by preferential attachment (Barabasi-Albert):
+        each new node links to edgesPerNode distinct earlier nodes picked in proportion to their degree
+    """
+    rand = random.Random(seed)
+    names = ["n%i" % i for i in range(numNodes)]
+    nodeAdjDict = {nodeName: [] for nodeName in names}
+    linkEnds = []  # every link end so far, a node appears once per link it is on
+    for nodeIdx in range(1, numNodes):
+        adjIdxs = set()
+        while len(adjIdxs) < min(edgesPerNode, nodeIdx):
+            adjIdxs.add(rand.choice(linkEnds) if linkEnds and rand.random() < 0.9 else rand.randrange(nodeIdx))
+        for adjIdx in adjIdxs:
+            nodeAdjDict[names[nodeIdx]].append((names[adjIdx], rand.randint(1, 100)))
+            linkEnds += (nodeIdx, adjIdx)
+    return nodeAdjDict
+
+
+def gridAdjDict(numNodes, seed=1, wrap=False):
+    """ Returns a seeded square grid (wrap=True: torus) node adjacency dictionary of about numNodes nodes, each
+        node linked to its right and lower neighbour
+    """
+    rand = random.Random(seed)
+    side = max(2, round(math.sqrt(numNodes)))
+    names = [["%i,%i" % (row, col) for col in range(side)] for row in range(side)]
+    nodeAdjDict = {}
+    for row in range(side):
+        for col in range(side):
+            adjacencies = []
+            if wrap or col + 1 < side:
+                adjacencies.append((names[row][(col + 1) % side], rand.randint(1, 100)))
+            if wrap or row + 1 < side:
+                adjacencies.append((names[(row + 1) % side][col], rand.randint(1, 100)))
+            nodeAdjDict[names[row][col]] = adjacencies
+    return nodeAdjDict
+
+
+def torusAdjDict(numNodes, seed=1):
+    """ Returns a seeded square torus node adjacency dictionary of about numNodes nodes """
+    return gridAdjDict(numNodes, seed, wrap=True)
+
+
+def fatTreeAdjDict(numNodes, seed=1):
+    """ Returns a k-ary fat-tree data centre node adjacency dictionary with the smallest even k giving at least
+        numNodes nodes: (k/2)^2 core switches, k pods of k/2 aggregation and k/2 edge switches, and k/2 hosts
+        per edge switch. Link values are the link bandwidths (10 host, 40 edge-aggregation, 100 core) with a
+        seeded jitter of up to 10% so routes are not all ties.
+    """
+    rand = random.Random(seed)
+    k = 2
+    while k ** 3 // 4 + 5 * k * k // 4 < numNodes:
+        k += 2
+    half = k // 2
+
+    def link(bandwidth):
+        return bandwidth - rand.randint(0, bandwidth // 10)
+
+    nodeAdjDict = {"core%i" % core: [] for core in range(half * half)}
+    for pod in range(k):
+        for agg in range(half):
+            nodeAdjDict["agg%i.%i" % (pod, agg)] = [("core%i" % (agg * half + core), link(100))
+                                                    for core in range(half)]
+        for edge in range(half):
+            nodeAdjDict["edge%i.%i" % (pod, edge)] = [("agg%i.%i" % (pod, agg), link(40)) for agg in range(half)]
+            for host in range(half):
+                nodeAdjDict["host%i.%i.%i" % (pod, edge, host)] = [("edge%i.%i" % (pod, edge), link(10))]
+    return nodeAdjDict
+
+
+# suite topology generators: name -> f(numNodes, seed)
+TOPOLOGIES = {"random": lambda numNodes, seed: randomAdjDict(numNodes, 4, seed),
+              "scaleFree": scaleFreeAdjDict,
+              "grid": gridAdjDict,
+              "torus": torusAdjDict,
+              "fatTree": fatTreeAdjDict}
+
+
+def memoryPerEdge(nodeAdjDict, directed, compact, logger):
+    """ Returns (bytes held by a connected and routed Graph, number of edges, bytes per edge) """
+    numEdges = sum(len(adjacencies) for adjacencies in nodeAdjDict.values())
+    tracemalloc.start()
+    graph = Graph(nodeAdjDict, directed, logger, compact=compact, quiet=True)
+    graph.routeFromN1toN2(graph.nodeNames[0], graph.nodeNames[0], Routing.leastCost)
+    heldBytes, peakBytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del graph
+    return heldBytes, numEdges, heldBytes / numEdges
+
+
+def timeHopCountEngines(nodeAdjDict, directed, logger):
+    """ Returns {engine name: seconds} to route minimum hop-count from the first node, topology already connected.
+        The object BFS runs on the node object backend, the index based engines on the compact backend.
+    """
+    engines = [("object BFS", False, Engine.legacyBfs), ("index BFS", True, Engine.default)]
+    if numpy is not None:
+        engines.append(("vectorised BFS", True, Engine.vectorised))
+    timings = {}
+    for engineName, compact, engine in engines:
+        graph = Graph(nodeAdjDict, directed, logger, compact=compact, quiet=True)
+        rootNm = graph.nodeNames[0]
+        graph.routeFromN1toN2(rootNm, rootNm, Routing.minHopCount)  # connect outside the timings
+        graph.routeCache.clear()  # time the routing, not a cache hit
+        start = time.perf_counter()
+        graph.routeFromN1toN2(rootNm, rootNm, Routing.minHopCount, engine)
+        timings[engineName] = time.perf_counter() - start
+    return timings
+
+
+def timeStartup(nodeAdjDict, directed, logger):
+    """ Returns {startup name: seconds} until a least-cost route can run: build from the dictionary and connect,
+        versus reload of a snapshot of the same graph, memory mapped and read
+    """
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmpDir:
+        start = time.perf_counter()
+        graph = Graph(nodeAdjDict, directed, logger, compact=True, quiet=True)
+        graph.compactTopology(Routing.leastCost)
+        timings["dictionary build"] = time.perf_counter() - start
+
+        snapshotPath = os.path.join(tmpDir, "graph.snapshot")
+        graph.save(snapshotPath)
+        for startupName, mmap in (("mapped snapshot", True), ("read snapshot", False)):
+            start = time.perf_counter()
+            Graph.load(snapshotPath, logger, mmap=mmap, quiet=True).compactTopology(Routing.leastCost)
+            timings[startupName] = time.perf_counter() - start
+    return timings
+
+
+def timeAlternatePaths(nodeAdjDict, directed, logger, k=8, numQueries=3, seed=1):
+    """ Returns {routing type name: seconds} of the slowest of numQueries kShortestPaths() queries for k routes
+        between seeded random node pairs, topology already connected
+    """
+    graph = Graph(nodeAdjDict, directed, logger, compact=True, quiet=True)
+    rand = random.Random(seed)
+    pairs = [rand.sample(graph.nodeNames, 2) for _ in range(numQueries)]
+    timings = {}
+    for routingType in Routing:
+        graph.kShortestPaths(pairs[0][0], pairs[0][0], routingType, k)  # connect outside the timings
+        timings[routingType.name] = 0
+        for node1Name, node2Name in pairs:
+            start = time.perf_counter()
+            graph.kShortestPaths(node1Name, node2Name, routingType, k)
+            timings[routingType.name] = max(timings[routingType.name], time.perf_counter() - start)
+    return timings
+
+
+def _timePhases(nodeAdjDict, directed, compact, logger, phases):
+    """ Runs the graph life cycle phases, calling phases(phaseName, fn) to run and measure each one. The routing
+        types share connected topologies (leastCost and minHopCount both merge by "min"), so the topology caches
+        are dropped before each connectAdj phase to time a build rather than a cache hit.
+    """
+    graph = phases("init", lambda: Graph(nodeAdjDict, directed, logger, compact=compact, quiet=True))
+    rootNm = graph.nodeNames[0]
+    for routingType in Routing:
+        graph.routingType = routingType
+        graph.dropTopologyCaches()
+        phases("connectAdj." + routingType.name, graph.connectAdj)
+        graph.routeCache.clear()
+        phases("route." + routingType.name, lambda: graph.routeFromN1toN2(rootNm, rootNm, routingType))
+        phases("paths." + routingType.name, lambda: sum(1 for _ in graph.iterPaths()))
+
+
+def benchmarkCase(nodeAdjDict, directed, compact, logger, memory=True, repeat=1):
+    """ Returns {phase name: {"seconds": wall time, "peakBytes": peak traced memory or None}} of a Graph life
+        cycle on nodeAdjDict, the best time of repeat runs. Peak memory is traced in a separate run so tracing
+        doesn't slow the timed runs.
+    """
+    results = {}
+
+    def timed(phaseName, fn):
+        gc.collect()  # don't charge the phase for collecting the garbage of the previous one
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        if phaseName not in results or seconds < results[phaseName]["seconds"]:
+            results[phaseName] = {"seconds": seconds, "peakBytes": None}
+        return result
+
+    def traced(phaseName, fn):
+        tracemalloc.reset_peak()
+        heldBytes = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        results[phaseName]["peakBytes"] = tracemalloc.get_traced_memory()[1] - heldBytes
+        return result
+
+    for _ in range(repeat):
+        _timePhases(nodeAdjDict, directed, compact, logger, timed)
+    if memory:
+        tracemalloc.start()
+        try:
+            _timePhases(nodeAdjDict, directed, compact, logger, traced)
+        finally:
+            tracemalloc.stop()
+    return results
+
+
+def runSuite(sizes, topologies, backends, logger, memory=True, seed=1, repeat=1):
+    """ Returns the suite results: one record per (topology, size, direction, backend, phase) """
+    records = []
+    for topologyName in topologies:
+        for numNodes in sizes:
+            nodeAdjDict = TOPOLOGIES[topologyName](numNodes, seed)
+            numEdges = sum(len(adjacencies) for adjacencies in nodeAdjDict.values())
+            for directed in (True, False):
+                for backend in backends:
+                    case = {"topology": topologyName, "size": numNodes, "nodes": len(nodeAdjDict),
+                            "edges": numEdges, "directed": directed, "backend": backend}
+                    results = benchmarkCase(nodeAdjDict, directed, backend == "compact", logger, memory, repeat)
+                    records += [dict(case, phase=phaseName, **measured) for phaseName, measured in results.items()]
+                    print("%s %i nodes %s %s: %.3fs" % (topologyName, len(nodeAdjDict),
+                          "directed" if directed else "undirected", backend,
+                          sum(measured["seconds"] for measured in results.values())), file=sys.stderr)
+    return records
+
+
+def _caseKey(record):
+    return record["topology"], record["size"], record["directed"], record["backend"], record["phase"]
+
+
+def compareResults(records, baselineRecords, tolerance, minSeconds=0.005):
+    """ Returns [(record, baseline seconds, ratio)] of the phases more than tolerance (a fraction) slower than in
+        the baseline. Phases missing from the baseline, or taking under minSeconds in both runs (timer noise),
+        are not compared.
+    """
+    baseline = {_caseKey(record): record for record in baselineRecords}
+    regressions = []
+    for record in records:
+        baselineRecord = baseline.get(_caseKey(record))
+        if baselineRecord is None or max(record["seconds"], baselineRecord["seconds"]) < minSeconds:
+            continue
+        ratio = record["seconds"] / baselineRecord["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append((record, baselineRecord["seconds"], ratio))
+    return regressions
+
+
+def suiteMain(argv, logger):
+    """ Command line entry of the suite mode, returns the process exit status """
+    parser = argparse.ArgumentParser(prog="bench_graphingBFS.py suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--topologies", nargs="+", choices=sorted(TOPOLOGIES), default=list(TOPOLOGIES))
+    parser.add_argument("--backends", nargs="+", choices=["object", "compact"], default=["object", "compact"])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slow down, 0.25 = 25%%")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="don't compare phases faster than this")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per case, the best is kept")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the peak memory run")
+    args = parser.parse_args(argv)
+
+    records = runSuite(args.sizes, args.topologies, args.backends, logger, args.memory, args.seed, args.repeat)
+    with open(args.output, "w") as resultsFile:
+        json.dump({"python": platform.python_version(), "platform": platform.platform(), "seed": args.seed,
+                   "numpy": numpy is not None, "results": records}, resultsFile, indent=1)
+    print("Wrote %i results to %s" % (len(records), args.output))
+
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as baselineFile:
+        regressions = compareResults(records, json.load(baselineFile)["results"], args.tolerance, args.min_seconds)
+    for record, baselineSeconds, ratio in regressions:
+        print("REGRESSION %s %i nodes %s %s %s: %.4fs vs %.4fs baseline (x%.2f)"
+              % (record["topology"], record["nodes"], "directed" if record["directed"] else "undirected",
+                 record["backend"], record["phase"], record["seconds"], baselineSeconds, ratio))
+    print("%i of %i phases slower than the baseline by more than %i%%"
+          % (len(regressions), len(records), round(args.tolerance * 100)))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    logger = logging.getLogger("Graphing")
+    logger.setLevel(logging.CRITICAL)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "suite":
+        sys.exit(suiteMain(sys.argv[2:], logger))
+
+    numNodes = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    avgDegree = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    nodeAdjDict = randomAdjDict(numNodes, avgDegree)
+
+    for directed in (True, False):
+        for compact in (False, True):
+            heldBytes, numEdges, bytesPerEdge = memoryPerEdge(nodeAdjDict, directed, compact, logger)
+            print("%s graph, %s backend: %i nodes, %i edges, %.1f MB held, %.1f bytes per edge"
+                  % ("Directed" if directed else "Undirected", "compact" if compact else "object", numNodes,
+                     numEdges, heldBytes / 1e6, bytesPerEdge))
+
+    for directed in (True, False):
+        timings = timeHopCountEngines(nodeAdjDict, directed, logger)
+        print("%s graph, minimum hop-count: %s" % ("Directed" if directed else "Undirected",
+              ", ".join("%s %.3fs" % (engineName, seconds) for engineName, seconds in timings.items())))
+
+    for directed in (True, False):
+        timings = timeStartup(nodeAdjDict, directed, logger)
+        print("%s graph, startup: %s" % ("Directed" if directed else "Undirected",
+              ", ".join("%s %.3fs" % (startupName, seconds) for startupName, seconds in timings.items())))
+
+    for topologyName, topologyAdjDict in (("random", nodeAdjDict), ("torus", torusAdjDict(numNodes))):
+        for directed in (True, False):
+            timings = timeAlternatePaths(topologyAdjDict, directed, logger)
+            print("%s %s graph, 8 best routes (slowest query): %s"
+                  % ("Directed" if directed else "Undirected", topologyName,
+                     ", ".join("%s %.3fs" % (routingName, seconds) for routingName, seconds in timings.items())))
@@ -19,9 +19,31 @@
     the root.
 """
 from collections import deque  # use a deque for an efficient node processing queue
+from collections import OrderedDict  # recency order of the route cache
+from array import array  # compact typed buffers for the index based topology and route tables
+import asyncio
+import bisect
+import concurrent.futures
+import contextlib
+import csv
+import heapq  # priority queue for the Dijkstra / widest path engines
+import io
+import itertools
+import json
+import mmap as mmapModule  # zero-copy reload of graph snapshots
+import struct
+import sys
+import threading
 import time
 import logging
 import enum
+import typing
+import zlib  # fingerprints of the topologies an index was built for
+
+try:
+    import numpy  # optional, only needed by Engine.vectorised
+except ImportError:
+    numpy = None
 
 
 class Routing(enum.Enum):
@@ -30,6 +52,23 @@ class Routing(enum.Enum):
     minHopCount = 2
 
 
+_ROUTING_TYPE_STRS = {Routing.leastCost: "Least-cost", Routing.bestBandwidth: "Best-bandwidth",
+                      Routing.minHopCount: "Minimum hop-count"}
+
+
+class Engine(enum.Enum):
+    """ Selects the algorithm routeFromN1toN2() uses. 'default' picks the engine by Routing type: Dijkstra for
+        least-cost, a max-bottleneck (widest path) Dijkstra variant for best-bandwidth and plain BFS for hop-count.
+        'legacyBfs' is the original FIFO BFS with back-patching of upstream nodes, kept for comparison.
+        'vectorised' is a level-synchronous BFS expanding whole frontiers with NumPy, for minimum hop-count only.
+        'sharded' routes across the worker processes set up by Graph.shard(), one per partition of the graph.
+    """
+    default = 0
+    legacyBfs = 1
+    vectorised = 2
+    sharded = 3
+
+
 class Node(object):
     """ Node Object is used by the Graph Object to hold each nodes adjacencies, edge values, hops from a given
         root etc. In C++ parlance it is considered a 'friend class' to the User interface Graph Ojbect.
@@ -38,14 +77,22 @@ class Node(object):
     def __init__(self, nodeName):
         self.name = nodeName
         self.adjacencies = []  # list of tuples (adjObject, edge_cost)
+        self.predecessors = []  # reverse adjacency index: list of tuples (nodeObject pointing to us, edge_cost)
         self.numHopsFromRoot = -1  # aka level
         self.upstreamNodeToRoot = self
         self.valueToRoot = -1  # calculated edge value based on least cost or bw as selected
         self.lowestBwPipeToRoot = 999  # tracts smallest pipe upstream of us
 
     def resetNode(self):
-        """ Used by Graph.connect() to clear out an old route of the same graph (perhaps with a different constraint)"""
+        """ Clears out the node's adjacencies as well as any old route """
         self.adjacencies = []  # list of tuples (adjObject, edgeCost)
+        self.predecessors = []  # list of tuples (predObject, edgeCost)
+        self.resetRoute()
+
+    def resetRoute(self):
+        """ Used by Graph.routeFromN1toN2() to clear out an old route of the same graph (perhaps with a different
+            constraint). The adjacencies are left alone as the Graph caches and re-attaches them.
+        """
         self.numHopsFromRoot = -1  # aka level
         self.upstreamNodeToRoot = self
         self.valueToRoot = -1  # calculated edge value based on least cost or bw as selected
@@ -66,33 +113,2004 @@ class Node(object):
         print("Node: {} - Adjacency list: {}" .format(self.name, adjNames))
 
 
+class CompactTopology(typing.NamedTuple):
+    """ Immutable, index based copy of a connected topology in Compressed Sparse Row (CSR) form. The adjacencies
+        of node i are targets[offsets[i]:offsets[i + 1]] with the matching edge values in weights. Being plain
+        typed arrays it is cheap to hand to worker processes. The buffers are either arrays or, for a topology
+        reloaded from a snapshot, typed memoryviews of the mapped file.
+    """
+    names: tuple  # node names, a node's index is its position
+    directed: bool
+    mergePolicy: typing.Optional[str]  # "max" (BW), "min" (Cost) or None for a directed graph
+    offsets: array
+    targets: array
+    weights: array
+
+    def __reduce__(self):
+        # memoryviews can't be pickled, send their contents as arrays
+        return (CompactTopology,
+                tuple(array(_typecode(field), field) if isinstance(field, memoryview) else field for field in self))
+
+
+class RouteTable(typing.NamedTuple):
+    """ Compact routing result for one root, indexed by node index. Holds the same values routeFromN1toN2 leaves
+        in the Node objects: an unreached node points upstream to itself with value/hops of -1 and BW of 999.
+    """
+    root: int
+    routingType: Routing
+    upstream: array  # index of the upstream node toward root
+    valueToRoot: array
+    lowestBwPipeToRoot: array
+    numHopsFromRoot: array
+
+
+class RouteResult(typing.NamedTuple):
+    """ Immutable published routing result: the RouteTable of root (by name) for routingType computed on
+        version topologyVersion of the graph, with the node names (and name index) it is indexed by. Once a
+        reader holds one it stays consistent whatever routes or graph changes follow, so it can be read from any
+        thread without locking.
+    """
+    root: str
+    routingType: Routing
+    topologyVersion: int
+    nodeNames: tuple
+    nodeIndex: dict  # name -> index, only ever grows, names past len(nodeNames) are not part of this result
+    routeTable: RouteTable
+
+    def getPathAndParams(self, endNode):
+        """ Returns (path, cost, bw, hops) from root to endNode as Graph.getPathAndParamsNode() does """
+        endIdx = self.nodeIndex.get(endNode, len(self.nodeNames))
+        assert (endIdx < len(self.nodeNames)), " - Node %s: is not a defined node of this route" % endNode
+        upstream = self.routeTable.upstream
+        path = [endNode]
+        usIdx = endIdx
+        while upstream[usIdx] != usIdx:  # while node not pointing to itself
+            usIdx = upstream[usIdx]
+            path.append(self.nodeNames[usIdx])  # back trace the path from node to root
+
+        path.reverse()
+
+        return path, self.routeTable.valueToRoot[endIdx], self.routeTable.lowestBwPipeToRoot[endIdx], \
+            self.routeTable.numHopsFromRoot[endIdx]
+
+
+def _typecode(buffer):
+    """ Returns the element typecode of an array or typed memoryview """
+    return buffer.typecode if isinstance(buffer, array) else buffer.format
+
+
+def _rawBytes(buffer):
+    """ Returns a byte view of (a slice of) an array or typed memoryview, for a memcpy into an array """
+    return memoryview(buffer).cast('B')
+
+
+def _weightTypecode(edgeVals):
+    """ Returns the array typecode holding all edge values: signed 64 bit integer when possible, else double """
+    return 'q' if all(isinstance(edgeVal, int) for edgeVal in edgeVals) else 'd'
+
+
+class _RouteCounters(object):
+    """ Counts the work of a profiled route (see Graph.profiling): queue pushes, pops and peak queue length, and
+        the legacy engine's back-patched upstream nodes. The engines only go through these when profiling,
+        otherwise they use heapq/deque directly. An engine that may relax a node's edges more than once (the
+        sharded one) also counts edgesRelaxed.
+    """
+
+    def __init__(self):
+        self.pushes = 0
+        self.pops = 0
+        self.peak = 0
+        self.backPatches = 0
+        self.edgesRelaxed = None  # None: every reached node's edges were relaxed once
+
+    def heappush(self, nodeHeap, item):
+        heapq.heappush(nodeHeap, item)
+        self.pushes += 1
+        self.peak = max(self.peak, len(nodeHeap))
+
+    def heappop(self, nodeHeap):
+        self.pops += 1
+        return heapq.heappop(nodeHeap)
+
+
+class _CountedDeque(deque):
+    """ A FIFO node queue counting its operations in a _RouteCounters """
+
+    def __init__(self, routeCounters):
+        super().__init__()
+        self.routeCounters = routeCounters
+
+    def appendleft(self, item):
+        super().appendleft(item)
+        self.routeCounters.pushes += 1
+        self.routeCounters.peak = max(self.routeCounters.peak, len(self))
+
+    def pop(self):
+        self.routeCounters.pops += 1
+        return super().pop()
+
+
+def _queueOps(routeCounters):
+    """ Returns the (heappush, heappop) an engine uses: heapq's own unless the queue is counted """
+    if routeCounters is None:
+        return heapq.heappush, heapq.heappop
+    return routeCounters.heappush, routeCounters.heappop
+
+
+def _endPhase(stats, phaseName, phaseStart):
+    """ Records the seconds since phaseStart as stats[phaseName], returns the time (the next phase start) """
+    now = time.perf_counter()
+    stats[phaseName] = now - phaseStart
+    return now
+
+
+def _routeTableStats(stats, routeCounters, topology, routeTable):
+    """ Adds the work counters of a routed RouteTable to stats, as counted by the engine in routeCounters. Each
+        queue push but the root's is an upstream update. No queue pushes means the RouteTable came from the route
+        cache.
+    """
+    if routeCounters.pushes == 0:
+        stats.update(routeCacheHit=True, nodesDequeued=0, edgesRelaxed=0, upstreamUpdates=0, peakQueueLength=0)
+        return
+    stats.update(routeCacheHit=False, nodesDequeued=routeCounters.pops, upstreamUpdates=routeCounters.pushes - 1,
+                 peakQueueLength=routeCounters.peak, edgesRelaxed=routeCounters.edgesRelaxed)
+    if routeCounters.edgesRelaxed is None:
+        offsets, numHopsFromRoot = topology.offsets, routeTable.numHopsFromRoot
+        stats["edgesRelaxed"] = sum(offsets[nodeIdx + 1] - offsets[nodeIdx] for nodeIdx in range(len(numHopsFromRoot))
+                                    if numHopsFromRoot[nodeIdx] != -1)
+
+
+def routeTopology(topology: CompactTopology, rootIdx: int, routingType: Routing,
+                  routeCounters=None) -> RouteTable:
+    """ Routes from root (by index) to all nodes of the compact topology optimized for routingType: Dijkstra for
+        least-cost, its max-bottleneck (widest path) variant for best-bandwidth and plain BFS for hop-count.
+        Given a _RouteCounters the engine's queue operations are counted in it (see Graph.profiling).
+    """
+    numNodes = len(topology.names)
+    upstream = list(range(numNodes))  # every node starts pointing to itself
+    valueToRoot = [-1] * numNodes
+    lowestBwPipeToRoot = [999] * numNodes
+    numHopsFromRoot = [-1] * numNodes
+    valueToRoot[rootIdx] = 0
+    numHopsFromRoot[rootIdx] = 0
+
+    state = (upstream, valueToRoot, lowestBwPipeToRoot, numHopsFromRoot, routeCounters)
+    if routingType == Routing.leastCost:
+        _routeLeastCost(topology, rootIdx, *state)
+    elif routingType == Routing.bestBandwidth:
+        _routeBestBandwidth(topology, rootIdx, *state)
+    else:  # routingType == Routing.minHopCount
+        _routeMinHopCount(topology, rootIdx, *state)
+
+    typecode = _typecode(topology.weights)
+    return RouteTable(rootIdx, routingType, array('q', upstream), array(typecode, valueToRoot),
+                      array(typecode, lowestBwPipeToRoot), array('q', numHopsFromRoot))
+
+
+def _routeLeastCost(topology, rootIdx, upstream, valueToRoot, lowestBwPipeToRoot, numHopsFromRoot,
+                    routeCounters=None):
+    """ Dijkstra engine: nodes are popped from a priority queue in order of cost to root, so when a node is
+        popped its cost (and upstream node) is final and its adjacencies are relaxed exactly once.
+    """
+    offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+    heappush, heappop = _queueOps(routeCounters)
+    tieBreak = itertools.count()  # equal cost nodes are popped in the order they were reached
+    nodeHeap = []
+    heappush(nodeHeap, (0, next(tieBreak), rootIdx))
+    finalized = [False] * len(topology.names)
+
+    while nodeHeap:
+        cost, _, node = heappop(nodeHeap)
+        if finalized[node]:  # stale entry, node was already reached via a cheaper route
+            continue
+        finalized[node] = True
+
+        for edge in range(offsets[node], offsets[node + 1]):
+            adjNode = targets[edge]
+            if finalized[adjNode]:
+                continue
+            adjCost = cost + weights[edge]
+            if numHopsFromRoot[adjNode] == -1 or adjCost < valueToRoot[adjNode]:
+                upstream[adjNode] = node
+                valueToRoot[adjNode] = adjCost
+                lowestBwPipeToRoot[adjNode] = min(lowestBwPipeToRoot[node], weights[edge])
+                numHopsFromRoot[adjNode] = numHopsFromRoot[node] + 1
+                heappush(nodeHeap, (adjCost, next(tieBreak), adjNode))
+
+
+def _routeBestBandwidth(topology, rootIdx, upstream, valueToRoot, lowestBwPipeToRoot, numHopsFromRoot,
+                        routeCounters=None):
+    """ Widest path engine: the Dijkstra variant maximizing the smallest (constricting) pipe to root. Nodes
+        are popped fattest bottleneck first so a popped node's upstream node is final.
+    """
+    offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+    heappush, heappop = _queueOps(routeCounters)
+    tieBreak = itertools.count()
+    nodeHeap = []
+    heappush(nodeHeap, (-lowestBwPipeToRoot[rootIdx], next(tieBreak), rootIdx))
+    finalized = [False] * len(topology.names)
+
+    while nodeHeap:
+        negBw, _, node = heappop(nodeHeap)
+        if finalized[node]:  # stale entry, node was already reached via a fatter pipe
+            continue
+        finalized[node] = True
+
+        for edge in range(offsets[node], offsets[node + 1]):
+            adjNode = targets[edge]
+            if finalized[adjNode]:
+                continue
+            adjBw = min(-negBw, weights[edge])
+            if numHopsFromRoot[adjNode] == -1 or adjBw > lowestBwPipeToRoot[adjNode]:
+                upstream[adjNode] = node
+                lowestBwPipeToRoot[adjNode] = adjBw
+                # update the cost and hops to root along this path as well
+                valueToRoot[adjNode] = valueToRoot[node] + weights[edge]
+                numHopsFromRoot[adjNode] = numHopsFromRoot[node] + 1
+                heappush(nodeHeap, (-adjBw, next(tieBreak), adjNode))
+
+
+def _routeMinHopCount(topology, rootIdx, upstream, valueToRoot, lowestBwPipeToRoot, numHopsFromRoot,
+                      routeCounters=None):
+    """ Plain BFS engine: the first time a node is reached is via a minimum hop-count route. """
+    offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+    nodeQ = deque() if routeCounters is None else _CountedDeque(routeCounters)
+    nodeQ.appendleft(rootIdx)
+
+    while len(nodeQ) > 0:
+        node = nodeQ.pop()
+        for edge in range(offsets[node], offsets[node + 1]):
+            adjNode = targets[edge]
+            if numHopsFromRoot[adjNode] == -1:
+                numHopsFromRoot[adjNode] = numHopsFromRoot[node] + 1
+                upstream[adjNode] = node
+                lowestBwPipeToRoot[adjNode] = min(lowestBwPipeToRoot[node], weights[edge])
+                valueToRoot[adjNode] = valueToRoot[node] + weights[edge]
+                nodeQ.appendleft(adjNode)
+
+
+def _pathParams(sourceIdx, pathArcs):
+    """ Returns (path, cost, bw, hops) of the route from sourceIdx over pathArcs, a list of (nodeIdx, edgeVal)
+        arcs in path order, with the same root values the engines start from
+    """
+    path, cost, bw = [sourceIdx], 0, 999
+    for nodeIdx, edgeVal in pathArcs:
+        path.append(nodeIdx)
+        cost += edgeVal
+        bw = min(bw, edgeVal)
+    return path, cost, bw, len(pathArcs)
+
+
+def _traceArcs(parents, nodeIdx):
+    """ Returns the (nodeIdx, edgeVal) arcs from the search root to nodeIdx following {node: (parent, edgeVal)} """
+    arcs = []
+    while parents[nodeIdx] is not None:
+        parentIdx, edgeVal = parents[nodeIdx]
+        arcs.append((nodeIdx, edgeVal))
+        nodeIdx = parentIdx
+    arcs.reverse()
+    return arcs
+
+
+def routePointToPoint(topology: CompactTopology, reverse: CompactTopology, sourceIdx: int, targetIdx: int,
+                      routingType: Routing):
+    """ Routes from source to target only (by index) optimized for routingType, stopping as soon as the target's
+        route is final, and returns (path node indices, cost, bw, hops) as getPathAndParamsNode() would. An
+        unreachable target returns ([targetIdx], -1, 999, -1). reverse is the reverseTopology() of topology.
+
+        All three search from both ends at once, forward over topology and backward over reverse: a bidirectional
+        Dijkstra stopping once the two smallest queued costs add up to the best meeting route, a bidirectional
+        widest path search stopping once either side's fattest queued pipe is no wider than the best meeting
+        route, and a bidirectional BFS expanding the smaller frontier a level at a time. The optimized value
+        always equals that of a full route; between equally good routes the path may differ from the full route's.
+    """
+    if sourceIdx == targetIdx:
+        return [sourceIdx], 0, 999, 0
+    pathArcs = _pointToPointSearches[routingType](topology, reverse, sourceIdx, targetIdx)
+    if pathArcs is None:
+        return [targetIdx], -1, 999, -1
+    return _pathParams(sourceIdx, pathArcs)
+
+
+def _pointToPointLeastCost(topology, reverse, sourceIdx, targetIdx):
+    """ Bidirectional Dijkstra, returns the route's (nodeIdx, edgeVal) arcs or None when there is no route """
+    tieBreak = itertools.count()
+    # per direction: (topology searched, cost from its end, {node: (parent, edgeVal)}, queue, finalized nodes)
+    forward = (topology, {sourceIdx: 0}, {sourceIdx: None}, [(0, next(tieBreak), sourceIdx)], set())
+    backward = (reverse, {targetIdx: 0}, {targetIdx: None}, [(0, next(tieBreak), targetIdx)], set())
+    bestCost, meeting = None, None  # meeting: (forward node, backward node, edgeVal) of the best route so far
+
+    while forward[3] and backward[3]:
+        if bestCost is not None and forward[3][0][0] + backward[3][0][0] >= bestCost:
+            break  # no route through an unfinalized node can beat bestCost
+        isForward = forward[3][0][0] <= backward[3][0][0]
+        (searched, costs, parents, nodeHeap, finalized), otherCosts = \
+            (forward, backward[1]) if isForward else (backward, forward[1])
+        cost, _, node = heapq.heappop(nodeHeap)
+        if node in finalized:  # stale entry
+            continue
+        finalized.add(node)
+
+        offsets, targets, weights = searched.offsets, searched.targets, searched.weights
+        for edge in range(offsets[node], offsets[node + 1]):
+            adjNode, edgeVal = targets[edge], weights[edge]
+            adjCost = cost + edgeVal
+            if adjNode not in costs or adjCost < costs[adjNode]:
+                costs[adjNode] = adjCost
+                parents[adjNode] = (node, edgeVal)
+                heapq.heappush(nodeHeap, (adjCost, next(tieBreak), adjNode))
+            if adjNode in otherCosts and (bestCost is None or adjCost + otherCosts[adjNode] < bestCost):
+                bestCost = adjCost + otherCosts[adjNode]
+                meeting = (node, adjNode, edgeVal) if isForward else (adjNode, node, edgeVal)
+
+    if meeting is None:
+        return None
+    return _joinArcs(forward[2], backward[2], meeting)
+
+
+def _joinArcs(forwardParents, backwardParents, meeting):
+    """ Returns the arcs from source to target through the meeting arc (forward node, backward node, edgeVal) """
+    forwardIdx, backwardIdx, edgeVal = meeting
+    pathArcs = _traceArcs(forwardParents, forwardIdx)
+    pathArcs.append((backwardIdx, edgeVal))
+    nodeIdx = backwardIdx
+    while backwardParents[nodeIdx] is not None:  # backward parents point one arc closer to the target
+        nextIdx, nextEdgeVal = backwardParents[nodeIdx]
+        pathArcs.append((nextIdx, nextEdgeVal))
+        nodeIdx = nextIdx
+    return pathArcs
+
+
+def _pointToPointMinHopCount(topology, reverse, sourceIdx, targetIdx):
+    """ Bidirectional BFS, returns the route's (nodeIdx, edgeVal) arcs or None when there is no route """
+    # per direction: (topology searched, hops from its end, {node: (parent, edgeVal)}, frontier)
+    forward = [topology, {sourceIdx: 0}, {sourceIdx: None}, [sourceIdx]]
+    backward = [reverse, {targetIdx: 0}, {targetIdx: None}, [targetIdx]]
+
+    while forward[3] and backward[3]:
+        isForward = len(forward[3]) <= len(backward[3])
+        (searched, hops, parents, frontier), otherHops = \
+            (forward, backward[1]) if isForward else (backward, forward[1])
+        offsets, targets, weights = searched.offsets, searched.targets, searched.weights
+        bestHops, meeting, nextFrontier = None, None, []
+        for node in frontier:  # expand one whole level, the best meeting route is found within it
+            for edge in range(offsets[node], offsets[node + 1]):
+                adjNode = targets[edge]
+                if adjNode in otherHops and (bestHops is None or hops[node] + 1 + otherHops[adjNode] < bestHops):
+                    bestHops = hops[node] + 1 + otherHops[adjNode]
+                    meeting = (node, adjNode, weights[edge]) if isForward else (adjNode, node, weights[edge])
+                if adjNode not in hops:
+                    hops[adjNode] = hops[node] + 1
+                    parents[adjNode] = (node, weights[edge])
+                    nextFrontier.append(adjNode)
+        if meeting is not None:
+            return _joinArcs(forward[2], backward[2], meeting)
+        (forward if isForward else backward)[3] = nextFrontier
+    return None
+
+
+def _pointToPointBestBandwidth(topology, reverse, sourceIdx, targetIdx):
+    """ Bidirectional widest path search, returns the route's (nodeIdx, edgeVal) arcs or None when there is no
+        route
+    """
+    tieBreak = itertools.count()
+    # per direction: (topology searched, BW pipe from its end, {node: (parent, edgeVal)}, queue, finalized nodes)
+    forward = (topology, {sourceIdx: 999}, {sourceIdx: None}, [(-999, next(tieBreak), sourceIdx)], set())
+    backward = (reverse, {targetIdx: 999}, {targetIdx: None}, [(-999, next(tieBreak), targetIdx)], set())
+    bestBw, meeting = None, None  # meeting: (forward node, backward node, edgeVal) of the best route so far
+
+    while forward[3] and backward[3]:
+        if bestBw is not None and -max(forward[3][0][0], backward[3][0][0]) <= bestBw:
+            break  # a wider route would have to be fully finalized from one end, and so already met
+        isForward = forward[3][0][0] <= backward[3][0][0]
+        (searched, lowestBwPipe, parents, nodeHeap, finalized), otherBwPipe = \
+            (forward, backward[1]) if isForward else (backward, forward[1])
+        negBw, _, node = heapq.heappop(nodeHeap)
+        if node in finalized:  # stale entry
+            continue
+        finalized.add(node)
+
+        offsets, targets, weights = searched.offsets, searched.targets, searched.weights
+        for edge in range(offsets[node], offsets[node + 1]):
+            adjNode, edgeVal = targets[edge], weights[edge]
+            adjBw = min(-negBw, edgeVal)
+            if adjNode not in lowestBwPipe or adjBw > lowestBwPipe[adjNode]:
+                lowestBwPipe[adjNode] = adjBw
+                parents[adjNode] = (node, edgeVal)
+                heapq.heappush(nodeHeap, (-adjBw, next(tieBreak), adjNode))
+            if adjNode in otherBwPipe and (bestBw is None or min(adjBw, otherBwPipe[adjNode]) > bestBw):
+                bestBw = min(adjBw, otherBwPipe[adjNode])
+                meeting = (node, adjNode, edgeVal) if isForward else (adjNode, node, edgeVal)
+
+    if meeting is None:
+        return None
+    return _joinArcs(forward[2], backward[2], meeting)
+
+
+def _leastCostWithinHops(topology, sourceIdx, targetIdx, maxHops):
+    """ Least-cost route of at most maxHops hops, returns the route's (nodeIdx, edgeVal) arcs or None when there
+        is no such route. A Dijkstra over (cost, hops) labels: a node's label is dropped when one of the node's
+        labels already finalized is as cheap with as few hops, so each node keeps maxHops + 1 labels at most.
+    """
+    offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+    tieBreak = itertools.count()
+    labels = [(sourceIdx, None, None)]  # (nodeIdx, edgeVal, parent label) of every label pushed
+    nodeHeap = [(0, 0, next(tieBreak), 0)]  # (cost, hops, tie break, label), cheapest then fewest hops first
+    fewestHops = {}  # node: hops of its last finalized label, fewer than any finalized before it
+
+    while nodeHeap:
+        cost, hops, _, label = heapq.heappop(nodeHeap)
+        node = labels[label][0]
+        if node in fewestHops and fewestHops[node] <= hops:  # dominated label
+            continue
+        fewestHops[node] = hops
+        if node == targetIdx:
+            pathArcs = []
+            while labels[label][2] is not None:
+                node, edgeVal, label = labels[label]
+                pathArcs.append((node, edgeVal))
+            pathArcs.reverse()
+            return pathArcs
+        if hops == maxHops:
+            continue
+
+        for edge in range(offsets[node], offsets[node + 1]):
+            adjNode = targets[edge]
+            if adjNode in fewestHops and fewestHops[adjNode] <= hops + 1:
+                continue
+            labels.append((adjNode, weights[edge], label))
+            heapq.heappush(nodeHeap, (cost + weights[edge], hops + 1, next(tieBreak), len(labels) - 1))
+    return None
+
+
+_pointToPointSearches = {Routing.leastCost: _pointToPointLeastCost,
+                         Routing.bestBandwidth: _pointToPointBestBandwidth,
+                         Routing.minHopCount: _pointToPointMinHopCount}
+
+
+def _routeRank(routingType, pathParams):
+    """ Sort key ranking (path, cost, bw, hops) tuples best first for routingType, ties on the other values """
+    _, cost, bw, hops = pathParams
+    if routingType == Routing.leastCost:
+        return cost, hops
+    if routingType == Routing.bestBandwidth:
+        return -bw, hops, cost
+    return hops, cost
+
+
+def kShortestPaths(topology: CompactTopology, reverse: CompactTopology, sourceIdx: int, targetIdx: int,
+                   routingType: Routing, k: int):
+    """ Returns up to k loopless routes from source to target (by index), best first for routingType, as a list
+        of (path node indices, cost, bw, hops) tuples. Routes are distinct node sequences, using the best of any
+        parallel edges. The list is empty when target is unreachable and shorter when fewer routes exist.
+
+        Yen's algorithm: each next route deviates from an accepted one at a spur node, keeping the accepted
+        route up to there and routing on from the spur node to target, off the root path nodes and off the arcs
+        leaving the spur node on accepted routes sharing that root path. A route's spur nodes before the one it
+        deviated from its parent route at were the parent's spur nodes already, so they are skipped (Lawler).
+
+        The best route tree towards target is routed once (see _reverseRouteTree()) and the spur routes are
+        searched for until they join it on a tree route avoiding the root path: on a long route most of them
+        leave the accepted route for a neighbour and join the tree there, after a few dozen nodes. Least-cost and
+        hop-count spur routes are A* searches on the tree values (see _spurArcs()), best-bandwidth ones are
+        bisected for (see _widestSpurArcs()) as a blocked bottleneck leaves the tree values far too wide and ties
+        on the bottleneck abound.
+    """
+    assert (k >= 1), " - k is %s: at least one route must be asked for" % k
+    if sourceIdx == targetIdx:
+        return [([sourceIdx], 0, 999, 0)]
+    tree = _reverseRouteTree(reverse, targetIdx, routingType)
+    if tree.ranks[sourceIdx] is None:
+        return []
+
+    edgeVals = sorted(set(topology.weights)) if routingType == Routing.bestBandwidth else None
+    acceptedArcs = [_treeArcs(tree, sourceIdx)]
+    acceptedNodes = [(sourceIdx,) + tuple(nodeIdx for nodeIdx, _ in acceptedArcs[0])]
+    candidates, seen, tieBreak = [], {acceptedNodes[0]}, itertools.count()
+    deviation = 0  # the spur node position the last accepted route deviated from its parent route at
+    while len(acceptedArcs) < k:
+        lastArcs, lastNodes = acceptedArcs[-1], acceptedNodes[-1]
+        lastBw, rootBw = _pathParams(sourceIdx, lastArcs)[2], 999
+        rootPath = _TreeSubtrees(tree)  # the root path nodes before the spur node
+        sharingRoot = acceptedNodes  # the accepted routes sharing the root path up to the spur node
+        for spurPos in range(len(lastArcs)):
+            spurIdx = lastNodes[spurPos]
+            sharingRoot = [nodes for nodes in sharingRoot if nodes[spurPos] == spurIdx]
+            spurArcs = None
+            if spurPos >= deviation:
+                blockedArcs = {(spurIdx, nodes[spurPos + 1]) for nodes in sharingRoot}
+                if routingType == Routing.bestBandwidth:
+                    # no route left is wider than the last accepted one, nor than its root path
+                    spurArcs = _widestSpurArcs(topology, reverse, tree, spurIdx, rootPath, blockedArcs, edgeVals,
+                                               min(lastBw, rootBw))
+                else:
+                    spurArcs = _spurArcs(topology, tree, spurIdx, rootPath, blockedArcs, routingType)
+            rootBw = min(rootBw, lastArcs[spurPos][1])
+            rootPath.add(spurIdx)
+            if spurArcs is None:
+                continue
+            nodes = lastNodes[:spurPos + 1] + tuple(nodeIdx for nodeIdx, _ in spurArcs)
+            if nodes in seen:
+                continue
+            seen.add(nodes)
+            pathArcs = lastArcs[:spurPos] + spurArcs
+            heapq.heappush(candidates, (_routeRank(routingType, _pathParams(sourceIdx, pathArcs)), next(tieBreak),
+                                        nodes, pathArcs, spurPos))
+        if not candidates:
+            break
+        _, _, nodes, pathArcs, deviation = heapq.heappop(candidates)
+        acceptedArcs.append(pathArcs)
+        acceptedNodes.append(nodes)
+    return [_pathParams(sourceIdx, pathArcs) for pathArcs in acceptedArcs]
+
+
+class _RouteTree(typing.NamedTuple):
+    """ The best routes of every node towards the target (see _reverseRouteTree()). ranks holds each node's
+        route value as a sort key, best smallest (cost, hops, or the negated bottleneck BW), None when the node
+        cannot reach the target, and hops its route's hop count. nextArcs holds the node's first (nodeIdx,
+        edgeVal) arc towards the target. enter and leave number the nodes in depth first order of the tree,
+        enter[x] <= enter[y] < leave[x] when y's route goes through x.
+    """
+    target: int
+    ranks: list
+    hops: list
+    nextArcs: list
+    enter: list
+    leave: list
+
+
+def _reverseRouteTree(reverse, targetIdx, routingType):
+    """ Routes from every node to target at once, as a Dijkstra (minHopCount: on unit edge values, bestBandwidth:
+        on the widest pipe) from target over reverse, the reverseTopology() of the routed topology. Ties go to
+        the fewer hops. Returns the _RouteTree.
+    """
+    offsets, targets, weights = reverse.offsets, reverse.targets, reverse.weights
+    numNodes = len(reverse.names)
+    keys, nextArcs, finalized = [None] * numNodes, [None] * numNodes, [False] * numNodes
+    keys[targetIdx] = (-999, 0) if routingType == Routing.bestBandwidth else (0, 0)
+    nodeHeap = [(keys[targetIdx], targetIdx)]
+    children = [[] for _ in range(numNodes)]
+
+    while nodeHeap:
+        (rank, hops), node = heapq.heappop(nodeHeap)
+        if finalized[node]:  # stale entry
+            continue
+        finalized[node] = True
+        if node != targetIdx:
+            children[nextArcs[node][0]].append(node)
+        for edge in range(offsets[node], offsets[node + 1]):
+            adjNode, edgeVal = targets[edge], weights[edge]  # the arc adjNode -> node of the routed topology
+            if finalized[adjNode]:
+                continue
+            if routingType == Routing.leastCost:
+                adjKey = (rank + edgeVal, hops + 1)
+            elif routingType == Routing.bestBandwidth:
+                adjKey = (max(rank, -edgeVal), hops + 1)
+            else:
+                adjKey = (rank + 1, hops + 1)
+            if keys[adjNode] is None or adjKey < keys[adjNode]:
+                keys[adjNode] = adjKey
+                nextArcs[adjNode] = (node, edgeVal)
+                heapq.heappush(nodeHeap, (adjKey, adjNode))
+
+    enter, leave, order = [None] * numNodes, [None] * numNodes, 0
+    stack = [(targetIdx, False)]
+    while stack:  # number the tree depth first, without recursion as routes run thousands of hops deep
+        node, done = stack.pop()
+        if done:
+            leave[node] = order
+            continue
+        enter[node], order = order, order + 1
+        stack.append((node, True))
+        stack.extend((child, False) for child in children[node])
+    return _RouteTree(targetIdx, [None if key is None else key[0] for key in keys],
+                      [None if key is None else key[1] for key in keys], nextArcs, enter, leave)
+
+
+def _treeArcs(tree, nodeIdx):
+    """ Returns the (nodeIdx, edgeVal) arcs of nodeIdx's _RouteTree route to the target """
+    arcs, nextArcs = [], tree.nextArcs
+    while nextArcs[nodeIdx] is not None:
+        arcs.append(nextArcs[nodeIdx])
+        nodeIdx = nextArcs[nodeIdx][0]
+    return arcs
+
+
+class _TreeSubtrees:
+    """ A set of _RouteTree nodes answering whether a node's tree route goes through any of them, in O(log n):
+        the nodes' subtrees are kept as their outermost disjoint [enter, leave) ranges
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.nodes = set()
+        self.enters, self.leaves = [], []
+
+    def add(self, nodeIdx):
+        self.nodes.add(nodeIdx)
+        enter, leave = self.tree.enter[nodeIdx], self.tree.leave[nodeIdx]
+        if enter is None:  # cannot reach the target, on no tree route
+            return
+        pos = bisect.bisect_right(self.enters, enter)
+        if pos > 0 and self.leaves[pos - 1] > enter:  # within a subtree already held
+            return
+        end = bisect.bisect_left(self.enters, leave, pos)  # subtrees are nested or disjoint
+        self.enters[pos:end], self.leaves[pos:end] = [enter], [leave]
+
+    def onRoute(self, nodeIdx):
+        """ Whether nodeIdx's tree route, nodeIdx included, goes through a node of the set """
+        enter = self.tree.enter[nodeIdx]
+        pos = bisect.bisect_right(self.enters, enter)
+        return pos > 0 and self.leaves[pos - 1] > enter
+
+
+def _spurArcs(topology, tree, spurIdx, rootPath, blockedArcs, routingType):
+    """ Returns the (nodeIdx, edgeVal) arcs of the least-cost or hop-count route from the spur node to the tree's
+        target avoiding the rootPath (_TreeSubtrees) nodes and blockedArcs, (nodeIdx, adjNodeIdx) pairs, or None
+        when there is none.
+
+        An A* search on the _RouteTree values, exact bounds of the route left from a node as nothing is blocked
+        on the tree. The first node taken off the queue whose tree route avoids the root path and the spur node
+        has the best route: through the queued node, then on its tree route.
+    """
+    offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+    ranks, enter = tree.ranks, tree.enter
+    spurEnter, spurLeave = enter[spurIdx], tree.leave[spurIdx]
+    unitEdges = routingType == Routing.minHopCount
+    tieBreak = itertools.count()
+    values, parents, finalized = {spurIdx: 0}, {spurIdx: None}, set()  # cost or hops from the spur node
+    nodeHeap = [(ranks[spurIdx], 0, next(tieBreak), spurIdx)]
+
+    while nodeHeap:
+        _, hops, _, node = heapq.heappop(nodeHeap)
+        if node in finalized:  # stale entry
+            continue
+        finalized.add(node)
+        if node != spurIdx and not rootPath.onRoute(node) and not spurEnter <= enter[node] < spurLeave:
+            return _traceArcs(parents, node) + _treeArcs(tree, node)
+
+        value = values[node]
+        for edge in range(offsets[node], offsets[node + 1]):
+            adjNode, edgeVal = targets[edge], weights[edge]
+            if (ranks[adjNode] is None or adjNode in finalized or adjNode in rootPath.nodes
+                    or (node, adjNode) in blockedArcs):
+                continue
+            adjValue = value + (1 if unitEdges else edgeVal)
+            if adjNode in values and adjValue >= values[adjNode]:
+                continue
+            values[adjNode] = adjValue
+            parents[adjNode] = (node, edgeVal)
+            heapq.heappush(nodeHeap, (adjValue + ranks[adjNode], hops + 1, next(tieBreak), adjNode))
+    return None
+
+
+def _widestSpurArcs(topology, reverse, tree, spurIdx, rootPath, blockedArcs, edgeVals, maxBw):
+    """ Returns the (nodeIdx, edgeVal) arcs of the widest route from the spur node to the tree's target as wide
+        as maxBw at most (any route that wide is as good), avoiding the rootPath (_TreeSubtrees) nodes and
+        blockedArcs, or None when there is no route. Tries the widest the spur node's open arcs allow first,
+        then bisects edgeVals, the sorted distinct edge values, for the largest threshold still routed at.
+    """
+    ranks, offsets, targets, weights = tree.ranks, topology.offsets, topology.targets, topology.weights
+    widest = None
+    for edge in range(offsets[spurIdx], offsets[spurIdx + 1]):
+        adjNode, edgeVal = targets[edge], weights[edge]
+        if ranks[adjNode] is not None and adjNode not in rootPath.nodes and (spurIdx, adjNode) not in blockedArcs:
+            widest = max(widest or 0, min(edgeVal, -ranks[adjNode]))
+    if widest is None:
+        return None
+    searchArgs = (topology, reverse, tree, spurIdx, rootPath, blockedArcs)
+    pathArcs = _spurArcsAtLeast(*searchArgs, min(widest, maxBw))
+    if pathArcs is not None:
+        return pathArcs
+    low, high = 0, bisect.bisect_left(edgeVals, min(widest, maxBw)) - 1
+    while low <= high:
+        mid = (low + high) // 2
+        midArcs = _spurArcsAtLeast(*searchArgs, edgeVals[mid])
+        if midArcs is None:
+            high = mid - 1
+        else:
+            pathArcs, low = midArcs, mid + 1
+    return pathArcs
+
+
+def _spurArcsAtLeast(topology, reverse, tree, spurIdx, rootPath, blockedArcs, minEdgeVal):
+    """ Returns the (nodeIdx, edgeVal) arcs of a route from the spur node to the tree's target over edges at
+        least minEdgeVal wide, avoiding the rootPath (_TreeSubtrees) nodes and blockedArcs, or None when there
+        is none. Searches from both ends, going on from the end with fewer queued nodes: forward from the spur
+        node fewest tree hops first, done on reaching a node whose tree route avoids the root path and the spur
+        node and is that wide, and backward from the target breadth first, done on meeting the forward search.
+        Either end running out of nodes proves there is no route, so a blocked bottleneck fails fast.
+    """
+    ranks, treeHops, enter = tree.ranks, tree.hops, tree.enter
+    spurEnter, spurLeave = enter[spurIdx], tree.leave[spurIdx]
+    targetIdx = tree.target
+    tieBreak = itertools.count()
+    forwardParents, backwardParents = {spurIdx: None}, {targetIdx: None}
+    forwardHeap, backwardQ = [(treeHops[spurIdx], 0, next(tieBreak), spurIdx)], deque([targetIdx])
+
+    while forwardHeap and backwardQ:
+        if len(forwardHeap) <= len(backwardQ):
+            _, hops, _, node = heapq.heappop(forwardHeap)
+            if (node != spurIdx and -ranks[node] >= minEdgeVal and not rootPath.onRoute(node)
+                    and not spurEnter <= enter[node] < spurLeave):
+                return _traceArcs(forwardParents, node) + _treeArcs(tree, node)
+            offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+            for edge in range(offsets[node], offsets[node + 1]):
+                adjNode, edgeVal = targets[edge], weights[edge]
+                if (edgeVal < minEdgeVal or ranks[adjNode] is None or adjNode in forwardParents
+                        or adjNode in rootPath.nodes or (node, adjNode) in blockedArcs):
+                    continue
+                if adjNode in backwardParents:
+                    return _joinArcs(forwardParents, backwardParents, (node, adjNode, edgeVal))
+                forwardParents[adjNode] = (node, edgeVal)
+                heapq.heappush(forwardHeap, (hops + 1 + treeHops[adjNode], hops + 1, next(tieBreak), adjNode))
+        else:
+            node = backwardQ.popleft()
+            offsets, targets, weights = reverse.offsets, reverse.targets, reverse.weights
+            for edge in range(offsets[node], offsets[node + 1]):
+                adjNode, edgeVal = targets[edge], weights[edge]  # the arc adjNode -> node
+                if (edgeVal < minEdgeVal or adjNode in backwardParents or adjNode in rootPath.nodes
+                        or (adjNode, node) in blockedArcs):
+                    continue
+                if adjNode in forwardParents:
+                    return _joinArcs(forwardParents, backwardParents, (adjNode, node, edgeVal))
+                backwardParents[adjNode] = (node, edgeVal)
+                backwardQ.append(adjNode)
+    return None
+
+
+def disjointPaths(topology: CompactTopology, reverse: CompactTopology, sourceIdx: int, targetIdx: int,
+                  routingType: Routing, nodeDisjoint: bool = False):
+    """ Returns a primary and a backup route from source to target (by index) sharing no edge, or with
+        nodeDisjoint no node but source and target, as a list of (path node indices, cost, bw, hops) tuples,
+        primary first. The list is empty when target is unreachable and holds only the point-to-point route when
+        no disjoint backup exists. The topology holds at most one edge per node pair, parallel edges being merged
+        into it by the graph's mergePolicy (see Graph), so they never make a disjoint pair; on an undirected
+        graph an edge is shared whichever way it is crossed.
+
+        Least-cost pairs have the smallest summed cost and hop-count pairs the fewest summed hops (Suurballe's
+        algorithm). Best-bandwidth pairs have the widest thinner route: the largest edge value still leaving a
+        disjoint pair over the edges at least that wide is bisected for, taking the fewest summed hops there.
+    """
+    if sourceIdx == targetIdx:
+        return [([sourceIdx], 0, 999, 0)]
+    if routingType == Routing.bestBandwidth:
+        pairArcs, edgeVals = None, sorted(set(topology.weights))
+        low, high = 0, len(edgeVals) - 1
+        while low <= high:  # the widest edge value threshold leaving a disjoint pair
+            mid = (low + high) // 2
+            routesArcs = _suurballe(topology, sourceIdx, targetIdx, False, edgeVals[mid], nodeDisjoint)
+            if routesArcs is not None and len(routesArcs) == 2:
+                pairArcs, low = routesArcs, mid + 1
+            else:
+                high = mid - 1
+        if pairArcs is None:
+            pathArcs = _pointToPointBestBandwidth(topology, reverse, sourceIdx, targetIdx)
+            pairArcs = [] if pathArcs is None else [pathArcs]
+    else:
+        pairArcs = _suurballe(topology, sourceIdx, targetIdx, routingType == Routing.leastCost, None, nodeDisjoint)
+        if pairArcs is None:
+            pairArcs = []
+    return sorted((_pathParams(sourceIdx, pathArcs) for pathArcs in pairArcs),
+                  key=lambda pathParams: _routeRank(routingType, pathParams))
+
+
+def _suurballe(topology, sourceIdx, targetIdx, weighted, minEdgeVal, nodeDisjoint):
+    """ Suurballe's algorithm over the edges with a value of at least minEdgeVal (all for None), costed by edge
+        value if weighted else by hop. Returns the two disjoint routes' (nodeIdx, edgeVal) arcs with the least
+        summed cost, only the shortest route's when there is no disjoint pair, or None when there is no route.
+
+        A Dijkstra from source to target gives the shortest route and node potentials, the target's cost capping
+        nodes not finalized. A second Dijkstra on the potential-reduced (non-negative) costs routes over the
+        residual graph: the shortest route's edges turned around at no cost and otherwise removed. With
+        nodeDisjoint each inner node of the shortest route is split into an in state (number of nodes + nodeIdx)
+        entered from off the route and only left back along it, and an out state. Edges both routes cross in
+        opposite directions cancel and the rest are walked from source into the two routes.
+    """
+    offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+    numNodes = len(topology.names)
+
+    def dijkstra(expand):
+        """ Dijkstra from source until target, expand(state) yields (adjState, arcCost, arc), returns the
+            {state: cost} of finalized states and {state: (parent state, arc)}
+        """
+        tieBreak = itertools.count()
+        costs, parents, finalized = {sourceIdx: 0}, {sourceIdx: None}, {}
+        nodeHeap = [(0, next(tieBreak), sourceIdx)]
+        while nodeHeap:
+            cost, _, state = heapq.heappop(nodeHeap)
+            if state in finalized:  # stale entry
+                continue
+            finalized[state] = cost
+            if state == targetIdx:
+                break
+            for adjState, arcCost, arc in expand(state):
+                if adjState not in finalized and (adjState not in costs or cost + arcCost < costs[adjState]):
+                    costs[adjState] = cost + arcCost
+                    parents[adjState] = (state, arc)
+                    heapq.heappush(nodeHeap, (cost + arcCost, next(tieBreak), adjState))
+        return finalized, parents
+
+    def edgeCost(edge):
+        return weights[edge] if weighted else 1
+
+    def outEdges(node):
+        for edge in range(offsets[node], offsets[node + 1]):
+            if minEdgeVal is None or weights[edge] >= minEdgeVal:
+                yield edge
+
+    finalized, parents = dijkstra(lambda node: ((targets[edge], edgeCost(edge), edge) for edge in outEdges(node)))
+    if targetIdx not in finalized:
+        return None
+    shortestEdges, nodeIdx = [], targetIdx
+    while parents[nodeIdx] is not None:
+        nodeIdx, edge = parents[nodeIdx]
+        shortestEdges.append((nodeIdx, edge))
+    shortestEdges.reverse()  # (nodeIdx, edge) in route order
+    routeArcs = [(targets[edge], weights[edge]) for _, edge in shortestEdges]
+
+    targetCost = finalized[targetIdx]
+    potential = {nodeIdx: cost for nodeIdx, cost in finalized.items()}  # every other node: targetCost
+    crossed = {edge for _, edge in shortestEdges}
+    crossedArcs = {(nodeIdx, targets[edge]) for nodeIdx, edge in shortestEdges}
+    entering = {targets[edge]: (nodeIdx, edge) for nodeIdx, edge in shortestEdges}  # route node: edge into it
+    split = set(entering) - {targetIdx} if nodeDisjoint else set()
+
+    def residual(state):
+        if state >= numNodes:  # in state, only left back along the route
+            nodeIdx, edge = entering[state - numNodes]
+            yield nodeIdx, 0, (edge, True)
+            return
+        nodePotential = potential.get(state, targetCost)
+        for edge in outEdges(state):
+            adjNode = targets[edge]
+            if edge in crossed or adjNode == sourceIdx or (not topology.directed and (adjNode, state) in crossedArcs):
+                continue
+            arcCost = edgeCost(edge) + nodePotential - potential.get(adjNode, targetCost)
+            yield (adjNode + numNodes if adjNode in split else adjNode), arcCost, (edge, False)
+        if state in split:
+            yield state + numNodes, 0, None  # out state back to in state
+        elif not nodeDisjoint and state in entering:
+            nodeIdx, edge = entering[state]
+            yield nodeIdx, 0, (edge, True)
+
+    finalized, parents = dijkstra(residual)
+    if targetIdx not in finalized:
+        return [routeArcs]
+    usedEdges, state = {edge: nodeIdx for nodeIdx, edge in shortestEdges}, targetIdx
+    while parents[state] is not None:
+        state, arc = parents[state]
+        if arc is not None:
+            edge, turnedAround = arc
+            if turnedAround:
+                del usedEdges[edge]
+            else:
+                usedEdges[edge] = state
+    edgesFrom = {}
+    for edge, nodeIdx in usedEdges.items():
+        edgesFrom.setdefault(nodeIdx, []).append(edge)
+
+    routesArcs = []
+    for _ in range(2):
+        pathArcs, nodeIdx, position = [], sourceIdx, {sourceIdx: 0}  # node: number of arcs up to it
+        while nodeIdx != targetIdx:
+            edge = edgesFrom[nodeIdx].pop()
+            nodeIdx = targets[edge]
+            if nodeIdx in position:  # walked a (zero cost) cycle, drop it
+                for droppedIdx, _ in pathArcs[position[nodeIdx]:]:
+                    del position[droppedIdx]
+                del pathArcs[position[nodeIdx]:]
+            else:
+                pathArcs.append((nodeIdx, weights[edge]))
+                position[nodeIdx] = len(pathArcs)
+        routesArcs.append(pathArcs)
+    return routesArcs
+
+
+class ContractionHierarchy(typing.NamedTuple):
+    """ Shortcut index of a least-cost CompactTopology, see buildContractionHierarchy(). Both topologies hold, at
+        each node, the arcs it had to the nodes still in the graph when it was contracted: upward the outgoing
+        ones and downward the incoming ones, reversed. Shortcut arcs name the node they bypass in the matching
+        middles array, -1 marks an edge of the graph. An undirected topology's downward is its upward. The nodes
+        never contracted, flagged by inCore, keep their arcs to each other.
+    """
+    upward: CompactTopology
+    downward: CompactTopology
+    upMiddles: array
+    downMiddles: array
+    inCore: array
+    fingerprint: int  # _topologyFingerprint() of the topology indexed
+
+
+def _topologyFingerprint(topology):
+    """ Returns a checksum of the arcs of topology, telling whether an index was built for it """
+    checksum = zlib.crc32(b"directed" if topology.directed else b"undirected")
+    for buffer in (topology.offsets, topology.targets, topology.weights):
+        checksum = zlib.crc32(_rawBytes(buffer), checksum)
+    return checksum
+
+
+def buildContractionHierarchy(topology: CompactTopology, coreDegree: int = 16, witnessSettled: int = 32,
+                              maxCoreShare: float = 1.0) -> ContractionHierarchy:
+    """ Returns the ContractionHierarchy of a least-cost topology, answering contractionHierarchyRoute() queries.
+
+        Nodes are contracted one at a time, least important first. A contracted node leaves the graph and each
+        route through it between two of its remaining neighbours is kept as a shortcut arc, unless a witness search
+        (a Dijkstra around it settling at most witnessSettled nodes) finds one at least as cheap. Importance is the
+        edge difference, shortcuts added less arcs removed, plus the neighbours already contracted, and is updated
+        lazily. A node left with more than coreDegree neighbours is not contracted: these nodes form the core,
+        large only on expander like (random) graphs, and keep all their arcs to each other. Once the core holds
+        more than maxCoreShare of the nodes, counting the nodes left that already have more than coreDegree
+        neighbours, contraction stops and every node left joins the core.
+
+        Building is the costly part, at 10,000 nodes: 0.2-0.5s on scale-free graphs, 3-5s on grids and tori,
+        1.5s (directed) to 9s (undirected) on a fat-tree, and 5-16s on random graphs stopped by maxCoreShare=0.2.
+    """
+    numNodes = len(topology.names)
+    offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+    outArcs = [{} for _ in range(numNodes)]  # the remaining graph, {adjNodeIdx: (edgeVal, middle)} per node
+    for nodeIdx in range(numNodes):
+        arcs = outArcs[nodeIdx]
+        for edge in range(offsets[nodeIdx], offsets[nodeIdx + 1]):
+            adjNode, edgeVal = targets[edge], weights[edge]
+            if adjNode != nodeIdx and (adjNode not in arcs or edgeVal < arcs[adjNode][0]):
+                arcs[adjNode] = (edgeVal, -1)  # self loops and costlier parallel edges are never routed over
+    if topology.directed:
+        inArcs = [{} for _ in range(numNodes)]
+        for nodeIdx, arcs in enumerate(outArcs):
+            for adjNode, arc in arcs.items():
+                inArcs[adjNode][nodeIdx] = arc
+    else:
+        inArcs = outArcs  # symmetric, setting an arc sets both directions
+
+    def witnessCosts(sourceIdx, skippedIdx, maxCost, toIdxs):
+        """ Returns {nodeIdx: cost} of the routes found from sourceIdx to at most maxCost around skippedIdx """
+        tieBreak = itertools.count()
+        costs, finalized, nodeHeap = {sourceIdx: 0}, set(), [(0, next(tieBreak), sourceIdx)]
+        unsettled = len(toIdxs)
+        while nodeHeap and len(finalized) < witnessSettled and unsettled:
+            cost, _, node = heapq.heappop(nodeHeap)
+            if node in finalized:  # stale entry
+                continue
+            finalized.add(node)
+            if node in toIdxs:
+                unsettled -= 1
+            for adjNode, (edgeVal, _) in outArcs[node].items():
+                adjCost = cost + edgeVal
+                if adjCost <= maxCost and adjNode != skippedIdx and (adjNode not in costs or adjCost < costs[adjNode]):
+                    costs[adjNode] = adjCost
+                    heapq.heappush(nodeHeap, (adjCost, next(tieBreak), adjNode))
+        return costs
+
+    def shortcuts(nodeIdx):
+        """ Returns the (fromIdx, toIdx, cost) shortcuts contracting nodeIdx takes, one per pair if undirected """
+        needed = []
+        for fromIdx, (inCost, _) in inArcs[nodeIdx].items():
+            candidates = {toIdx: inCost + outCost for toIdx, (outCost, _) in outArcs[nodeIdx].items()
+                          if toIdx != fromIdx and (topology.directed or toIdx > fromIdx)}
+            if candidates:
+                found = witnessCosts(fromIdx, nodeIdx, max(candidates.values()), candidates)
+                needed += [(fromIdx, toIdx, cost) for toIdx, cost in candidates.items()
+                           if toIdx not in found or found[toIdx] > cost]
+        return needed
+
+    def importance(nodeIdx, needed):
+        removed = len(outArcs[nodeIdx]) + (len(inArcs[nodeIdx]) if topology.directed else 0)
+        return len(needed) - removed + contractedNeighbours[nodeIdx]
+
+    contractedNeighbours = [0] * numNodes
+    nodeHeap = [(importance(nodeIdx, shortcuts(nodeIdx)), nodeIdx) for nodeIdx in range(numNodes)]
+    heapq.heapify(nodeHeap)
+    upArcs, downArcs = [None] * numNodes, [None] * numNodes  # the arcs of each node when contracted
+
+    def neighbourCount(nodeIdx):
+        return len(outArcs[nodeIdx].keys() | inArcs[nodeIdx].keys())
+
+    core = []
+    for step in itertools.count():
+        if not nodeHeap:
+            break
+        if step % 1024 == 0 and len(core) + sum(neighbourCount(queuedIdx) > coreDegree for _, queuedIdx in nodeHeap) \
+                > maxCoreShare * numNodes:
+            core += [queuedIdx for _, queuedIdx in nodeHeap]  # the core is or is about to be too large
+            break
+        _, nodeIdx = heapq.heappop(nodeHeap)
+        neighbours = outArcs[nodeIdx].keys() | inArcs[nodeIdx].keys()
+        if len(neighbours) > coreDegree:
+            core.append(nodeIdx)
+            continue
+        needed = shortcuts(nodeIdx)
+        nodeImportance = importance(nodeIdx, needed)
+        if nodeHeap and nodeImportance > nodeHeap[0][0]:  # got more important since queued
+            heapq.heappush(nodeHeap, (nodeImportance, nodeIdx))
+            continue
+        for fromIdx, toIdx, cost in needed:
+            if toIdx not in outArcs[fromIdx] or cost < outArcs[fromIdx][toIdx][0]:
+                outArcs[fromIdx][toIdx] = inArcs[toIdx][fromIdx] = (cost, nodeIdx)
+        upArcs[nodeIdx], downArcs[nodeIdx] = outArcs[nodeIdx], inArcs[nodeIdx]
+        for adjNode in neighbours:
+            outArcs[adjNode].pop(nodeIdx, None)
+            inArcs[adjNode].pop(nodeIdx, None)
+            contractedNeighbours[adjNode] += 1
+    for nodeIdx in core:
+        upArcs[nodeIdx], downArcs[nodeIdx] = outArcs[nodeIdx], inArcs[nodeIdx]
+
+    def toTopology(nodeArcs):
+        hierarchyOffsets, hierarchyTargets = array('q', [0]), array('q')
+        hierarchyWeights, middles = array(_typecode(weights)), array('q')
+        for arcs in nodeArcs:
+            hierarchyTargets.extend(arcs.keys())
+            for edgeVal, middle in arcs.values():
+                hierarchyWeights.append(edgeVal)
+                middles.append(middle)
+            hierarchyOffsets.append(len(hierarchyTargets))
+        return (topology._replace(offsets=hierarchyOffsets, targets=hierarchyTargets, weights=hierarchyWeights),
+                middles)
+
+    upward, upMiddles = toTopology(upArcs)
+    downward, downMiddles = toTopology(downArcs) if topology.directed else (upward, upMiddles)
+    inCore = array('b', bytes(numNodes))
+    for nodeIdx in core:
+        inCore[nodeIdx] = 1
+    return ContractionHierarchy(upward, downward, upMiddles, downMiddles, inCore, _topologyFingerprint(topology))
+
+
+def contractionHierarchyRoute(hierarchy: ContractionHierarchy, sourceIdx: int, targetIdx: int):
+    """ Routes from source to target (by index) for the least cost over the hierarchy's topology and returns
+        (path node indices, cost, bw, hops) as routePointToPoint() does, ([targetIdx], -1, 999, -1) when there is no
+        route. A Dijkstra climbs the hierarchy forward over upward from source and one backward over downward from
+        target, in turns, until their smallest queued cost reaches the best meeting route. The core nodes reached
+        are not expanded but start a bidirectional Dijkstra across the core, stopping once the two smallest queued
+        costs add up to the best route. The shortcuts of the route are then unpacked into the edges of the graph.
+    """
+    if sourceIdx == targetIdx:
+        return [sourceIdx], 0, 999, 0
+    tieBreak = itertools.count()
+    inCore = hierarchy.inCore
+    # per direction: (hierarchy topology, its middles, cost from its end, {node: (parent, edge)}, queue)
+    forward = (hierarchy.upward, hierarchy.upMiddles, {sourceIdx: 0}, {sourceIdx: None},
+               [(0, next(tieBreak), sourceIdx)])
+    backward = (hierarchy.downward, hierarchy.downMiddles, {targetIdx: 0}, {targetIdx: None},
+                [(0, next(tieBreak), targetIdx)])
+    bestCost, meetingIdx = float("inf"), None
+
+    def relax(searched, costs, parents, nodeHeap, otherCosts, node, cost):
+        """ Relaxes the arcs of node, returns the best (cost, meeting node) found through them or None """
+        offsets, targets, weights = searched.offsets, searched.targets, searched.weights
+        best = None
+        for edge in range(offsets[node], offsets[node + 1]):
+            adjNode, adjCost = targets[edge], cost + weights[edge]
+            if adjNode not in costs or adjCost < costs[adjNode]:
+                costs[adjNode] = adjCost
+                parents[adjNode] = (node, edge)
+                heapq.heappush(nodeHeap, (adjCost, next(tieBreak), adjNode))
+                if adjNode in otherCosts and (best is None or adjCost + otherCosts[adjNode] < best[0]):
+                    best = (adjCost + otherCosts[adjNode], adjNode)
+        return best
+
+    while forward[4] or backward[4]:  # up to the core
+        forwardTop = forward[4][0][0] if forward[4] else float("inf")
+        backwardTop = backward[4][0][0] if backward[4] else float("inf")
+        if min(forwardTop, backwardTop) >= bestCost:
+            break  # neither search can still reach a cheaper meeting node
+        (searched, _, costs, parents, nodeHeap), otherCosts = \
+            (forward, backward[2]) if forwardTop <= backwardTop else (backward, forward[2])
+        cost, _, node = heapq.heappop(nodeHeap)
+        if cost > costs[node]:  # stale entry
+            continue
+        if node in otherCosts and cost + otherCosts[node] < bestCost:
+            bestCost, meetingIdx = cost + otherCosts[node], node
+        if not inCore[node]:
+            relax(searched, costs, parents, nodeHeap, {}, node, cost)
+
+    for searched, _, costs, _, nodeHeap in (forward, backward):  # across the core, from the core nodes reached
+        nodeHeap[:] = [(cost, next(tieBreak), node) for node, cost in costs.items() if inCore[node]]
+        heapq.heapify(nodeHeap)
+    while forward[4] and backward[4] and forward[4][0][0] + backward[4][0][0] < bestCost:
+        (searched, _, costs, parents, nodeHeap), otherCosts = \
+            (forward, backward[2]) if forward[4][0][0] <= backward[4][0][0] else (backward, forward[2])
+        cost, _, node = heapq.heappop(nodeHeap)
+        if cost > costs[node]:  # stale entry
+            continue
+        meeting = relax(searched, costs, parents, nodeHeap, otherCosts, node, cost)
+        if meeting is not None and meeting[0] < bestCost:
+            bestCost, meetingIdx = meeting
+
+    if meetingIdx is None:
+        return [targetIdx], -1, 999, -1
+    hierarchyArcs = []  # (fromIdx, toIdx, edgeVal, middle) from source to target
+    for isForward, (searched, middles, _, parents, _) in ((True, forward), (False, backward)):
+        nodeIdx, arcs = meetingIdx, []
+        while parents[nodeIdx] is not None:
+            parentIdx, edge = parents[nodeIdx]
+            fromIdx, toIdx = (parentIdx, nodeIdx) if isForward else (nodeIdx, parentIdx)
+            arcs.append((fromIdx, toIdx, searched.weights[edge], middles[edge]))
+            nodeIdx = parentIdx
+        hierarchyArcs += reversed(arcs) if isForward else arcs
+    return _pathParams(sourceIdx, _unpackShortcuts(hierarchy, hierarchyArcs))
+
+
+def _unpackShortcuts(hierarchy, hierarchyArcs):
+    """ Returns the (nodeIdx, edgeVal) arcs of the graph along [(fromIdx, toIdx, edgeVal, middle)] hierarchy arcs.
+        A shortcut bypassing middle stands for the arcs fromIdx -> middle and middle -> toIdx middle had when it
+        was contracted, each maybe a shortcut again.
+    """
+    pathArcs, pending = [], hierarchyArcs[::-1]
+    while pending:
+        fromIdx, toIdx, edgeVal, middle = pending.pop()
+        if middle < 0:
+            pathArcs.append((toIdx, edgeVal))
+            continue
+        upEdge = _hierarchyEdge(hierarchy.upward, middle, toIdx)  # middle -> toIdx
+        downEdge = _hierarchyEdge(hierarchy.downward, middle, fromIdx)  # fromIdx -> middle
+        pending.append((middle, toIdx, hierarchy.upward.weights[upEdge], hierarchy.upMiddles[upEdge]))
+        pending.append((fromIdx, middle, hierarchy.downward.weights[downEdge], hierarchy.downMiddles[downEdge]))
+    return pathArcs
+
+
+def _hierarchyEdge(searched, nodeIdx, adjNodeIdx):
+    """ Returns the edge of the arc kept at nodeIdx to adjNodeIdx in a hierarchy topology, there is only one """
+    return next(edge for edge in range(searched.offsets[nodeIdx], searched.offsets[nodeIdx + 1])
+                if searched.targets[edge] == adjNodeIdx)
+
+
+def routeTopologyVectorised(topology: CompactTopology, rootIdx: int, routeCounters=None) -> RouteTable:
+    """ Minimum hop-count routing of the compact topology as a level-synchronous BFS using NumPy. Each level
+        gathers the adjacencies of the whole frontier, masks out visited nodes and scatters upstream nodes, hops,
+        cost and BW in a handful of array operations.
+
+        A node reached from several frontier nodes takes the first one in frontier order and the next frontier
+        is kept in discovery order, so the results are identical to the FIFO BFS engine.
+
+        Given a _RouteCounters the frontiers are counted in it as the queue: every frontier node is pushed and
+        popped once, the peak is the widest frontier.
+    """
+    assert (numpy is not None), " - The vectorised engine requires NumPy"
+    weightDtype = numpy.int64 if _typecode(topology.weights) == 'q' else numpy.float64
+    offsets = numpy.frombuffer(topology.offsets, dtype=numpy.int64)  # zero-copy views of the CSR arrays
+    targets = numpy.frombuffer(topology.targets, dtype=numpy.int64)
+    weights = numpy.frombuffer(topology.weights, dtype=weightDtype)
+
+    numNodes = len(topology.names)
+    upstream = numpy.arange(numNodes, dtype=numpy.int64)  # every node starts pointing to itself
+    valueToRoot = numpy.full(numNodes, -1, dtype=weightDtype)
+    lowestBwPipeToRoot = numpy.full(numNodes, 999, dtype=weightDtype)
+    numHopsFromRoot = numpy.full(numNodes, -1, dtype=numpy.int64)
+    valueToRoot[rootIdx] = 0
+    numHopsFromRoot[rootIdx] = 0
+
+    frontier = numpy.array([rootIdx], dtype=numpy.int64)
+    level = 0
+    if routeCounters is not None:
+        routeCounters.pushes, routeCounters.peak = 1, 1
+    while len(frontier) > 0:
+        if routeCounters is not None:
+            routeCounters.pops += len(frontier)
+        # gather the edge indices of every frontier node: for each node the run offsets[node]:offsets[node + 1]
+        starts = offsets[frontier]
+        counts = offsets[frontier + 1] - starts
+        runStarts = numpy.cumsum(counts) - counts
+        edges = numpy.arange(counts.sum(), dtype=numpy.int64) + numpy.repeat(starts - runStarts, counts)
+        parents = numpy.repeat(frontier, counts)
+        children = targets[edges]
+
+        # mask visited nodes and keep the first edge reaching each new node, in discovery order
+        unvisited = numHopsFromRoot[children] == -1
+        edges, parents, children = edges[unvisited], parents[unvisited], children[unvisited]
+        firstReached = numpy.sort(numpy.unique(children, return_index=True)[1])
+        edges, parents, frontier = edges[firstReached], parents[firstReached], children[firstReached]
+
+        level += 1
+        if routeCounters is not None:
+            routeCounters.pushes += len(frontier)
+            routeCounters.peak = max(routeCounters.peak, len(frontier))
+        numHopsFromRoot[frontier] = level
+        upstream[frontier] = parents
+        valueToRoot[frontier] = valueToRoot[parents] + weights[edges]
+        lowestBwPipeToRoot[frontier] = numpy.minimum(lowestBwPipeToRoot[parents], weights[edges])
+
+    typecode = _typecode(topology.weights)
+    return RouteTable(rootIdx, Routing.minHopCount, array('q', upstream.tobytes()),
+                      array(typecode, valueToRoot.tobytes()), array(typecode, lowestBwPipeToRoot.tobytes()),
+                      array('q', numHopsFromRoot.tobytes()))
+
+
+# Worker process state for Graph.routeFromMany(): the topology is handed over once per worker by the pool
+# initializer instead of being pickled with every root.
+_workerTopology = None
+
+
+def _initRouteWorker(topology):
+    global _workerTopology
+    _workerTopology = topology
+
+
+def _routeWorkerTask(rootIdx, routingType):
+    return routeTopology(_workerTopology, rootIdx, routingType)
+
+
+def partitionTopology(topology: CompactTopology, numShards: int, rounds: int = 8):
+    """ Splits the nodes of topology into numShards parts (shards) of about equal size with few edges between
+        them and returns the part of each node by node index, as an array. The nodes are first cut into equal
+        blocks in BFS order, which keeps neighbourhoods together, then label propagation moves each node to the
+        part most of its adjacent nodes are in, as long as that part stays within 5% of an equal share.
+    """
+    assert (numShards >= 1), " - numShards is %s: at least one shard is needed" % numShards
+    offsets, targets = topology.offsets, topology.targets
+    numNodes = len(topology.names)
+    order, visited = [], bytearray(numNodes)
+    for startIdx in range(numNodes):  # BFS order, component after component
+        if visited[startIdx]:
+            continue
+        visited[startIdx] = 1
+        position = len(order)
+        order.append(startIdx)
+        while position < len(order):
+            node = order[position]
+            position += 1
+            for edge in range(offsets[node], offsets[node + 1]):
+                if not visited[targets[edge]]:
+                    visited[targets[edge]] = 1
+                    order.append(targets[edge])
+
+    parts = array('q', [0]) * numNodes
+    for position, nodeIdx in enumerate(order):
+        parts[nodeIdx] = position * numShards // numNodes
+    sizes = [0] * numShards
+    for part in parts:
+        sizes[part] += 1
+    capacity = numNodes * 1.05 / numShards
+    for _ in range(rounds):
+        moved = 0
+        for nodeIdx in order:
+            counts = {}
+            for edge in range(offsets[nodeIdx], offsets[nodeIdx + 1]):
+                part = parts[targets[edge]]
+                counts[part] = counts.get(part, 0) + 1
+            part = parts[nodeIdx]
+            bestPart = max(counts, key=counts.get, default=part)
+            if counts.get(bestPart, 0) > counts.get(part, 0) and sizes[bestPart] + 1 <= capacity:
+                sizes[part] -= 1
+                sizes[bestPart] += 1
+                parts[nodeIdx] = bestPart
+                moved += 1
+        if not moved:
+            break
+    return parts
+
+
+# Sharded routing worker state, one shard per worker process (see Graph.shard()):
+#   _shardTopologies: {topologyKey: ({nodeIdx: local index}, node indices, offsets, targets, weights)}, the
+#       outgoing edges of the shard's nodes in local CSR form, targets by (global) node index
+#   _shardRoute: (route id, topologyKey, upstream, valueToRoot, lowestBwPipeToRoot, numHopsFromRoot) of the route
+#       in progress, by local index
+_shardTopologies = {}
+_shardRoute = None
+
+
+def _loadShardWorker(topologyKey, nodeIdxs, offsets, targets, weights):
+    global _shardRoute
+    _shardTopologies[topologyKey] = ({nodeIdx: localIdx for localIdx, nodeIdx in enumerate(nodeIdxs)}, nodeIdxs,
+                                     offsets, targets, weights)
+    _shardRoute = None
+
+
+def _labelRank(routingType, cost, bw, hops):
+    """ The value routingType optimizes a (cost, bw, hops) route label for, smaller is better """
+    if routingType == Routing.leastCost:
+        return cost
+    return -bw if routingType == Routing.bestBandwidth else hops
+
+
+def _relaxShardWorker(topologyKey, routingType, routeId, labels):
+    """ Offers the shard the route labels (nodeIdx, upstreamIdx, cost, bw, hops) for its nodes and routes on from
+        the nodes whose label changed over the shard's edges, best label first. Returns the labels offered to the
+        nodes of other shards across the shard boundary, the latest one per (node, adjNode) pair, and the
+        (pushes, pops, peak queue length, edges relaxed) work counters of the shard's queue.
+
+        A label as well ranked as the node's replaces it when it comes from the node's own upstream node, whose
+        label changed: the node's values follow its upstream node's so they stay those of the path traced.
+    """
+    global _shardRoute
+    localIdx, nodeIdxs, offsets, targets, weights = _shardTopologies[topologyKey]
+    if _shardRoute is None or _shardRoute[:2] != (routeId, topologyKey):
+        numNodes = len(nodeIdxs)
+        _shardRoute = (routeId, topologyKey, [-1] * numNodes, [-1] * numNodes, [999] * numNodes, [-1] * numNodes)
+    _, _, upstream, valueToRoot, lowestBwPipeToRoot, numHopsFromRoot = _shardRoute
+    tieBreak = itertools.count()
+    nodeHeap, boundaryLabels = [], {}
+    counters = [0, 0, 0, 0]  # pushes, pops, peak queue length, edges relaxed
+
+    def offer(localNode, upstreamIdx, cost, bw, hops):
+        if numHopsFromRoot[localNode] != -1:
+            label = (valueToRoot[localNode], lowestBwPipeToRoot[localNode], numHopsFromRoot[localNode])
+            rank, labelRank = _labelRank(routingType, cost, bw, hops), _labelRank(routingType, *label)
+            if rank > labelRank or (rank == labelRank and (upstream[localNode] != upstreamIdx or
+                                                           (cost, bw, hops) == label)):
+                return
+        upstream[localNode] = upstreamIdx
+        valueToRoot[localNode], lowestBwPipeToRoot[localNode], numHopsFromRoot[localNode] = cost, bw, hops
+        heapq.heappush(nodeHeap, (_labelRank(routingType, cost, bw, hops), next(tieBreak), localNode))
+        counters[0] += 1
+        counters[2] = max(counters[2], len(nodeHeap))
+
+    for nodeIdx, upstreamIdx, cost, bw, hops in labels:
+        offer(localIdx[nodeIdx], upstreamIdx, cost, bw, hops)
+    while nodeHeap:
+        rank, _, localNode = heapq.heappop(nodeHeap)
+        counters[1] += 1
+        cost, bw, hops = valueToRoot[localNode], lowestBwPipeToRoot[localNode], numHopsFromRoot[localNode]
+        if rank != _labelRank(routingType, cost, bw, hops):  # stale entry
+            continue
+        nodeIdx = nodeIdxs[localNode]
+        counters[3] += offsets[localNode + 1] - offsets[localNode]
+        for edge in range(offsets[localNode], offsets[localNode + 1]):
+            adjNode, edgeVal = targets[edge], weights[edge]
+            if adjNode == nodeIdx:  # a self loop never improves a route, but the root is its own upstream node
+                continue
+            if adjNode in localIdx:
+                offer(localIdx[adjNode], nodeIdx, cost + edgeVal, min(bw, edgeVal), hops + 1)
+            else:  # the latest label, over the best of any parallel edges: (sender's rank, label rank, label)
+                label = (adjNode, nodeIdx, cost + edgeVal, min(bw, edgeVal), hops + 1)
+                adjRank = _labelRank(routingType, *label[2:])
+                sent = boundaryLabels.get((adjNode, nodeIdx))
+                if sent is None or sent[0] != rank or adjRank <= sent[1]:
+                    boundaryLabels[adjNode, nodeIdx] = (rank, adjRank, label)
+    return [label for _, _, label in boundaryLabels.values()], counters
+
+
+def _shardLabelsWorker(routeId):
+    """ Returns (node indices, upstream, valueToRoot, lowestBwPipeToRoot, numHopsFromRoot) of the shard's nodes
+        for the route, or None when the route never reached the shard
+    """
+    if _shardRoute is None or _shardRoute[0] != routeId:
+        return None
+    return (_shardTopologies[_shardRoute[1]][1],) + _shardRoute[2:]
+
+
+def _setArcList(topology, nodeIdx, adjNodeIdx, edgeVals):
+    """ Returns a copy of topology where the arcs nodeIdx -> adjNodeIdx carry exactly edgeVals: existing arcs are
+        replaced where the first of them was, new ones are appended to nodeIdx's adjacencies. The topology itself
+        is never modified (copy-on-write), arrays are copied with memcpy and only the offsets after nodeIdx are
+        shifted, so routes computed from the old topology stay consistent. Returns topology unchanged if the
+        arcs already carry edgeVals.
+    """
+    offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+    start, end = offsets[nodeIdx], offsets[nodeIdx + 1]
+    run = [(targets[edge], weights[edge]) for edge in range(start, end)]
+    firstArc = next((i for i, (target, weight) in enumerate(run) if target == adjNodeIdx), len(run))
+    oldVals = [weight for target, weight in run if target == adjNodeIdx]
+    if oldVals == list(edgeVals):
+        return topology
+    run = [arc for arc in run[:firstArc] if arc[0] != adjNodeIdx] + [(adjNodeIdx, edgeVal) for edgeVal in edgeVals] \
+        + [arc for arc in run[firstArc:] if arc[0] != adjNodeIdx]
+
+    typecode = _typecode(weights)
+    if typecode == 'q' and _weightTypecode(edgeVals) == 'd':
+        typecode = 'd'  # promote all edge values to double
+    newOffsets, newTargets, newWeights = array('q'), array('q'), array(typecode)
+    newOffsets.frombytes(_rawBytes(offsets[:nodeIdx + 1]))
+    delta = len(run) - (end - start)
+    if delta:
+        newOffsets.extend(offset + delta for offset in offsets[nodeIdx + 1:])
+    else:
+        newOffsets.frombytes(_rawBytes(offsets[nodeIdx + 1:]))
+    newTargets.frombytes(_rawBytes(targets[:start]))
+    newTargets.extend(target for target, weight in run)
+    newTargets.frombytes(_rawBytes(targets[end:]))
+    if typecode == _typecode(weights):
+        newWeights.frombytes(_rawBytes(weights[:start]))
+        newWeights.extend(weight for target, weight in run)
+        newWeights.frombytes(_rawBytes(weights[end:]))
+    else:
+        newWeights.fromlist(weights[:start].tolist())
+        newWeights.extend(weight for target, weight in run)
+        newWeights.fromlist(weights[end:].tolist())
+    return topology._replace(offsets=newOffsets, targets=newTargets, weights=newWeights)
+
+
+def _arcVals(topology, nodeIdx, adjNodeIdx):
+    """ Returns the edge values of the arcs nodeIdx -> adjNodeIdx in adjacency order """
+    return [topology.weights[edge] for edge in range(topology.offsets[nodeIdx], topology.offsets[nodeIdx + 1])
+            if topology.targets[edge] == adjNodeIdx]
+
+
+def _addTopologyNode(topology, nodeNames):
+    """ Returns a copy of topology with one more node, without adjacencies, at the end """
+    offsets = array('q')
+    offsets.frombytes(_rawBytes(topology.offsets))
+    offsets.append(offsets[-1])
+    return topology._replace(names=nodeNames, offsets=offsets)
+
+
+def reverseTopology(topology: CompactTopology) -> CompactTopology:
+    """ Returns the topology with every arc reversed, i.e. each node's incoming edges (predecessors) in CSR form.
+        Incoming edges are listed in the order of their source nodes, like Node.predecessors.
+    """
+    offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+    numNodes = len(topology.names)
+    revOffsets = array('q', [0]) * (numNodes + 1)
+    for target in targets:
+        revOffsets[target + 1] += 1
+    for nodeIdx in range(numNodes):
+        revOffsets[nodeIdx + 1] += revOffsets[nodeIdx]
+
+    revTargets, revWeights = array('q', [0]) * len(targets), array(_typecode(weights), [0]) * len(targets)
+    cursors = revOffsets[:-1]
+    for nodeIdx in range(numNodes):
+        for edge in range(offsets[nodeIdx], offsets[nodeIdx + 1]):
+            target = targets[edge]
+            revTargets[cursors[target]] = nodeIdx
+            revWeights[cursors[target]] = weights[edge]
+            cursors[target] += 1
+    return topology._replace(offsets=revOffsets, targets=revTargets, weights=revWeights)
+
+
+def filterTopology(topology: CompactTopology, minEdgeVal) -> CompactTopology:
+    """ Returns the topology keeping only the edges valued minEdgeVal or more, each node's edges in the same order """
+    keep = [edgeVal >= minEdgeVal for edgeVal in topology.weights]
+    keptBefore = list(itertools.accumulate(keep, initial=0))  # kept edges ahead of each edge
+    return topology._replace(offsets=array('q', (keptBefore[offset] for offset in topology.offsets)),
+                             targets=array('q', itertools.compress(topology.targets, keep)),
+                             weights=array(_typecode(topology.weights), itertools.compress(topology.weights, keep)))
+
+
+def _routeArcVal(topology, nodeIdx, adjNodeIdx, routingType, upstreamBw):
+    """ Returns the edge value the engines route over among the (parallel) arcs nodeIdx -> adjNodeIdx, given the
+        lowest BW pipe upstream of nodeIdx: the first cheapest arc for least-cost, the first arc giving the fattest
+        pipe for best-bandwidth and the first arc for hop-count.
+    """
+    arcVals = _arcVals(topology, nodeIdx, adjNodeIdx)
+    if routingType == Routing.leastCost:
+        return min(arcVals)
+    if routingType == Routing.bestBandwidth:
+        fattestPipe = max(min(upstreamBw, arcVal) for arcVal in arcVals)
+        return next(arcVal for arcVal in arcVals if min(upstreamBw, arcVal) == fattestPipe)
+    return arcVals[0]
+
+
+def repairRoute(routeTable: RouteTable, topology: CompactTopology, reverse: CompactTopology, changedArcs):
+    """ Repairs a route after arcs of its topology changed, returning (repaired RouteTable, changed node indices).
+        topology and reverse are the changed topology and its reverseTopology(); changedArcs lists the
+        (nodeIdx, adjNodeIdx) pairs whose arcs were added, removed or changed value.
+
+        Only the affected part of the upstream tree is recomputed (dynamic shortest path): a changed tree arc
+        invalidates the subtree below it, which is re-seeded from its best intact predecessors, and an arc that
+        now offers a better route seeds its head node. A Dijkstra pass from the seeds then only touches nodes
+        whose route improves, and cost/BW/hops are re-derived down the subtrees of nodes whose route changed.
+        The optimized metric always equals that of a full re-route. Between equally good routes the repaired
+        tree may keep a different upstream node than a full re-route would pick.
+    """
+    routingType, rootIdx = routeTable.routingType, routeTable.root
+    upstream, valueToRoot = list(routeTable.upstream), list(routeTable.valueToRoot)
+    lowestBwPipeToRoot, numHopsFromRoot = list(routeTable.lowestBwPipeToRoot), list(routeTable.numHopsFromRoot)
+    offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+    numNodes = len(topology.names)
+
+    # the optimized label of a node (smaller is better) and its label when reached from nodeIdx over edgeVal
+    if routingType == Routing.leastCost:
+        def label(nodeIdx):
+            return valueToRoot[nodeIdx]
+
+        def labelVia(nodeIdx, edgeVal):
+            return valueToRoot[nodeIdx] + edgeVal
+    elif routingType == Routing.bestBandwidth:
+        def label(nodeIdx):
+            return -lowestBwPipeToRoot[nodeIdx]
+
+        def labelVia(nodeIdx, edgeVal):
+            return -min(lowestBwPipeToRoot[nodeIdx], edgeVal)
+    else:  # routingType == Routing.minHopCount
+        def label(nodeIdx):
+            return numHopsFromRoot[nodeIdx]
+
+        def labelVia(nodeIdx, edgeVal):
+            return numHopsFromRoot[nodeIdx] + 1
+
+    def children():
+        treeChildren = [[] for _ in range(numNodes)]
+        for nodeIdx, upstreamIdx in enumerate(upstream):
+            if upstreamIdx != nodeIdx:
+                treeChildren[upstreamIdx].append(nodeIdx)
+        return treeChildren
+
+    def attach(nodeIdx, upstreamIdx, edgeVal):
+        upstream[nodeIdx] = upstreamIdx
+        valueToRoot[nodeIdx] = valueToRoot[upstreamIdx] + edgeVal
+        lowestBwPipeToRoot[nodeIdx] = min(lowestBwPipeToRoot[upstreamIdx], edgeVal)
+        numHopsFromRoot[nodeIdx] = numHopsFromRoot[upstreamIdx] + 1
+
+    oldRoute = {}  # node index: route before the repair, for every node the repair touches
+
+    def touch(nodeIdx):
+        if nodeIdx not in oldRoute:
+            oldRoute[nodeIdx] = (upstream[nodeIdx], valueToRoot[nodeIdx], lowestBwPipeToRoot[nodeIdx],
+                                 numHopsFromRoot[nodeIdx])
+
+    # invalidate the subtrees below changed tree arcs
+    invalidRoots = [adjNodeIdx for nodeIdx, adjNodeIdx in changedArcs
+                    if adjNodeIdx != rootIdx and numHopsFromRoot[adjNodeIdx] != -1 and upstream[adjNodeIdx] == nodeIdx]
+    invalid = set()
+    if invalidRoots:
+        treeChildren = children()
+        stack = [nodeIdx for nodeIdx in invalidRoots if nodeIdx not in invalid]
+        invalid.update(stack)
+        while stack:
+            for childIdx in treeChildren[stack.pop()]:
+                if childIdx not in invalid:
+                    invalid.add(childIdx)
+                    stack.append(childIdx)
+        for nodeIdx in invalid:
+            touch(nodeIdx)
+            upstream[nodeIdx], valueToRoot[nodeIdx], lowestBwPipeToRoot[nodeIdx], numHopsFromRoot[nodeIdx] = \
+                nodeIdx, -1, 999, -1
+
+    def offer(nodeIdx, upstreamIdx, edgeVal):
+        """ Attaches nodeIdx via upstreamIdx if that is a better route, returns True if it did """
+        if nodeIdx == rootIdx or numHopsFromRoot[upstreamIdx] == -1:
+            return False
+        viaLabel = labelVia(upstreamIdx, edgeVal)
+        if numHopsFromRoot[nodeIdx] != -1 and not viaLabel < label(nodeIdx):
+            return False
+        touch(nodeIdx)
+        attach(nodeIdx, upstreamIdx, edgeVal)
+        return True
+
+    # seed the invalidated nodes from their intact predecessors and the heads of arcs offering a better route
+    tieBreak = itertools.count()
+    nodeHeap = []
+    for nodeIdx in invalid:
+        for edge in range(reverse.offsets[nodeIdx], reverse.offsets[nodeIdx + 1]):
+            if reverse.targets[edge] not in invalid:
+                offer(nodeIdx, reverse.targets[edge], reverse.weights[edge])
+        if numHopsFromRoot[nodeIdx] != -1:
+            heapq.heappush(nodeHeap, (label(nodeIdx), next(tieBreak), nodeIdx))
+    for nodeIdx, adjNodeIdx in changedArcs:
+        for edgeVal in _arcVals(topology, nodeIdx, adjNodeIdx):
+            if offer(adjNodeIdx, nodeIdx, edgeVal):
+                heapq.heappush(nodeHeap, (label(adjNodeIdx), next(tieBreak), adjNodeIdx))
+
+    # Dijkstra from the seeds, only improving routes
+    finalized = set()
+    while nodeHeap:
+        nodeLabel, _, nodeIdx = heapq.heappop(nodeHeap)
+        if nodeIdx in finalized or nodeLabel != label(nodeIdx):  # stale entry
+            continue
+        finalized.add(nodeIdx)
+        for edge in range(offsets[nodeIdx], offsets[nodeIdx + 1]):
+            adjNodeIdx = targets[edge]
+            if adjNodeIdx not in finalized and offer(adjNodeIdx, nodeIdx, weights[edge]):
+                heapq.heappush(nodeHeap, (label(adjNodeIdx), next(tieBreak), adjNodeIdx))
+
+    # re-derive cost, BW and hops down the subtrees of every node whose route changed, the route (path) of
+    # every node below them changed too
+    changed = set(nodeIdx for nodeIdx, route in oldRoute.items()
+                  if route != (upstream[nodeIdx], valueToRoot[nodeIdx], lowestBwPipeToRoot[nodeIdx],
+                               numHopsFromRoot[nodeIdx]))
+    if changed:
+        treeChildren = children()
+        below = set()  # every node in the subtrees of the changed nodes
+        stack = list(changed)
+        while stack:
+            for childIdx in treeChildren[stack.pop()]:
+                if childIdx not in below:
+                    below.add(childIdx)
+                    stack.append(childIdx)
+        # walk down from the top-most changed nodes so upstream nodes are always final before their children
+        nodeQ = deque(nodeIdx for nodeIdx in changed if nodeIdx not in below)
+        while nodeQ:
+            nodeIdx = nodeQ.pop()
+            for childIdx in treeChildren[nodeIdx]:
+                attach(childIdx, nodeIdx,
+                       _routeArcVal(topology, nodeIdx, childIdx, routingType, lowestBwPipeToRoot[nodeIdx]))
+                nodeQ.appendleft(childIdx)
+        changed |= below
+
+    changed = sorted(changed)
+    typecode = _typecode(weights)
+    return RouteTable(rootIdx, routingType, array('q', upstream), array(typecode, valueToRoot),
+                      array(typecode, lowestBwPipeToRoot), array('q', numHopsFromRoot)), changed
+
+
+def _routeTableBytes(routeTable):
+    """ Returns the bytes held by the arrays of a RouteTable """
+    return sum(memoryview(buffer).nbytes for buffer in routeTable[2:])
+
+
+class RouteCache(object):
+    """ Bounded Least Recently Used (LRU) cache of per-root RouteTables keyed by (root index, routingType,
+        topology version). Entries are evicted least recently used first once the arrays held exceed maxBytes;
+        a RouteTable larger than maxBytes on its own is not cached. RouteTables are never modified once built, so
+        cached ones are handed out as they are. hits, misses and evictions count the cache activity.
+    """
+
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()  # the cache is shared by the threads routing the same graph
+        self.entries = OrderedDict()  # key: RouteTable, least recently used first
+        self.nbytes = 0  # bytes held by the cached RouteTables
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """ Returns the cached RouteTable for key, marking it most recently used, or None (a miss) """
+        with self.lock:
+            routeTable = self.entries.get(key)
+            if routeTable is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return routeTable
+
+    def put(self, key, routeTable):
+        """ Caches routeTable under key as the most recently used entry, evicting entries over the budget """
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= _routeTableBytes(self.entries.pop(key))
+            tableBytes = _routeTableBytes(routeTable)
+            if tableBytes > self.maxBytes:
+                return
+            self.entries[key] = routeTable
+            self.nbytes += tableBytes
+            self._evict()
+
+    def resize(self, maxBytes):
+        """ Sets the memory budget, evicting least recently used entries until the cache fits in it """
+        with self.lock:
+            self.maxBytes = maxBytes
+            self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.maxBytes:
+            key, routeTable = self.entries.popitem(last=False)
+            self.nbytes -= _routeTableBytes(routeTable)
+            self.evictions += 1
+
+    def clear(self):
+        """ Drops every entry (e.g. after the topology changed); the counters are kept """
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+def _parseEdgeVal(token):
+    """ Returns an edge value read from a file as an int when possible, else a float """
+    try:
+        return int(token)
+    except ValueError:
+        return float(token)
+
+
+class _EdgeStream(object):
+    """ Accumulates the user adjacencies of a graph loader in flat arrays while names are interned to node
+        indices in order of first mention. Edges are kept in file order, so toTopology() only needs to group
+        them by source node when the file did not already list them grouped.
+    """
+
+    def __init__(self):
+        self.nodeIndex = {}
+        self.defined = bytearray()  # per node index: 1 once the node itself has been declared
+        self.sources = array('q')
+        self.targets = array('q')
+        self.weights = array('q')  # promoted to double on the first non-integer edge value
+
+    def intern(self, nodeName):
+        nodeIdx = self.nodeIndex.get(nodeName)
+        if nodeIdx is None:
+            nodeIdx = self.nodeIndex[nodeName] = len(self.nodeIndex)
+            self.defined.append(0)
+        return nodeIdx
+
+    def addEdge(self, nodeIdx, adjNodeIdx, adjNodeEdgeVal):
+        if self.weights.typecode == 'q' and not isinstance(adjNodeEdgeVal, int):
+            self.weights = array('d', self.weights)
+        self.sources.append(nodeIdx)
+        self.targets.append(adjNodeIdx)
+        self.weights.append(adjNodeEdgeVal)
+
+    def danglingRefs(self):
+        """ Returns the (nodeName, adjNodeName) adjacencies naming a node that was never itself declared """
+        if all(self.defined):
+            return []
+        nodeNames = list(self.nodeIndex.keys())
+        return [(nodeNames[nodeIdx], nodeNames[adjNodeIdx]) for nodeIdx, adjNodeIdx in zip(self.sources, self.targets)
+                if not self.defined[adjNodeIdx]]
+
+    def toTopology(self, directed):
+        """ Returns the user adjacencies as a CompactTopology, releasing the edge arrays as it goes """
+        numNodes, numEdges = len(self.nodeIndex), len(self.sources)
+        offsets = array('q', [0]) * (numNodes + 1)
+        for nodeIdx in self.sources:
+            offsets[nodeIdx + 1] += 1
+        for nodeIdx in range(numNodes):
+            offsets[nodeIdx + 1] += offsets[nodeIdx]
+
+        targets, weights = self.targets, self.weights
+        if any(self.sources[edge] > self.sources[edge + 1] for edge in range(numEdges - 1)):
+            # not grouped by source node: stable counting sort into CSR order
+            targets, weights = array('q', [0]) * numEdges, array(weights.typecode, [0]) * numEdges
+            cursors = offsets[:-1]
+            for edge, nodeIdx in enumerate(self.sources):
+                targets[cursors[nodeIdx]] = self.targets[edge]
+                weights[cursors[nodeIdx]] = self.weights[edge]
+                cursors[nodeIdx] += 1
+        self.sources = self.targets = self.weights = None
+
+        return CompactTopology(tuple(self.nodeIndex.keys()), directed, None, offsets, targets, weights)
+
+
+# Graph snapshot file layout (little-endian header, arrays in native byte order, every part 8 byte aligned):
+#   header: magic, version, flags (bit 0 directed, bit 1 big-endian arrays), node count, name table size, and
+#           topology count
+#   name table: JSON list of node names (str or int)
+#   per topology: kind (0 user adjacencies, 1 "min" merged, 2 "max" merged), weight typecode and edge count,
+#           followed by the offsets, targets and weights arrays
+_SNAPSHOT_MAGIC = b"GBFSNAP\0"
+_SNAPSHOT_VERSION = 1
+_SNAPSHOT_HEADER = struct.Struct("<8sIIqqq")
+_SNAPSHOT_TOPOLOGY = struct.Struct("<Bc6xq")
+_SNAPSHOT_KINDS = {None: 0, "min": 1, "max": 2}
+
+# Contraction hierarchy file layout (Graph.saveContractionHierarchy), native byte order, every section 8 byte aligned:
+#   header: magic, version, flags (bit 0 directed, bit 1 big endian), node count, fingerprint of the least-cost
+#           topology indexed, hierarchy topology count (1 undirected, 2 directed: upward then downward)
+#   core flags: one byte per node
+#   per hierarchy topology: weight typecode and arc count, followed by the offsets, targets, weights and middles
+#           arrays
+_HIERARCHY_MAGIC = b"GBFSCH\0\0"
+_HIERARCHY_VERSION = 1
+_HIERARCHY_HEADER = struct.Struct("<8sIIqqq")
+
+HIERARCHY_CORE_SHARE = 0.2  # largest core share of a contraction hierarchy answering point queries
+ROUTE_CACHE_BYTES = 64 * 1024 * 1024  # default memory budget of Graph.routeCache
+BANDWIDTH_VIEWS = 16  # bandwidth bucket topologies kept by a Graph, see bandwidthTopology()
+
+
+def _padTo8(size):
+    return -size % 8
+
+
+def _hasParallelArcs(topology):
+    """ Returns True if some node of topology has more than one arc to the same adjacent node """
+    offsets, targets = topology.offsets, topology.targets
+    return any(len(set(targets[offsets[nodeIdx]:offsets[nodeIdx + 1]])) < offsets[nodeIdx + 1] - offsets[nodeIdx]
+               for nodeIdx in range(len(offsets) - 1))
+
+
+class UndefinedAdjacencyError(ValueError):
+    """ Raised when user adjacencies name nodes that are not defined. danglingRefs lists every offending
+        (nodeName, adjNodeName) adjacency.
+    """
+
+    def __init__(self, danglingRefs):
+        self.danglingRefs = danglingRefs
+        super().__init__(" - Adjacency nodes %s are not defined nodes, referenced by: %s"
+                         % (list(dict.fromkeys(adjNodeName for _, adjNodeName in danglingRefs)),
+                            ", ".join("%r -> %r" % danglingRef for danglingRef in danglingRefs)))
+
+
 class Graph(object):
     """Graph object is the interface the user interacts with to graph his/her defined graph. """
 
-    def __init__(self, nodeAdjD: dict, direct: bool, log: object):
+    def __init__(self, nodeAdjD: dict, direct: bool, log: object, compact: bool = False, quiet: bool = False):
         """ Initializes Graph, verifies ajacencies are valid and creats node objects.
 
+            With compact=True no node objects are created: node names are interned to integer indices, the
+            connected topology is only held as a CompactTopology (CSR arrays) and the routing results as a
+            RouteTable of flat arrays. getPathAndParamsNode() returns the same results in both modes.
+
+            With quiet=True the graph runs non-interactively: no connect banner is printed and printPath() does
+            not pause for the logger output to catch up.
+
+            Adjacencies naming a node that is not a dictionary key raise UndefinedAdjacencyError, listing them all.
+            Parallel edges are merged like the two directions of an undirected link: the smallest value is kept
+            for cost and hop count routing, the largest for bandwidth.
+
             In C++ parlance, Node is a 'friend class' to Graph
         """
+        self._initState(direct, log, compact, quiet)
+
+        # Intern the node names to node indices once, then go through the user specified adjacency lists of
+        # adjacency tuples (adjNodeName, adjNodeEdgeVal) appending the adjacent node index and edge value. This one
+        # pass also verifies the adjacencies name legal nodes - i.e. there is a dictionary key for each adjacent
+        # node: a miss is only looked into once it happens, listing every dangling reference in the exception.
+        self.logger.info("Verifying user supplied node adjacencies are defined nodes in user provided dictionary")
+        nodeIndex = {nodeName: i for i, nodeName in enumerate(nodeAdjD.keys())}
+        offsets, targets, edgeVals = array('q', [0]), array('q'), []
+        try:
+            for adjacencies in nodeAdjD.values():
+                for adjNodeName, adjNodeEdgeVal in adjacencies:
+                    targets.append(nodeIndex[adjNodeName])
+                    edgeVals.append(adjNodeEdgeVal)
+                offsets.append(len(targets))
+        except KeyError:
+            raise UndefinedAdjacencyError([(nodeName, adjNodeName) for nodeName, adjacencies in nodeAdjD.items()
+                                           for adjNodeName, _ in adjacencies if adjNodeName not in nodeIndex]) \
+                from None
+
+        self.nodeAdjDict = nodeAdjD # user supplied adjacencies good so save them.
+        self.logger.info("Verified valid adjacencies")
+        self._initNodes(CompactTopology(tuple(nodeAdjD.keys()), direct, None, offsets, targets,
+                                        array(_weightTypecode(edgeVals), edgeVals)), nodeIndex)
+
+    @classmethod
+    def fromEdgeList(cls, path, direct: bool, log: object, compact: bool = True, quiet: bool = False):
+        """ Streams a graph from an edge-list text file, one 'nodeName adjNodeName [edgeValue]' per line (a
+            missing edge value reads as 0, a line with a single name declares an isolated node and lines
+            starting with '#' are comments). Every name in the file defines a node. Nodes are indexed in order of
+            first mention. Edges go straight into flat arrays without building a node adjacency dictionary, so
+            with compact=True the peak memory is about one copy of the graph.
+        """
+        graph = cls.__new__(cls)
+        graph._initState(direct, log, compact, quiet)
+        graph.logger.info("Loading edge list %s", path)
+
+        edges = _EdgeStream()
+        with open(path) as edgeFile:
+            for line in edgeFile:
+                fields = line.split()
+                if not fields or fields[0].startswith('#'):
+                    continue
+                nodeIdx = edges.intern(fields[0])
+                if len(fields) > 1:
+                    edges.addEdge(nodeIdx, edges.intern(fields[1]),
+                                  _parseEdgeVal(fields[2]) if len(fields) > 2 else 0)
+
+        graph.nodeAdjDict = None  # never materialized
+        graph._initNodes(edges.toTopology(direct), edges.nodeIndex)
+        return graph
+
+    @classmethod
+    def fromAdjacencyLines(cls, path, direct: bool, log: object, compact: bool = True, quiet: bool = False):
+        """ Streams a graph from a JSON-lines file where each line is a JSON object in the node adjacency
+            dictionary format, e.g. {"b": [["a", 5], ["c", 5]]}, defining one or more nodes. Adjacencies are
+            checked against the defined nodes in the same pass: every adjacency naming a node that no line
+            defines is reported at the end of the load.
+        """
+        graph = cls.__new__(cls)
+        graph._initState(direct, log, compact, quiet)
+        graph.logger.info("Loading adjacency lines %s", path)
+
+        edges = _EdgeStream()
+        with open(path) as adjFile:
+            for line in adjFile:
+                if not line.strip():
+                    continue
+                for nodeName, adjacencies in json.loads(line).items():
+                    nodeIdx = edges.intern(nodeName)
+                    edges.defined[nodeIdx] = 1
+                    for adjNodeName, adjNodeEdgeVal in adjacencies:
+                        edges.addEdge(nodeIdx, edges.intern(adjNodeName), adjNodeEdgeVal)
+
+        danglingRefs = edges.danglingRefs()
+        if danglingRefs:
+            raise UndefinedAdjacencyError(danglingRefs)
+        graph.logger.info("Verified valid adjacencies")
+
+        graph.nodeAdjDict = None  # never materialized
+        graph._initNodes(edges.toTopology(direct), edges.nodeIndex)
+        return graph
+
+    def save(self, path):
+        """ Writes the graph to a versioned binary snapshot: the node name table, the user adjacencies and the
+            connected topology of both edge merge policies, all in CSR form. A directed graph without parallel
+            edges connects the user adjacencies as given, so it only writes those. Graph.load() maps it back
+            without parsing, validating, merging or connecting anything.
+        """
+        assert all(isinstance(nodeName, (str, int)) for nodeName in self.nodeNames), \
+            " - Only str or int node names can be saved"
+        topologies = [self.userTopology]
+        for mergePolicy in ("min", "max"):
+            topology = self._compactTopology((self.directed, mergePolicy))
+            if topology is not self.userTopology:
+                topologies.append(topology)
+        nameTable = json.dumps(self.nodeNames).encode()
+        flags = (1 if self.directed else 0) | (2 if sys.byteorder == "big" else 0)
+
+        with open(path, "wb") as snapshotFile:
+            snapshotFile.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, flags, len(self.nodeNames),
+                                                     len(nameTable), len(topologies)))
+            snapshotFile.write(nameTable + bytes(_padTo8(len(nameTable))))
+            for topology in topologies:
+                snapshotFile.write(_SNAPSHOT_TOPOLOGY.pack(_SNAPSHOT_KINDS[topology.mergePolicy],
+                                                           _typecode(topology.weights).encode(),
+                                                           len(topology.targets)))
+                for buffer in (topology.offsets, topology.targets, topology.weights):
+                    snapshotFile.write(buffer)  # arrays and memoryviews both write their raw bytes
+
+    @classmethod
+    def load(cls, path, log: object, mmap: bool = True, compact: bool = True, quiet: bool = False):
+        """ Loads a graph written by save(). With mmap=True the file is memory mapped and the CSR arrays are typed
+            memoryviews of the mapping, so nothing but the name table is copied or parsed. With mmap=False the
+            file is read into memory first. Routes are identical to those of the graph that was saved.
+        """
+        graph = cls.__new__(cls)
+        with open(path, "rb") as snapshotFile:
+            if mmap:
+                snapshot = mmapModule.mmap(snapshotFile.fileno(), 0, access=mmapModule.ACCESS_READ)
+            else:
+                snapshot = snapshotFile.read()
+        snapshotView = memoryview(snapshot)
+
+        magic, version, flags, numNodes, nameTableSize, numTopologies = \
+            _SNAPSHOT_HEADER.unpack_from(snapshotView, 0)
+        assert (magic == _SNAPSHOT_MAGIC), " - %s is not a graph snapshot" % path
+        assert (version == _SNAPSHOT_VERSION), " - Graph snapshot version %i is not supported" % version
+        assert (bool(flags & 2) == (sys.byteorder == "big")), " - Graph snapshot byte order does not match"
+        directed = bool(flags & 1)
+        graph._initState(directed, log, compact, quiet)
+        graph.logger.info("Loading graph snapshot %s", path)
+
+        position = _SNAPSHOT_HEADER.size
+        nodeNames = tuple(json.loads(bytes(snapshotView[position:position + nameTableSize])))
+        position += nameTableSize + _padTo8(nameTableSize)
+
+        mergePolicies = {kind: mergePolicy for mergePolicy, kind in _SNAPSHOT_KINDS.items()}
+        topologies = []
+        for _ in range(numTopologies):
+            kind, weightTypecode, numEdges = _SNAPSHOT_TOPOLOGY.unpack_from(snapshotView, position)
+            position += _SNAPSHOT_TOPOLOGY.size
+            buffers = []
+            for typecode, length in (('q', numNodes + 1), ('q', numEdges), (weightTypecode.decode(), numEdges)):
+                buffers.append(snapshotView[position:position + 8 * length].cast(typecode))
+                position += 8 * length
+            topologies.append(CompactTopology(nodeNames, directed, mergePolicies[kind], *buffers))
+
+        graph.nodeAdjDict = None  # never materialized
+        graph._initNodes(topologies[0], {nodeName: i for i, nodeName in enumerate(nodeNames)})
+        for topology in topologies[1:]:
+            graph.compactTopologies[(directed, topology.mergePolicy)] = topology
+        return graph
+
+    def _initState(self, direct, log, compact, quiet):
+        """ Initializes the graph settings and per-route defaults shared by all the ways of building a graph """
         self.logger = log
         self.directed = direct
+        self.compact = compact
+        self.quiet = quiet  # non-interactive: no banners, no output delays
         self.rootNodeName = ""
         self.node2Name = ""
         self.routingType = Routing.minHopCount  # default but does not matter as it will be overwritten
         self.routingTypeStr = ""
+        self.routeCache = RouteCache(ROUTE_CACHE_BYTES)  # per-root RouteTables, see routeTableFrom()
+        self.profiling = False  # opt-in per phase timers and routing counters, see routeFromN1toN2()
+        self.stats = {}  # profile of the last routeFromN1toN2() when profiling
+        self._writeLock = threading.RLock()  # serializes routeFromN1toN2() and graph changes
+        self._editSeq = 0  # odd while the graph is being changed, see routeResult()
+        self.shardOf = None  # the shard of each node by node index for Engine.sharded, see shard()
+        self._shardPools = []  # a single worker process pool per shard
+        self._shardVersions = {}  # topologyVersion of the shard topologies loaded in the workers, by topologyKey
+        self._shardRouteIds = itertools.count(1)
 
-        # verify adj lists provided contain legal nodes - i.e. there is a dictionary key for each adjacent node
-        self.logger.info("Verifying user supplied node adjacencies are defined nodes in user provided dictionary")
-        for nodeName in nodeAdjD.keys():
-            for (adjName, adjEdgeVal) in nodeAdjD[nodeName]:
-                assert (adjName in nodeAdjD.keys()), " - Node %s: Adjacency node %s is not a defined node" \
-                                                         % (nodeName, adjName)
+    def _initNodes(self, userTopology, nodeIndex):
+        """ Installs the user adjacencies (as given, in CompactTopology form) and creates the node objects """
+        self.userTopology = userTopology
+        self.nodeNames = userTopology.names  # a node's index is its position
+        self.nodeIndex = nodeIndex
 
-        self.nodeAdjDict = nodeAdjD # user supplied adjacencies good so save them.
-        self.logger.info("Verified valid adjacencies")
+        if self.compact:
+            self.nodeObjDict = {}
+        else:
+            self.logger.info("Creating graph node objects:")
+            self.nodeObjDict = {nodeName: Node(nodeName) for nodeName in self.nodeNames}
 
-        self.logger.info("Creating graph node objects:")
-        self.nodeObjDict = {nodeName: Node(nodeName) for nodeName in nodeAdjD.keys()}
+        # connected topologies cached by (directed, edge merge policy), see connectAdj()
+        self.compactTopologies = {}
+        self.reverseTopologies = {}  # reverseTopology() of compactTopologies, same keys
+        self.connectedTopologies = {}  # node object adjacency/predecessor lists built from compactTopologies
+        self.connectedTopologyKey = None  # the cached topology currently attached to the node objects
+        self.bandwidthTopologies = OrderedDict()  # [topology, reverse] by bandwidth bucket, see bandwidthTopology()
+        self.edgeValLevels = None  # sorted distinct user edge values, the bandwidth bucket bounds
+        self.routeTable = None  # RouteTable of the last route when computed by the index based engines
+        self.topologyVersion = 0  # bumped by every change of the graph, part of the routeCache keys
+        self.publishedRoute = None  # RouteResult of the last route, replaced as a whole, see routeResult()
+        self.contractionHierarchy = None  # least-cost shortcut index, see buildContractionHierarchy()
+        self.contractionHierarchyUsed = False  # whether routePointToPoint() answers from it
 
     def connectAdj(self):
         """ Helper function to hook up adjacencies as directed or undirected and select values base on value
@@ -102,53 +2120,163 @@ class Graph(object):
             determined by the edge value type (e.g. Bandwidth or Cost). That is, if the user has specified a
             value (or different value) in each direction between adjacent nodes we need to select the highest
             if it represents BW and the lowest if it represents Cost.
+
+            The connected topology only depends on the graph direction and the edge merge policy (max for BW, min
+            for Cost), so it is built once per policy and cached. Re-routing with a policy that has already been
+            connected just re-attaches the cached adjacency and predecessor lists to the node objects. Unless
+            quiet, attaching a topology prints the banner naming the graph direction and routing type.
         """
+        topologyKey = self._topologyKey(self.routingType)
+        if topologyKey == self.connectedTopologyKey:
+            return  # node objects already hold this topology
 
-        self.logger.info("Connecting user specified adjacencies in instantiated node objects")
-        # For each Node Object, go through the user specified adjacency lists of adjacency tuples (adjNodeName,
-        # adjNodeEdgeVal) and create a list of actual adjacency object tuples (adjNode, adjNodeEdgeVal)
-        #
-        for nodeName in self.nodeObjDict.keys():
-            for adjNodeName, adjNodeEdgeVal in self.nodeAdjDict[nodeName]:
-                self.nodeObjDict[nodeName].adjacencies.append((self.nodeObjDict[adjNodeName], adjNodeEdgeVal))
-
-        # At this point we have all node adjacency objects loaded into the node objects assuming a Directed Graph
-        # if Undirected selected, then we need to go through each node's adjacencies and its adjacency's adjacency
-        # to make sure the largest (BW) or smallest (Cost) edge value is used (as determined by edge bw user spec).
-        # Further for an undirected (bi-directional) graph this edge values must be placed at both ends of the path
-        # (i.e. in the nodes adjacency list as well as the adjacency's adjacency list.)
-        time.sleep(.05)  # slight delay to pretty up output allowing logger output to catch up
-        print("%s Graph Selected based on %s: "  % ("Directed" if self.directed else "Undirected", self.routingTypeStr))
-        time.sleep(.05)  # slight delay to pretty up output allowing logger output to catch up
-
-        if not self.directed:
-            for nodeName in self.nodeObjDict.keys():
+        if not self.quiet:
+            time.sleep(.05)  # slight delay to pretty up output allowing logger output to catch up
+            print("%s Graph Selected based on %s: "
+                  % ("Directed" if self.directed else "Undirected", _ROUTING_TYPE_STRS[self.routingType]))
+            time.sleep(.05)  # slight delay to pretty up output allowing logger output to catch up
+        if self.compact:
+            self._compactTopology(topologyKey)
+        else:
+            for nodeName, (adjacencies, predecessors) in self._connectedTopology(topologyKey).items():
                 node = self.nodeObjDict[nodeName]
-                for i, (adjNode, adjEdgeVal) in enumerate(node.adjacencies):
-                    nodeEdgeVal = adjEdgeVal
-                    for j, (adjAdjNode, adjAdjEdgeVal) in enumerate(adjNode.adjacencies):
-                        if node.name == adjAdjNode.name:
-                            if self.routingType == Routing.bestBandwidth:
-                                nodeEdgeVal = max(adjEdgeVal, adjAdjEdgeVal)
-                            else:  # else edge value is cost so use the smallest
-                                nodeEdgeVal = min(adjEdgeVal, adjAdjEdgeVal)
-                            adjNode.adjacencies.pop(j)  # remove the node from the adjacent nodes list
-                            break
-                    # we should now have the new edge value for each end of he path with the corresponding adj adj node
-                    # removed
-                    node.adjacencies.pop(i)  # remove the adj node (both ends removed at this point)
-                    node.adjacencies.append((adjNode, nodeEdgeVal))  # put back new adjNode in nodes adjacencies
-                    adjNode.adjacencies.append((node, nodeEdgeVal))
-
-    def routeFromN1toN2(self, node1Name, node2Name, routingType):
+                node.adjacencies = adjacencies
+                node.predecessors = predecessors
+        self.connectedTopologyKey = topologyKey
+
+    def _topologyKey(self, routingType):
+        """ Returns the (directed, edge merge policy) connected topology cache key for routingType. The policy
+            merges the values of an undirected link's two directions and of parallel edges (see _mergeTopology()).
+        """
+        return (self.directed, "max" if routingType == Routing.bestBandwidth else "min")
+
+    def dropTopologyCaches(self):
+        """ Drops the cached connected topologies, compact, reverse, node object and bandwidth filtered, to be
+            built again from the user adjacencies on next use: to time building them, or to free their memory.
+            The graph is unchanged, so routes and cached RouteTables stay valid.
+        """
+        with self._writeLock:
+            self.compactTopologies = {}
+            self.reverseTopologies = {}
+            self.connectedTopologies = {}
+            self.connectedTopologyKey = None
+            self.bandwidthTopologies = OrderedDict()
+            self.edgeValLevels = None
+
+    def compactTopology(self, routingType):
+        """ Returns the (cached) CompactTopology of the graph connected for routingType """
+        return self._compactTopology(self._topologyKey(routingType))
+
+    def _compactTopology(self, topologyKey):
+        """ Returns the cached CompactTopology for topologyKey, building it on first use """
+        topology = self.compactTopologies.get(topologyKey)  # one lookup, the caches may be dropped meanwhile
+        if topology is None:
+            with self._writeLock:  # not from a graph being changed
+                topology = self.compactTopologies.get(topologyKey)
+                if topology is None:
+                    topology = self.compactTopologies[topologyKey] = self._buildCompactTopology(topologyKey[1])
+        return topology
+
+    def _reverseTopology(self, topologyKey):
+        """ Returns the cached reverse (incoming edge) CompactTopology for topologyKey, building it on first use.
+            An undirected topology is symmetric and is its own reverse.
+        """
+        reverse = self.reverseTopologies.get(topologyKey)
+        if reverse is None:
+            with self._writeLock:
+                reverse = self.reverseTopologies.get(topologyKey)
+                if reverse is None:
+                    topology = self._compactTopology(topologyKey)
+                    reverse = reverseTopology(topology) if self.directed else topology
+                    self.reverseTopologies[topologyKey] = reverse
+        return reverse
+
+    def _connectedTopology(self, topologyKey):
+        """ Returns the cached node object connected topology for topologyKey, building it on first use. Keys
+            sharing one CompactTopology (a directed graph without parallel edges) share it too.
+        """
+        connectedTopology = self.connectedTopologies.get(topologyKey)
+        if connectedTopology is None:
+            with self._writeLock:
+                connectedTopology = self.connectedTopologies.get(topologyKey)
+                if connectedTopology is None:
+                    topology = self._compactTopology(topologyKey)
+                    connectedTopology = next(
+                        (connectedTopology for connectedKey, connectedTopology in self.connectedTopologies.items()
+                         if self.compactTopologies.get(connectedKey) is topology), None) or \
+                        self._buildTopology(topologyKey)
+                    self.connectedTopologies[topologyKey] = connectedTopology
+        return connectedTopology
+
+    def _buildCompactTopology(self, mergePolicy):
+        """ Builds the CompactTopology straight from the user adjacencies, working on node indices only """
+        self.logger.info("Connecting user specified adjacencies")
+        return self._mergeTopology(self.userTopology, mergePolicy)
+
+    def _mergeTopology(self, userTopology, mergePolicy):
+        """ Returns the CompactTopology connecting userTopology, adjacencies in CompactTopology form """
+        if self.directed and not _hasParallelArcs(userTopology):
+            return userTopology  # edge values are used as given, shared by both merge policies
+
+        # For an undirected (bi-directional) graph each edge value must be placed at both ends of the path,
+        # using the largest (BW) or smallest (Cost) value if the user specified one in each direction. Parallel
+        # edges, directed or not, are merged the same way. Edge values are merged per (node, adjNode) pair in one
+        # pass over the user adjacencies, keeping the order in which each pair is first seen.
+        merge = max if mergePolicy == "max" else min
+        userOffsets, userTargets, userWeights = userTopology.offsets, userTopology.targets, userTopology.weights
+        endVals = [{} for _ in self.nodeNames]
+        for nodeIdx in range(len(self.nodeNames)):
+            for edge in range(userOffsets[nodeIdx], userOffsets[nodeIdx + 1]):
+                adjNodeIdx, adjNodeEdgeVal = userTargets[edge], userWeights[edge]
+                ends = ((nodeIdx, adjNodeIdx),) if self.directed else ((nodeIdx, adjNodeIdx), (adjNodeIdx, nodeIdx))
+                for endIdx, otherEndIdx in ends:
+                    vals = endVals[endIdx]
+                    if otherEndIdx in vals:
+                        vals[otherEndIdx] = merge(vals[otherEndIdx], adjNodeEdgeVal)
+                    else:
+                        vals[otherEndIdx] = adjNodeEdgeVal
+
+        offsets, targets, weights = array('q', [0]), array('q'), array(_typecode(userWeights))
+        for vals in endVals:
+            targets.extend(vals.keys())
+            weights.extend(vals.values())
+            offsets.append(len(targets))
+
+        return CompactTopology(self.nodeNames, self.directed, mergePolicy, offsets, targets, weights)
+
+    def _buildTopology(self, topologyKey):
+        """ Builds the {nodeName: (adjacencies, predecessors)} node object connected topology. The adjacency
+            lists of tuples (adjNode, adjNodeEdgeVal) are expanded from the CompactTopology.
+        """
+        topology = self._compactTopology(topologyKey)
+        offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+        nodes = [self.nodeObjDict[nodeName] for nodeName in self.nodeNames]
+        adjacencies = [[(nodes[targets[edge]], weights[edge]) for edge in range(offsets[i], offsets[i + 1])]
+                       for i in range(len(nodes))]
+
+        # Build the incoming edge (reverse adjacency) index so routing can find the nodes pointing at a node without
+        # rescanning every node in the graph. Nodes and adjacencies are walked in the same order the router used to
+        # scan them so ties are still resolved identically.
+        predecessors = {node: [] for node in nodes}
+        for node, nodeAdjacencies in zip(nodes, adjacencies):
+            for adjNode, adjNodeEdgeVal in nodeAdjacencies:
+                predecessors[adjNode].append((node, adjNodeEdgeVal))
+
+        return {node.name: (nodeAdjacencies, predecessors[node]) for node, nodeAdjacencies in zip(nodes, adjacencies)}
+
+    def routeFromN1toN2(self, node1Name, node2Name, routingType, engine=Engine.default):
         """ User function to route FROM node1(by name) to all nodes in the graph, optimized for routingType
             (Least-cost, Best Bandwidth, or Minimum HopCount). Node2 is provided in the interface as the
             user interested path and allows other functions to use Node1 and Node2 as defaults.
 
-            Nodes are enqueued for Breadth First Seach (BFS) from node1 through it's adjacencies, updating every
-            path to the best upstream route(towards node1) and node parameter values as we go.
+            By default least-cost is routed with Dijkstra and best-bandwidth with its max-bottleneck (widest path)
+            variant, both driven by a priority queue so each node is finalized once with its optimal upstream node.
+            Minimum hop-count is a plain Breadth First Search (BFS), or with engine=Engine.vectorised a NumPy
+            level-synchronous BFS giving the same results. Edge values are expected to be non-negative.
+            With engine=Engine.legacyBfs nodes are enqueued for BFS from node1 through it's adjacencies, updating
+            every path to the best upstream route(towards node1) and node parameter values as we go.
 
-            The BFS process will graph all nodes that have a path to the root(Node1) optimizing for routingType
+            The routing process will graph all nodes that have a path to the root(Node1) optimizing for routingType
             parameter. After the routing is complete all nodes will each hold all path parameters (cost, bandwidth,
             hops) from Node1 as well as their first hop node upstream towards the root (Node1). As stated above,
             only the routingType parameter will be optimized.
@@ -159,79 +2287,720 @@ class Graph(object):
             Note: We could have provided both routeFrom(root) as routeTo(root), but this is not needed
             as the above function provides both directions by reversing the nodes order given. Providing both
             would require a similar (but not the same) code with no no real value at the expense of additional code.
+
+            With self.profiling set, self.stats is replaced by a profile of the route: the seconds spent per
+            phase (validateSeconds, connectSeconds, routeSeconds and, with node objects, applySeconds), the
+            engine's work (nodesDequeued, edgesRelaxed, upstreamUpdates, peakQueueLength and for the legacy engine
+            predecessorsScanned) and routeCacheHit, all counted by the engine as it routes: the vectorised engine's
+            queue is its frontier, the sharded engine's the shard queues added up (peakQueueLength the largest
+            one, edgesRelaxed once per label update). The time spent tracing paths with getPathAndParamsNode()
+            afterwards adds up in backtrackSeconds and pathsTraced. Without profiling nothing is measured.
+
+            Routes and graph changes are serialized. When done the route is published as an immutable RouteResult
+            (see routeResult()), which other threads can keep reading while the next route runs.
+        """
+        with self._writeLock:
+            profiling = self.profiling
+            if profiling:
+                stats = {"engine": engine.name, "routingType": routingType.name}
+                phaseStart = time.perf_counter()
+
+            # verify user parameters
+            self.logger.info("Verifying user supplied nodes are defined in user provided dictionary")
+            assert (node1Name in self.nodeIndex), " - Provided Root Node %s: is not a defined node" \
+                                                             % (node1Name)
+            assert (node2Name in self.nodeIndex), " - Provided Root Node %s: is not a defined node" \
+                                                             % (node2Name)
+            if profiling:
+                phaseStart = _endPhase(stats, "validateSeconds", phaseStart)
+            # save parameters for later defaults
+            self.rootNodeName = node1Name
+            self.node2Name = node2Name
+            self.routingType = routingType
+
+            self.routingTypeStr = _ROUTING_TYPE_STRS[self.routingType]
+
+            # clear out old route info if user previously routed this object via different constraints
+            self.routeTable = None
+            for nodeName in self.nodeObjDict.keys():
+                self.nodeObjDict[nodeName].resetRoute()
+            self.connectAdj()  # connect adjacencies here vs. c'tor since routingType influences edge values selected
+            if profiling:
+                phaseStart = _endPhase(stats, "connectSeconds", phaseStart)
+                routeCounters = _RouteCounters()
+            else:
+                routeCounters = None
+
+            self.logger.info("ROUTING FROM NODE %s TO NODE %s using: %s", node1Name, node2Name, self.routingTypeStr)
+
+            if engine == Engine.legacyBfs:
+                assert (not self.compact), " - The legacy BFS engine requires node objects (compact=False)"
+                rootNode = self.nodeObjDict[self.rootNodeName]
+                rootNode.numHopsFromRoot = 0
+                rootNode.valueToRoot = 0
+                self._routeLegacyBfs(rootNode, routeCounters)
+                if profiling:
+                    phaseStart = _endPhase(stats, "routeSeconds", phaseStart)
+                    self._legacyRouteStats(stats, routeCounters)
+            else:
+                topology = self.compactTopology(self.routingType)
+                if engine == Engine.vectorised:
+                    assert (self.routingType == Routing.minHopCount), " - The vectorised engine only routes minHopCount"
+                    self.routeTable = routeTopologyVectorised(topology, self.nodeIndex[node1Name], routeCounters)
+                elif engine == Engine.sharded:
+                    self.routeTable = self._routeSharded(self.nodeIndex[node1Name], self.routingType, routeCounters)
+                else:
+                    self.routeTable = self.routeTableFrom(node1Name, self.routingType, routeCounters)
+                if profiling:
+                    phaseStart = _endPhase(stats, "routeSeconds", phaseStart)
+                    _routeTableStats(stats, routeCounters, topology, self.routeTable)
+                if not self.compact:
+                    self._applyRouteTable(self.routeTable)
+                    if profiling:
+                        _endPhase(stats, "applySeconds", phaseStart)
+            if profiling:
+                self.stats = stats
+            self._publishRoute(self._routeTableFor())
+
+    def _legacyRouteStats(self, stats, routeCounters):
+        """ Adds the work counters of a legacy BFS route to stats """
+        reached = [node for node in self.nodeObjDict.values() if node.numHopsFromRoot != -1]
+        stats.update(routeCacheHit=False, nodesDequeued=routeCounters.pops,
+                     edgesRelaxed=sum(len(node.adjacencies) for node in reached),
+                     predecessorsScanned=sum(len(node.predecessors) for node in reached),
+                     upstreamUpdates=routeCounters.pushes - 1 + routeCounters.backPatches,
+                     peakQueueLength=routeCounters.peak)
+
+    def _applyRouteTable(self, routeTable, nodeIdxs=None):
+        """ Copies a RouteTable into the per-root fields of the node objects, or only of the nodes in nodeIdxs """
+        if nodeIdxs is not None:
+            for nodeIdx in nodeIdxs:
+                node = self.nodeObjDict[self.nodeNames[nodeIdx]]
+                node.upstreamNodeToRoot = self.nodeObjDict[self.nodeNames[routeTable.upstream[nodeIdx]]]
+                node.valueToRoot = routeTable.valueToRoot[nodeIdx]
+                node.lowestBwPipeToRoot = routeTable.lowestBwPipeToRoot[nodeIdx]
+                node.numHopsFromRoot = routeTable.numHopsFromRoot[nodeIdx]
+            return
+        nodes = list(self.nodeObjDict.values())
+        for node, upstreamIdx, valueToRoot, lowestBwPipeToRoot, numHopsFromRoot in zip(
+                nodes, routeTable.upstream, routeTable.valueToRoot, routeTable.lowestBwPipeToRoot,
+                routeTable.numHopsFromRoot):
+            node.upstreamNodeToRoot = nodes[upstreamIdx]
+            node.valueToRoot = valueToRoot
+            node.lowestBwPipeToRoot = lowestBwPipeToRoot
+            node.numHopsFromRoot = numHopsFromRoot
+
+    def routeFromMany(self, roots, routingType, workers=None):
+        """ Routes from each root (by name) in roots to all nodes in the graph optimized for routingType and
+            returns a {rootName: RouteTable} dictionary. The node objects and the routeFromN1toN2 defaults are not
+            touched.
+
+            With workers > 1 the roots are spread over a process pool. The immutable CompactTopology is handed
+            to each worker once when it starts rather than pickled with every root. Otherwise the roots are
+            routed serially in this process with the same engines, giving identical results.
         """
+        with self._writeLock:
+            for rootName in roots:
+                assert (rootName in self.nodeIndex), " - Provided Root Node %s: is not a defined node" % rootName
+            topology = self.compactTopology(routingType)
+            routeTables = {rootName: self.routeCache.get((self.nodeIndex[rootName], routingType, self.topologyVersion))
+                           for rootName in roots}
+            missedRoots = [rootName for rootName, routeTable in routeTables.items() if routeTable is None]
+            rootIdxs = [self.nodeIndex[rootName] for rootName in missedRoots]
 
-        # verify user parameters
-        self.logger.info("Verifying user supplied nodes are defined in user provided dictionary")
-        assert (node1Name in self.nodeAdjDict.keys()), " - Provided Root Node %s: is not a defined node" \
-                                                         % (node1Name)
-        assert (node2Name in self.nodeAdjDict.keys()), " - Provided Root Node %s: is not a defined node" \
-                                                         % (node2Name)
-        # save parameters for later defaults
-        self.rootNodeName = node1Name
-        self.node2Name = node2Name
-        self.routingType = routingType
+            if workers is None or workers <= 1:
+                missedTables = [routeTopology(topology, rootIdx, routingType) for rootIdx in rootIdxs]
+            else:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_initRouteWorker,
+                                                            initargs=(topology,)) as pool:
+                    missedTables = list(pool.map(_routeWorkerTask, rootIdxs, itertools.repeat(routingType),
+                                                 chunksize=max(1, len(rootIdxs) // (4 * workers))))
+            for rootName, routeTable in zip(missedRoots, missedTables):
+                self.routeCache.put((routeTable.root, routingType, self.topologyVersion), routeTable)
+                routeTables[rootName] = routeTable
+            return routeTables
 
-        if self.routingType == Routing.leastCost:
-            self.routingTypeStr = "Least-cost"
-        elif self.routingType == Routing.bestBandwidth:
-            self.routingTypeStr = "Best-bandwidth"
-        else: #self.routingType == Routing.minHopCnt
-            self.routingTypeStr = "Minimum hop-count"
+    def shard(self, numShards, partition=None):
+        """ Sets the graph up for routeFromN1toN2(engine=Engine.sharded): the nodes are split into numShards
+            partitions (shards), each given its own worker process holding only the outgoing edges of its nodes.
+            partition maps every node name to its shard number (0 to numShards - 1), for instance by region,
+            otherwise the graph is split by partitionTopology(). Shards set up before are closed first.
 
-        # clear out old node info if user previously routed this object via different constraints
-        for nodeName in self.nodeObjDict.keys():
-            self.nodeObjDict[nodeName].resetNode()
-        self.connectAdj()  # connect adjacencies here vs. c'tor since routingType influences edge values selected
+            A sharded route is label-correcting: each worker routes on within its shard from the nodes whose
+            route improved, best first with the engine's ranking, and sends the labels reaching other shards'
+            nodes back. They are passed on to those shards, all shards with labels working at once, until no
+            route improves. The optimized value of every node is that of a single process route; between
+            equally good routes the path may differ.
+        """
+        assert (numShards >= 1), " - numShards is %s: at least one shard is needed" % numShards
+        with self._writeLock:
+            if partition is None:
+                shardOf = partitionTopology(self.compactTopology(Routing.leastCost), numShards)
+            else:
+                for nodeName in self.nodeNames:
+                    assert (nodeName in partition), " - Node %s: is not in the partition" % nodeName
+                    assert (0 <= partition[nodeName] < numShards), " - Node %s: shard %s is not a shard number" \
+                                                                     % (nodeName, partition[nodeName])
+                shardOf = array('q', (partition[nodeName] for nodeName in self.nodeNames))
+            self.closeShards()
+            self.shardOf = shardOf
+            self._shardPools = [concurrent.futures.ProcessPoolExecutor(max_workers=1) for _ in range(numShards)]
 
-        self.logger.info("ROUTING FROM NODE %s TO NODE %s using: %s" %(node1Name, node2Name, self.routingTypeStr))
+    def closeShards(self):
+        """ Stops the shard worker processes started by shard() """
+        with self._writeLock:
+            for pool in self._shardPools:
+                pool.shutdown()
+            self.shardOf, self._shardPools, self._shardVersions = None, [], {}
 
-        # prime the processing queue with the from node as root
-        nodeQ = deque()
-        nodeQ.appendleft(self.nodeObjDict[self.rootNodeName])
+    def _loadShards(self, topologyKey):
+        """ Hands each shard worker its part of the topology for topologyKey unless it holds the current one """
+        if self._shardVersions.get(topologyKey) == self.topologyVersion:
+            return
+        for nodeIdx in range(len(self.shardOf), len(self.nodeNames)):  # nodes added since, to the smallest shard
+            sizes = [0] * len(self._shardPools)
+            for shard in self.shardOf:
+                sizes[shard] += 1
+            self.shardOf.append(sizes.index(min(sizes)))
+        topology = self._compactTopology(topologyKey)
+        offsets, targets, weights = topology.offsets, topology.targets, topology.weights
+        shardNodes = [[] for _ in self._shardPools]
+        for nodeIdx, shard in enumerate(self.shardOf):
+            shardNodes[shard].append(nodeIdx)
+        futures = []
+        for pool, nodeIdxs in zip(self._shardPools, shardNodes):
+            shardOffsets, shardTargets, shardWeights = array('q', [0]), array('q'), array(_typecode(weights))
+            for nodeIdx in nodeIdxs:
+                shardTargets.extend(targets[offsets[nodeIdx]:offsets[nodeIdx + 1]])
+                shardWeights.extend(weights[offsets[nodeIdx]:offsets[nodeIdx + 1]])
+                shardOffsets.append(len(shardTargets))
+            futures.append(pool.submit(_loadShardWorker, topologyKey, nodeIdxs, shardOffsets, shardTargets,
+                                       shardWeights))
+        for future in futures:
+            future.result()
+        self._shardVersions[topologyKey] = self.topologyVersion
+
+    def _routeSharded(self, rootIdx, routingType, routeCounters=None):
+        """ Routes from root (by index) across the shard workers (see shard()) and returns the RouteTable. Given a
+            _RouteCounters the work of every shard queue is added up in it, the peak being the largest of them.
+        """
+        assert (self.shardOf is not None), " - The sharded engine requires the graph to be shard()ed first"
+        topologyKey = self._topologyKey(routingType)
+        self._loadShards(topologyKey)
+        routeId = next(self._shardRouteIds)
+        pending = {self.shardOf[rootIdx]: [(rootIdx, rootIdx, 0, 999, 0)]}  # boundary labels by shard
+        while pending:
+            futures = [self._shardPools[shard].submit(_relaxShardWorker, topologyKey, routingType, routeId, labels)
+                       for shard, labels in pending.items()]
+            pending = {}
+            for future in futures:
+                boundaryLabels, (pushes, pops, peak, edgesRelaxed) = future.result()
+                for label in boundaryLabels:
+                    pending.setdefault(self.shardOf[label[0]], []).append(label)
+                if routeCounters is not None:
+                    routeCounters.pushes += pushes
+                    routeCounters.pops += pops
+                    routeCounters.peak = max(routeCounters.peak, peak)
+                    routeCounters.edgesRelaxed = (routeCounters.edgesRelaxed or 0) + edgesRelaxed
+
+        numNodes = len(self.nodeNames)
+        typecode = _typecode(self._compactTopology(topologyKey).weights)
+        upstream, numHopsFromRoot = array('q', range(numNodes)), array('q', [-1]) * numNodes
+        valueToRoot, lowestBwPipeToRoot = array(typecode, [-1]) * numNodes, array(typecode, [999]) * numNodes
+        for future in [pool.submit(_shardLabelsWorker, routeId) for pool in self._shardPools]:
+            shardLabels = future.result()
+            if shardLabels is None:
+                continue
+            for nodeIdx, upstreamIdx, cost, bw, hops in zip(*shardLabels):
+                if hops != -1:
+                    upstream[nodeIdx], valueToRoot[nodeIdx] = upstreamIdx, cost
+                    lowestBwPipeToRoot[nodeIdx], numHopsFromRoot[nodeIdx] = bw, hops
+        return RouteTable(rootIdx, routingType, upstream, valueToRoot, lowestBwPipeToRoot, numHopsFromRoot)
+
+    def routePointToPoint(self, node1Name, node2Name, routingType):
+        """ Routes FROM node1 TO node2 only (by name) optimized for routingType and returns the same
+            (path, cost, bw, hops) tuple as getPathAndParamsNode(node2) after a full route from node1, without
+            routing the rest of the graph (see routePointToPoint()), or from the contraction hierarchy for
+            Routing.leastCost once one is built (see buildContractionHierarchy()). The node objects and the
+            routeFromN1toN2 defaults are not touched. Between equally good routes the path may differ from the full
+            route's.
+        """
+        assert (node1Name in self.nodeIndex), " - Provided Root Node %s: is not a defined node" % node1Name
+        assert (node2Name in self.nodeIndex), " - Provided Root Node %s: is not a defined node" % node2Name
+        hierarchy = self.contractionHierarchy
+        if routingType == Routing.leastCost and hierarchy is not None and self.contractionHierarchyUsed:
+            path, cost, bw, hopCnt = contractionHierarchyRoute(hierarchy, self.nodeIndex[node1Name],
+                                                               self.nodeIndex[node2Name])
+        else:
+            topologyKey = self._topologyKey(routingType)
+            path, cost, bw, hopCnt = routePointToPoint(self._compactTopology(topologyKey),
+                                                       self._reverseTopology(topologyKey), self.nodeIndex[node1Name],
+                                                       self.nodeIndex[node2Name], routingType)
+        return [self.nodeNames[nodeIdx] for nodeIdx in path], cost, bw, hopCnt
+
+    def buildContractionHierarchy(self, coreDegree=16, witnessSettled=32):
+        """ Preprocesses the least-cost topology into a ContractionHierarchy (see buildContractionHierarchy(),
+            0.2-16s at 10,000 nodes). Until the graph next changes, routePointToPoint() then answers
+            Routing.leastCost queries from it if its core holds at most HIERARCHY_CORE_SHARE of the nodes: on
+            grids, tori, scale-free graphs and fat-trees, 2.5-30 times faster than the bidirectional search.
+            On expander like (random) graphs the core stays large and searching it is no faster than the plain
+            search, so contraction stops early and queries keep to the search (contractionHierarchyUsed is False).
+        """
+        with self._writeLock:
+            self.logger.info("Building contraction hierarchy")
+            self._setContractionHierarchy(buildContractionHierarchy(self.compactTopology(Routing.leastCost),
+                                                                    coreDegree, witnessSettled,
+                                                                    HIERARCHY_CORE_SHARE))
+            return self.contractionHierarchy
+
+    def _setContractionHierarchy(self, hierarchy):
+        """ Installs hierarchy, answering least-cost point queries only if its core is small enough """
+        self.contractionHierarchy = hierarchy
+        self.contractionHierarchyUsed = sum(hierarchy.inCore) <= HIERARCHY_CORE_SHARE * len(hierarchy.inCore)
+        if not self.contractionHierarchyUsed:
+            self.logger.info("Contraction hierarchy core too large, least-cost point queries are searched")
+
+    def saveContractionHierarchy(self, path):
+        """ Writes the contraction hierarchy built by buildContractionHierarchy() to a versioned binary file.
+            loadContractionHierarchy() maps it back, for this graph or one with the same least-cost topology.
+        """
+        hierarchy = self.contractionHierarchy
+        assert (hierarchy is not None), " - No contraction hierarchy is built"
+        sections = [(hierarchy.upward, hierarchy.upMiddles)]
+        if self.directed:
+            sections.append((hierarchy.downward, hierarchy.downMiddles))
+        flags = (1 if self.directed else 0) | (2 if sys.byteorder == "big" else 0)
+
+        with open(path, "wb") as hierarchyFile:
+            hierarchyFile.write(_HIERARCHY_HEADER.pack(_HIERARCHY_MAGIC, _HIERARCHY_VERSION, flags,
+                                                       len(hierarchy.inCore), hierarchy.fingerprint, len(sections)))
+            hierarchyFile.write(hierarchy.inCore)
+            hierarchyFile.write(bytes(_padTo8(len(hierarchy.inCore))))
+            for topology, middles in sections:
+                hierarchyFile.write(_SNAPSHOT_TOPOLOGY.pack(0, _typecode(topology.weights).encode(),
+                                                            len(topology.targets)))
+                for buffer in (topology.offsets, topology.targets, topology.weights, middles):
+                    hierarchyFile.write(buffer)
+
+    def loadContractionHierarchy(self, path, mmap=True):
+        """ Loads a contraction hierarchy written by saveContractionHierarchy() and answers routePointToPoint()
+            Routing.leastCost queries from it. With mmap=True the file is memory mapped and its arrays are typed
+            memoryviews of the mapping. A hierarchy built for another least-cost topology is rejected.
+        """
+        with open(path, "rb") as hierarchyFile:
+            if mmap:
+                hierarchyData = mmapModule.mmap(hierarchyFile.fileno(), 0, access=mmapModule.ACCESS_READ)
+            else:
+                hierarchyData = hierarchyFile.read()
+        hierarchyView = memoryview(hierarchyData)
+
+        magic, version, flags, numNodes, fingerprint, numTopologies = \
+            _HIERARCHY_HEADER.unpack_from(hierarchyView, 0)
+        assert (magic == _HIERARCHY_MAGIC), " - %s is not a contraction hierarchy" % path
+        assert (version == _HIERARCHY_VERSION), " - Contraction hierarchy version %i is not supported" % version
+        assert (bool(flags & 2) == (sys.byteorder == "big")), " - Contraction hierarchy byte order does not match"
+        with self._writeLock:
+            topology = self.compactTopology(Routing.leastCost)
+            assert (bool(flags & 1) == self.directed and numNodes == len(self.nodeNames) and
+                    fingerprint == _topologyFingerprint(topology)), \
+                " - Contraction hierarchy %s was not built for this graph" % path
+            self.logger.info("Loading contraction hierarchy %s", path)
+
+            position = _HIERARCHY_HEADER.size
+            inCore = hierarchyView[position:position + numNodes].cast('b')
+            position += numNodes + _padTo8(numNodes)
+            sections = []
+            for _ in range(numTopologies):
+                _, weightTypecode, numArcs = _SNAPSHOT_TOPOLOGY.unpack_from(hierarchyView, position)
+                position += _SNAPSHOT_TOPOLOGY.size
+                buffers = []
+                for typecode, length in (('q', numNodes + 1), ('q', numArcs), (weightTypecode.decode(), numArcs),
+                                         ('q', numArcs)):
+                    buffers.append(hierarchyView[position:position + 8 * length].cast(typecode))
+                    position += 8 * length
+                sections.append((topology._replace(offsets=buffers[0], targets=buffers[1], weights=buffers[2]),
+                                 buffers[3]))
+            (upward, upMiddles), (downward, downMiddles) = sections[0], sections[-1]
+            self._setContractionHierarchy(ContractionHierarchy(upward, downward, upMiddles, downMiddles, inCore,
+                                                               fingerprint))
+            return self.contractionHierarchy
+
+    def kShortestPaths(self, node1Name, node2Name, routingType, k):
+        """ Returns up to k loopless routes FROM node1 TO node2 (by name), best first for routingType, each as the
+            (path, cost, bw, hops) tuple of getPathAndParamsNode() (see kShortestPaths()). The node objects and
+            the routeFromN1toN2 defaults are not touched.
+        """
+        assert (node1Name in self.nodeIndex), " - Provided Root Node %s: is not a defined node" % node1Name
+        assert (node2Name in self.nodeIndex), " - Provided Root Node %s: is not a defined node" % node2Name
+        topologyKey = self._topologyKey(routingType)
+        routes = kShortestPaths(self._compactTopology(topologyKey), self._reverseTopology(topologyKey),
+                                self.nodeIndex[node1Name], self.nodeIndex[node2Name], routingType, k)
+        return [([self.nodeNames[nodeIdx] for nodeIdx in path], cost, bw, hopCnt)
+                for path, cost, bw, hopCnt in routes]
+
+    def disjointPaths(self, node1Name, node2Name, routingType, nodeDisjoint=False):
+        """ Returns [primary, backup] routes FROM node1 TO node2 (by name) sharing no edge, or with nodeDisjoint
+            no node but node1 and node2, each as the (path, cost, bw, hops) tuple of getPathAndParamsNode() (see
+            disjointPaths()). Only [primary] is returned when no disjoint backup exists and [] when node2 is
+            unreachable. The node objects and the routeFromN1toN2 defaults are not touched.
+        """
+        assert (node1Name in self.nodeIndex), " - Provided Root Node %s: is not a defined node" % node1Name
+        assert (node2Name in self.nodeIndex), " - Provided Root Node %s: is not a defined node" % node2Name
+        topologyKey = self._topologyKey(routingType)
+        routes = disjointPaths(self._compactTopology(topologyKey), self._reverseTopology(topologyKey),
+                               self.nodeIndex[node1Name], self.nodeIndex[node2Name], routingType, nodeDisjoint)
+        return [([self.nodeNames[nodeIdx] for nodeIdx in path], cost, bw, hopCnt)
+                for path, cost, bw, hopCnt in routes]
+
+    def routeConstrained(self, node1Name, node2Name, minBw, maxHops=None):
+        """ Routes FROM node1 TO node2 only (by name) for the least cost over the edges of at least minBw, and
+            of at most maxHops hops when given, returning the (path, cost, bw, hops) tuple of getPathAndParamsNode()
+            with ([node2], -1, 999, -1) when there is no such route. Edges below minBw are filtered out before the
+            search (see bandwidthTopology()). The node objects and the routeFromN1toN2 defaults are not touched.
+        """
+        assert (node1Name in self.nodeIndex), " - Provided Root Node %s: is not a defined node" % node1Name
+        assert (node2Name in self.nodeIndex), " - Provided Root Node %s: is not a defined node" % node2Name
+        assert (maxHops is None or maxHops >= 0), " - maxHops is %s: a hop count can't be negative" % maxHops
+        sourceIdx, targetIdx = self.nodeIndex[node1Name], self.nodeIndex[node2Name]
+        topology = self.bandwidthTopology(minBw)
+        if sourceIdx == targetIdx:
+            pathArcs = []
+        elif maxHops is None:
+            pathArcs = _pointToPointLeastCost(topology, self._bandwidthReverseTopology(minBw), sourceIdx, targetIdx)
+        else:
+            pathArcs = _leastCostWithinHops(topology, sourceIdx, targetIdx, maxHops)
+        if pathArcs is None:
+            return [node2Name], -1, 999, -1
+        path, cost, bw, hopCnt = _pathParams(sourceIdx, pathArcs)
+        return [self.nodeNames[nodeIdx] for nodeIdx in path], cost, bw, hopCnt
+
+    def _bandwidthBucket(self, minBw):
+        """ Returns the smallest user edge value of at least minBw (None above them all), the lower bound of the
+            bucket of bandwidth thresholds keeping the same edges
+        """
+        if self.edgeValLevels is None:
+            self.edgeValLevels = sorted(set(self.userTopology.weights))
+        level = bisect.bisect_left(self.edgeValLevels, minBw)
+        return self.edgeValLevels[level] if level < len(self.edgeValLevels) else None
+
+    def bandwidthTopology(self, minBw):
+        """ Returns the (cached) CompactTopology of the graph connected for least cost routing over the edges of
+            at least minBw only, i.e. with every thinner user edge filtered out before merging an undirected
+            graph's edge values (see filterTopology()). Thresholds are bucketed by the edge values, all the
+            thresholds keeping the same edges share one topology, and the last BANDWIDTH_VIEWS used are kept.
+        """
+        return self._bandwidthTopologies(minBw)[0]
+
+    def _bandwidthReverseTopology(self, minBw):
+        """ Returns the cached reverse CompactTopology of bandwidthTopology(minBw), building it on first use """
+        topologies = self._bandwidthTopologies(minBw)
+        if topologies[1] is None:
+            with self._writeLock:
+                if topologies[1] is None:
+                    topologies[1] = reverseTopology(topologies[0]) if self.directed else topologies[0]
+        return topologies[1]
+
+    def _bandwidthTopologies(self, minBw):
+        """ Returns the cached [topology, reverse or None] of the bandwidth bucket of minBw, building it on
+            first use and dropping the least recently used bucket past BANDWIDTH_VIEWS
+        """
+        with self._writeLock:
+            bucket = self._bandwidthBucket(minBw)
+            if bucket in self.bandwidthTopologies:
+                self.bandwidthTopologies.move_to_end(bucket)
+            else:
+                userTopology = filterTopology(self.userTopology, float("inf") if bucket is None else bucket)
+                self.bandwidthTopologies[bucket] = [self._mergeTopology(userTopology, "min"), None]
+                if len(self.bandwidthTopologies) > BANDWIDTH_VIEWS:
+                    self.bandwidthTopologies.popitem(last=False)
+            return self.bandwidthTopologies[bucket]
+
+    def routeTableFrom(self, rootName, routingType, routeCounters=None):
+        """ Returns the RouteTable routing from root (by name) to all nodes optimized for routingType. It is
+            answered from routeCache when this root and routingType were routed since the graph last changed,
+            otherwise it is routed (default engine) and cached. The node objects are not touched.
+        """
+        return self.routeResult(rootName, routingType, routeCounters).routeTable
+
+    def routeResult(self, rootName="", routingType=None, routeCounters=None):
+        """ Returns an immutable RouteResult, safe to read from any thread without locking. With no rootName or
+            routingType it is the last route published by routeFromN1toN2() (None before the first route), read
+            as one reference so it is never a mix of two routes.
+
+            Otherwise it is the route of rootName (default the last root) and routingType (default the last one)
+            as routeTableFrom() gives it. Any number of threads may route this way at once, sharing the immutable
+            topology and the route cache. A graph change running meanwhile is detected (the edit sequence moved)
+            and the route is retried on the changed graph, so the result always matches its topologyVersion.
+            While a change is in progress the reader blocks on the write lock until it is done, rather than spin.
+        """
+        if rootName == "" and routingType is None:
+            return self.publishedRoute
+        rootName = rootName if rootName != "" else self.rootNodeName
+        routingType = routingType if routingType is not None else self.routingType
+        assert (rootName in self.nodeIndex), " - Provided Root Node %s: is not a defined node" % rootName
+        while True:
+            editSeq = self._editSeq
+            if editSeq % 2 == 1:  # being changed: wait for the change to finish, then route the changed graph
+                with self._writeLock:
+                    pass
+            else:
+                cacheKey = (self.nodeIndex[rootName], routingType, self.topologyVersion)
+                nodeNames = self.nodeNames
+                routeTable = self.routeCache.get(cacheKey)
+                if routeTable is None:
+                    routeTable = routeTopology(self.compactTopology(routingType), cacheKey[0], routingType,
+                                               routeCounters)
+                    if self._editSeq == editSeq:
+                        self.routeCache.put(cacheKey, routeTable)
+                if self._editSeq == editSeq:
+                    return RouteResult(rootName, routingType, cacheKey[2], nodeNames, self.nodeIndex, routeTable)
+
+    def _publishRoute(self, routeTable):
+        """ Publishes routeTable of the current root and routingType as the RouteResult of the last route """
+        self.publishedRoute = RouteResult(self.rootNodeName, self.routingType, self.topologyVersion,
+                                          self.nodeNames, self.nodeIndex, routeTable)
+
+    @contextlib.contextmanager
+    def _editing(self):
+        """ Serializes a graph change with routes and other changes, and marks it in progress for routeResult() """
+        with self._writeLock:
+            self._editSeq += 1
+            try:
+                yield
+            finally:
+                self._editSeq += 1
+
+    def getPathAndParamsTable(self, routeTable, endNode):
+        """ Same as getPathAndParamsNode() but answered from a RouteTable (e.g. one returned by routeFromMany) """
+        endIdx = self.nodeIndex[endNode]
+        path = [endNode]
+        usIdx = endIdx
+        while routeTable.upstream[usIdx] != usIdx:  # while node not pointing to itself
+            usIdx = routeTable.upstream[usIdx]
+            path.append(self.nodeNames[usIdx])  # back trace the path from node to root
+
+        path.reverse()
+
+        return path, routeTable.valueToRoot[endIdx], routeTable.lowestBwPipeToRoot[endIdx], \
+            routeTable.numHopsFromRoot[endIdx]
+
+    def setEdge(self, node1Name, node2Name, edgeVal):
+        """ Sets the value of the edge from node1 to node2, adding the edge if the nodes are not adjacent. In an
+            undirected graph the link is set in both directions. The current route is repaired incrementally,
+            returns the names of the nodes whose route changed (see repairRoute()).
+        """
+        with self._editing():
+            nodeIdx, adjNodeIdx = self._edgeNodes(node1Name, node2Name)
+            numArcs = len(_arcVals(self.userTopology, nodeIdx, adjNodeIdx))
+            userArcs = [(nodeIdx, adjNodeIdx, [edgeVal] * max(1, numArcs))]
+            if not self.directed:
+                numReverseArcs = len(_arcVals(self.userTopology, adjNodeIdx, nodeIdx))
+                userArcs.append((adjNodeIdx, nodeIdx, [edgeVal] * numReverseArcs))
+            return self._applyEdgeChanges(userArcs)
+
+    def removeEdge(self, node1Name, node2Name):
+        """ Removes the edge(s) from node1 to node2, in both directions in an undirected graph (e.g. a link
+            failure). The current route is repaired incrementally, returns the names of the nodes whose route
+            changed.
+        """
+        with self._editing():
+            nodeIdx, adjNodeIdx = self._edgeNodes(node1Name, node2Name)
+            userArcs = [(nodeIdx, adjNodeIdx, [])]
+            if not self.directed:
+                userArcs.append((adjNodeIdx, nodeIdx, []))
+            return self._applyEdgeChanges(userArcs)
+
+    def addNode(self, nodeName):
+        """ Adds a node without adjacencies (connect it with setEdge). It is unreached by the current route. """
+        with self._editing():
+            assert (nodeName not in self.nodeIndex), " - Node %s: is already a defined node" % nodeName
+            self.nodeNames += (nodeName,)
+            self.nodeIndex[nodeName] = len(self.nodeNames) - 1
+            self.nodeAdjDict = None  # the user dictionary no longer describes the graph
+            userTopology, self.userTopology = self.userTopology, _addTopologyNode(self.userTopology, self.nodeNames)
+            for topologyKey, topology in self.compactTopologies.items():
+                self.compactTopologies[topologyKey] = self.userTopology if topology is userTopology else \
+                    _addTopologyNode(topology, self.nodeNames)
+            for topologyKey in self.reverseTopologies.keys():
+                self.reverseTopologies[topologyKey] = self.compactTopologies[topologyKey] if not self.directed else \
+                    _addTopologyNode(self.reverseTopologies[topologyKey], self.nodeNames)
 
-        self.nodeObjDict[self.rootNodeName].numHopsFromRoot = 0
-        self.nodeObjDict[self.rootNodeName].valueToRoot = 0
+            if not self.compact:
+                node = self.nodeObjDict[nodeName] = Node(nodeName)
+                for connectedTopology in self.connectedTopologies.values():
+                    connectedTopology[nodeName] = ([], [])
+                if self.connectedTopologyKey is not None:
+                    node.adjacencies, node.predecessors = self.connectedTopologies[self.connectedTopologyKey][nodeName]
+
+            if self.routeTable is not None:
+                nodeIdx = self.nodeIndex[nodeName]
+                self.routeTable = self.routeTable._replace(
+                    upstream=self.routeTable.upstream + array('q', [nodeIdx]),
+                    valueToRoot=self.routeTable.valueToRoot + array(_typecode(self.routeTable.valueToRoot), [-1]),
+                    lowestBwPipeToRoot=self.routeTable.lowestBwPipeToRoot +
+                    array(_typecode(self.routeTable.lowestBwPipeToRoot), [999]),
+                    numHopsFromRoot=self.routeTable.numHopsFromRoot + array('q', [-1]))
+            self._topologyChanged()
+            return []
+
+    def removeNode(self, nodeName):
+        """ Removes every edge to and from the node, which stays defined but isolated (node indices don't move).
+            The current route is repaired incrementally, returns the names of the nodes whose route changed.
+        """
+        with self._editing():
+            assert (nodeName in self.nodeIndex), " - Node %s: is not a defined node" % nodeName
+            nodeIdx = self.nodeIndex[nodeName]
+            if self.directed:
+                outgoing, incoming = self.userTopology, self._reverseTopology((True, "min"))
+            else:
+                outgoing = incoming = self._compactTopology((False, "min"))  # holds each link in both directions
+            arcs = [(nodeIdx, outgoing.targets[edge])
+                    for edge in range(outgoing.offsets[nodeIdx], outgoing.offsets[nodeIdx + 1])]
+            arcs += [(incoming.targets[edge], nodeIdx)
+                     for edge in range(incoming.offsets[nodeIdx], incoming.offsets[nodeIdx + 1])]
+            return self._applyEdgeChanges([(arcNodeIdx, arcAdjNodeIdx, [])
+                                           for arcNodeIdx, arcAdjNodeIdx in dict.fromkeys(arcs)])
+
+    def _edgeNodes(self, node1Name, node2Name):
+        assert (node1Name in self.nodeIndex), " - Node %s: is not a defined node" % node1Name
+        assert (node2Name in self.nodeIndex), " - Node %s: is not a defined node" % node2Name
+        return self.nodeIndex[node1Name], self.nodeIndex[node2Name]
+
+    def _applyEdgeChanges(self, userArcs):
+        """ Sets the user arcs (nodeIdx, adjNodeIdx, edgeVals), patches every cached topology derived from them
+            and repairs the current route. Returns the names of the nodes whose route changed.
+        """
+        pairs, userTopology = [], self.userTopology
+        for nodeIdx, adjNodeIdx, edgeVals in userArcs:
+            self.userTopology = _setArcList(self.userTopology, nodeIdx, adjNodeIdx, edgeVals)
+            pairs.append((nodeIdx, adjNodeIdx))
+            if not self.directed:
+                pairs.append((adjNodeIdx, nodeIdx))
+        pairs = list(dict.fromkeys(pairs))
+        self.nodeAdjDict = None  # the user dictionary no longer describes the graph
+
+        changedArcs = {}
+        for topologyKey, topology in list(self.compactTopologies.items()):
+            if topology is userTopology:  # directed without parallel edges, the user adjacencies as given
+                newTopology = self.userTopology
+            else:
+                merge = max if topologyKey[1] == "max" else min
+                newTopology = topology
+                for nodeIdx, adjNodeIdx in pairs:
+                    userVals = _arcVals(self.userTopology, nodeIdx, adjNodeIdx)
+                    if not self.directed:
+                        userVals += _arcVals(self.userTopology, adjNodeIdx, nodeIdx)
+                    newTopology = _setArcList(newTopology, nodeIdx, adjNodeIdx, [merge(userVals)] if userVals else [])
+            changedArcs[topologyKey] = [(nodeIdx, adjNodeIdx) for nodeIdx, adjNodeIdx in pairs
+                                        if _arcVals(topology, nodeIdx, adjNodeIdx) !=
+                                        _arcVals(newTopology, nodeIdx, adjNodeIdx)]
+            self.compactTopologies[topologyKey] = newTopology
+
+            if topologyKey in self.reverseTopologies:
+                reverse = self.reverseTopologies[topologyKey] if self.directed else newTopology
+                if self.directed:
+                    for nodeIdx, adjNodeIdx in changedArcs[topologyKey]:
+                        reverse = _setArcList(reverse, adjNodeIdx, nodeIdx, _arcVals(newTopology, nodeIdx, adjNodeIdx))
+                self.reverseTopologies[topologyKey] = reverse
+
+            if topologyKey in self.connectedTopologies:
+                self._patchConnectedTopology(topologyKey, changedArcs[topologyKey])
+
+        changedNames = []
+        if self.routeTable is not None:
+            topologyKey = self._topologyKey(self.routingType)
+            if changedArcs.get(topologyKey):
+                self.routeTable, changedIdxs = repairRoute(self.routeTable, self._compactTopology(topologyKey),
+                                                           self._reverseTopology(topologyKey), changedArcs[topologyKey])
+                if not self.compact:
+                    self._applyRouteTable(self.routeTable, changedIdxs)
+                changedNames = [self.nodeNames[nodeIdx] for nodeIdx in changedIdxs]
+        self._topologyChanged()
+        return changedNames
+
+    def _topologyChanged(self):
+        """ Bumps the topology version, dropping every cached RouteTable but the (repaired) current route, and
+            publishes that route for the new version
+        """
+        self.topologyVersion += 1
+        self.routeCache.clear()
+        self.contractionHierarchy = None  # indexes the old topology
+        self.contractionHierarchyUsed = False
+        self.bandwidthTopologies = OrderedDict()
+        self.edgeValLevels = None
+        if self.routeTable is not None:
+            self.routeCache.put((self.routeTable.root, self.routingType, self.topologyVersion), self.routeTable)
+        if self.routeTable is not None:  # a legacy engine route is not repaired, its RouteResult stays as it was
+            self._publishRoute(self.routeTable)
+
+    def _patchConnectedTopology(self, topologyKey, changedArcs):
+        """ Rebuilds the node object adjacency and predecessor lists touched by changedArcs """
+        topology, reverse = self._compactTopology(topologyKey), self._reverseTopology(topologyKey)
+        connectedTopology = self.connectedTopologies[topologyKey]
+        for nodeIdx in set(nodeIdx for arc in changedArcs for nodeIdx in arc):
+            nodeName = self.nodeNames[nodeIdx]
+            connectedTopology[nodeName] = tuple(
+                [(self.nodeObjDict[self.nodeNames[buffers.targets[edge]]], buffers.weights[edge])
+                 for edge in range(buffers.offsets[nodeIdx], buffers.offsets[nodeIdx + 1])]
+                for buffers in (topology, reverse))
+            if topologyKey == self.connectedTopologyKey:
+                node = self.nodeObjDict[nodeName]
+                node.adjacencies, node.predecessors = connectedTopology[nodeName]
+
+    def _routeLegacyBfs(self, rootNode, routeCounters=None):
+        """ Original FIFO BFS engine: an upstream node is only back-patched from nodes already visited when the
+            node is dequeued, so for least-cost and best-bandwidth it may settle on a sub-optimal route. Kept
+            (selected via Engine.legacyBfs) so results can be compared against the priority queue engines.
+        """
+        # per node logging is level-guarded once so the loop doesn't pay for it when INFO is off
+        logInfo = self.logger.isEnabledFor(logging.INFO)
+
+        # prime the processing queue with the from node as root
+        nodeQ = deque() if routeCounters is None else _CountedDeque(routeCounters)
+        nodeQ.appendleft(rootNode)
 
         while len(nodeQ) > 0:
             node = nodeQ.pop()
-            self.logger.info("processing node %s" % node.name)
+            if logInfo:
+                self.logger.info("processing node %s", node.name)
 
             # On the node we're processing (node) first see if there is a better route to root (that is we want all
             # the upstream nodes to have the best route before enqueueing the next layer of nodes). To do this we
-            # will check if there is any node in the system (nodeNM), that we've visited, that points to node and its
+            # will check if there is any node in the system (predNode), that we've visited, that points to node and its
             # upstream parameter plus the edge value is a better path? Recall (node) was enqueued with the direct
-            # value from root via the Breadth First Search from root.
-            for nodeNm in self.nodeObjDict.keys():
-                if self.nodeObjDict[nodeNm].numHopsFromRoot != -1:  # make sure it's been visited previously
-                    for (adjNode, adjNodeEdgeVal) in self.nodeObjDict[nodeNm].adjacencies:
-                        if adjNode == node:
-                            # At this point we found a node in the system (nodeNM) that has an adjacent node that
-                            # points to the node we are processing. Is its US parameter + edge value a better path?
-                            if self.routingType == Routing.bestBandwidth:
-                                if ((self.nodeObjDict[nodeNm].lowestBwPipeToRoot > node.lowestBwPipeToRoot)
-                                        and (adjNodeEdgeVal > node.lowestBwPipeToRoot)):
-                                    self.logger.info("Fatter BW pipe to root found  via adjacent node %s with value %i"
-                                                % (self.nodeObjDict[nodeNm].name,
-                                                   min(self.nodeObjDict[nodeNm].lowestBwPipeToRoot, adjNodeEdgeVal)))
-                                    node.upstreamNodeToRoot = self.nodeObjDict[nodeNm]
-                                    node.lowestBwPipeToRoot = \
-                                        min(self.nodeObjDict[nodeNm].lowestBwPipeToRoot, adjNodeEdgeVal)
-                                    # update the cost to root along this path as well
-                                    node.valueToRoot = self.nodeObjDict[nodeNm].valueToRoot + adjNodeEdgeVal
-                                    node.numHopsFromRoot = self.nodeObjDict[nodeNm].numHopsFromRoot + 1
-
-                            elif self.routingType == Routing.leastCost:
-                                if self.nodeObjDict[nodeNm].valueToRoot + adjNodeEdgeVal < node.valueToRoot:
-                                    self.logger.info("Lower cost route found")
-                                    node.upstreamNodeToRoot = self.nodeObjDict[nodeNm]
-                                    node.valueToRoot = self.nodeObjDict[nodeNm].valueToRoot + adjNodeEdgeVal
-                                    # update the lowest bw pipe and hops to root along this route as well
-                                    node.lowestBwPipeToRoot = \
-                                        min(self.nodeObjDict[nodeNm].lowestBwPipeToRoot, adjNodeEdgeVal)
-                                    node.numHopsFromRoot = adjNode.numHopsFromRoot + 1
-                            # else self.routingType == Routing.minimumHopCount ( which we processed when we enqueued the
-                            # node for processing)
+            # value from root via the Breadth First Search from root. The nodes pointing at node are found via the
+            # reverse adjacency index built by connectAdj().
+            for (predNode, adjNodeEdgeVal) in node.predecessors:
+                if predNode.numHopsFromRoot != -1:  # make sure it's been visited previously
+                    # At this point we found a node in the system (predNode) that has an adjacent node that
+                    # points to the node we are processing. Is its US parameter + edge value a better path?
+                    if self.routingType == Routing.bestBandwidth:
+                        if ((predNode.lowestBwPipeToRoot > node.lowestBwPipeToRoot)
+                                and (adjNodeEdgeVal > node.lowestBwPipeToRoot)):
+                            if logInfo:
+                                self.logger.info("Fatter BW pipe to root found  via adjacent node %s with value %i",
+                                                 predNode.name, min(predNode.lowestBwPipeToRoot, adjNodeEdgeVal))
+                            if routeCounters is not None:
+                                routeCounters.backPatches += 1
+                            node.upstreamNodeToRoot = predNode
+                            node.lowestBwPipeToRoot = min(predNode.lowestBwPipeToRoot, adjNodeEdgeVal)
+                            # update the cost to root along this path as well
+                            node.valueToRoot = predNode.valueToRoot + adjNodeEdgeVal
+                            node.numHopsFromRoot = predNode.numHopsFromRoot + 1
+
+                    elif self.routingType == Routing.leastCost:
+                        if predNode.valueToRoot + adjNodeEdgeVal < node.valueToRoot:
+                            if logInfo:
+                                self.logger.info("Lower cost route found")
+                            if routeCounters is not None:
+                                routeCounters.backPatches += 1
+                            node.upstreamNodeToRoot = predNode
+                            node.valueToRoot = predNode.valueToRoot + adjNodeEdgeVal
+                            # update the lowest bw pipe and hops to root along this route as well
+                            node.lowestBwPipeToRoot = min(predNode.lowestBwPipeToRoot, adjNodeEdgeVal)
+                            node.numHopsFromRoot = node.numHopsFromRoot + 1
+                    # else self.routingType == Routing.minimumHopCount ( which we processed when we enqueued the
+                    # node for processing)
 
             # For this upstream node we go through it's adjacencies which have not been 'visited, initialize
             # them (i.e. numHopsFromRoot, upStreamNodeToRoot, lowestBwPipeToRoot, and value to root) and thread
@@ -245,9 +3014,10 @@ class Graph(object):
                     adjNode.lowestBwPipeToRoot = min(node.lowestBwPipeToRoot, adjNodeEdgeVal)
                     adjNode.valueToRoot = node.valueToRoot + adjNodeEdgeVal
                     nodeQ.appendleft(adjNode)
-                    self.logger.info("appending node %s" % adjNode.name)
+                    if logInfo:
+                        self.logger.info("appending node %s", adjNode.name)
 
-    def getPathAndParamsNode(self, endNode=""):
+    def getPathAndParamsNode(self, endNode="", rootNode="", routingType=None):
         """ Returns the path list of nodes between root and endNode (as previously graphed) along with
             parameters including hop-count, limiting-bandwidth, and total cost of route. The default
             end-node is self.node2
@@ -260,28 +3030,114 @@ class Graph(object):
             cost hop-count of this Best Bandwidth path. If hop-count is selected then the path with the least
             hops will be shown with the bandwidth parameter being the smallest (constricting) pipe in the path,
             and the cost will again simply be the cost of this path
+
+            Given a rootNode and/or routingType (defaulting to those last routed) the result is answered from the
+            RouteTable of that root and routingType (see routeTableFrom()) instead, without re-routing the graph
+            when it is cached.
         """
+        if not self.profiling:
+            return self._getPathAndParams(endNode, rootNode, routingType)
+        start = time.perf_counter()
+        pathAndParams = self._getPathAndParams(endNode, rootNode, routingType)
+        self.stats["backtrackSeconds"] = self.stats.get("backtrackSeconds", 0) + time.perf_counter() - start
+        self.stats["pathsTraced"] = self.stats.get("pathsTraced", 0) + 1
+        return pathAndParams
+
+    def _getPathAndParams(self, endNode, rootNode, routingType):
+        """ getPathAndParamsNode() """
         if endNode == "":
             endNode = self.node2Name
-        path = [endNode]
-        usNode = self.nodeObjDict[endNode]
-        while usNode.upstreamNodeToRoot != usNode:  # while node not pointing to itself
-            usNode = usNode.upstreamNodeToRoot
-            path.append(usNode.name)  # back trace the path from node to root
+        if rootNode != "" or routingType is not None:
+            return self.getPathAndParamsTable(self.routeTableFrom(rootNode if rootNode != "" else self.rootNodeName,
+                                                                  routingType if routingType is not None
+                                                                  else self.routingType), endNode)
+        # one consistent route even while the next one is rewriting the node objects
+        publishedRoute = self.publishedRoute
+        if publishedRoute is None or self.nodeIndex.get(endNode, -1) >= len(publishedRoute.nodeNames):
+            return [endNode], -1, 999, -1  # not routed yet (or added since), same as a fresh node object
+        return publishedRoute.getPathAndParams(endNode)
 
-        path.reverse()
+    def _routeTableFor(self, rootNode="", routingType=None):
+        """ Returns the RouteTable of the last route (built from the node objects when the legacy engine routed
+            it), or given a rootNode and/or routingType the RouteTable of that root and routingType
+        """
+        if rootNode != "" or routingType is not None:
+            return self.routeTableFrom(rootNode if rootNode != "" else self.rootNodeName,
+                                       routingType if routingType is not None else self.routingType)
+        if self.routeTable is not None:
+            return self.routeTable
+        # not routed yet, or routed by the legacy engine: the node objects (or their defaults) hold the route
+        nodes = [self.nodeObjDict.get(nodeName) or Node(nodeName) for nodeName in self.nodeNames]
+        nodeIdxs = {node: nodeIdx for nodeIdx, node in enumerate(nodes)}
+        valueToRoot = [node.valueToRoot for node in nodes]
+        lowestBwPipeToRoot = [node.lowestBwPipeToRoot for node in nodes]
+        return RouteTable(self.nodeIndex.get(self.rootNodeName, -1), self.routingType,
+                          array('q', [nodeIdxs[node.upstreamNodeToRoot] for node in nodes]),
+                          array(_weightTypecode(valueToRoot), valueToRoot),
+                          array(_weightTypecode(lowestBwPipeToRoot), lowestBwPipeToRoot),
+                          array('q', [node.numHopsFromRoot for node in nodes]))
+
+    def parentArray(self, rootNode="", routingType=None):
+        """ Returns all paths of the last route (or of rootNode and routingType, see getPathAndParamsNode()) as a
+            read-only view of the upstream node index of every node: the path to node i is i, parents[i],
+            parents[parents[i]] ... up to the node pointing to itself. Node indices are positions in nodeNames.
+        """
+        return memoryview(self._routeTableFor(rootNode, routingType).upstream).toreadonly()
+
+    def iterPaths(self, rootNode="", routingType=None):
+        """ Generates (endNode, path, cost, bw, hops) for every node, the same values getPathAndParamsNode()
+            returns for the last route (or of rootNode and routingType), without tracing each path back to root.
+
+            The upstream tree is walked depth first from the root, children in graph order, so each path is the
+            path of its upstream node (the previous one generated on that branch) plus the node itself. Nodes
+            without a path to the root follow at the end.
+        """
+        return self._iterTablePaths(self._routeTableFor(rootNode, routingType))
 
-        return path, self.nodeObjDict[endNode].valueToRoot, self.nodeObjDict[endNode].lowestBwPipeToRoot,\
-            self.nodeObjDict[endNode].numHopsFromRoot
+    def _iterTablePaths(self, routeTable):
+        """ iterPaths() of a RouteTable """
+        upstream, names = routeTable.upstream, self.nodeNames
+        numNodes = len(upstream)
+
+        # group the nodes by upstream node, in graph order (counting sort of the parent array)
+        childOffsets = [0] * (numNodes + 1)
+        for nodeIdx, upstreamIdx in enumerate(upstream):
+            if upstreamIdx != nodeIdx:
+                childOffsets[upstreamIdx + 1] += 1
+        for nodeIdx in range(numNodes):
+            childOffsets[nodeIdx + 1] += childOffsets[nodeIdx]
+        children, fill = [0] * childOffsets[numNodes], childOffsets[:numNodes]
+        for nodeIdx, upstreamIdx in enumerate(upstream):
+            if upstreamIdx != nodeIdx:
+                children[fill[upstreamIdx]] = nodeIdx
+                fill[upstreamIdx] += 1
+
+        path = []  # path to the node on top of the stack, shared down the branch
+        stack = [(routeTable.root, 0)] if routeTable.root >= 0 else []
+        while stack:
+            nodeIdx, depth = stack.pop()
+            del path[depth:]
+            path.append(names[nodeIdx])
+            yield names[nodeIdx], list(path), routeTable.valueToRoot[nodeIdx], \
+                routeTable.lowestBwPipeToRoot[nodeIdx], routeTable.numHopsFromRoot[nodeIdx]
+            stack.extend((children[edge], depth + 1)
+                         for edge in range(childOffsets[nodeIdx + 1] - 1, childOffsets[nodeIdx] - 1, -1))
+
+        for nodeIdx in range(numNodes):
+            if upstream[nodeIdx] == nodeIdx and nodeIdx != routeTable.root:
+                yield names[nodeIdx], [names[nodeIdx]], routeTable.valueToRoot[nodeIdx], \
+                    routeTable.lowestBwPipeToRoot[nodeIdx], routeTable.numHopsFromRoot[nodeIdx]
 
     def printFullInfo(self):
         """ For each node in the graph, prints all node info """
+        assert (not self.compact), " - Node info is only held by node objects (compact=False)"
         print("Printing full data on each node to root-node %s:" %self.rootNodeName)
         for node in self.nodeObjDict.keys():
             self.nodeObjDict[node].printMyInfo()
 
     def printAdjacencies(self):
         """ For each node in the graph,  prints the nodes adjacency list"""
+        assert (not self.compact), " - Adjacency lists are only held by node objects (compact=False)"
         for node in self.nodeObjDict.keys():
             self.nodeObjDict[node].printNodeAdjacencies()
 
@@ -292,18 +3148,152 @@ class Graph(object):
         if nodeNm == "":
             nodeNm = self.node2Name
         paths, cost, bw, hopCnt = self.getPathAndParamsNode(nodeNm)
-        time.sleep(.05)  # slight delay to pretty up output allowing logger output to catch up
+        if not self.quiet:
+            time.sleep(.05)  # slight delay to pretty up output allowing logger output to catch up
         print("From node: %s (root node) to node: %s via path: %s with Cost: %i, BW constrained pipe: %i, Hop-count: %i"
               % (self.rootNodeName, nodeNm, paths, cost, bw, hopCnt))
-        time.sleep(.05)  # slight delay to pretty up output allowing logger output to catch up
+        if not self.quiet:
+            time.sleep(.05)  # slight delay to pretty up output allowing logger output to catch up
 
     def printPaths(self):
         """ For each node, trace back to root (node1) via the upstreamNodeToRoot and print the path based
             on the last routeFromN1toN2()
         """
-        for nodeNm in self.nodeObjDict.keys():
+        for nodeNm in self.nodeNames:
             self.printPath(nodeNm)
 
+    def exportPaths(self, path, fileFormat="csv", rootNode="", routingType=None, stream=False):
+        """ Writes the getPathAndParamsNode() results of every node to the file at path in a single buffered
+            write, as CSV with a header row (the path column lists the node names separated by spaces) or with
+            fileFormat="jsonl" as one JSON object per line. Without a rootNode or routingType the last route is
+            exported, otherwise the route of that root and routingType (see routeTableFrom()).
+
+            Nodes are written in graph order. With stream=True they are written in iterPaths() order as they are
+            generated instead, so the paths are never all held in memory.
+        """
+        assert (fileFormat in ("csv", "jsonl")), " - Export format %s is not csv or jsonl" % fileFormat
+        routeTable = self._routeTableFor(rootNode, routingType)
+        rootNode = self.nodeNames[routeTable.root] if routeTable.root >= 0 else ""
+        pathsAndParams = self._iterTablePaths(routeTable)
+
+        with open(path, "w", newline="") as exportFile:
+            if stream:
+                self._writePaths(exportFile, fileFormat, rootNode, pathsAndParams)
+            else:
+                pathsAndParams = {nodeNm: params for nodeNm, *params in pathsAndParams}
+                exportBuffer = io.StringIO()
+                self._writePaths(exportBuffer, fileFormat, rootNode,
+                                 ((nodeNm, *pathsAndParams[nodeNm]) for nodeNm in self.nodeNames))
+                exportFile.write(exportBuffer.getvalue())
+
+    @staticmethod
+    def _writePaths(textFile, fileFormat, rootNode, pathsAndParams):
+        """ Writes (endNode, path, cost, bw, hops) records to textFile as CSV or JSON lines """
+        if fileFormat == "csv":
+            writer = csv.writer(textFile, lineterminator="\n")
+            writer.writerow(("root", "node", "path", "cost", "bandwidth", "hops"))
+            writer.writerows((rootNode, nodeNm, " ".join(str(pathNm) for pathNm in nodePath), cost, bw, hopCnt)
+                             for nodeNm, nodePath, cost, bw, hopCnt in pathsAndParams)
+        else:
+            textFile.writelines(json.dumps({"root": rootNode, "node": nodeNm, "path": nodePath, "cost": cost,
+                                            "bandwidth": bw, "hops": hopCnt}) + "\n"
+                                for nodeNm, nodePath, cost, bw, hopCnt in pathsAndParams)
+
+
+class RouteServiceBusy(RuntimeError):
+    """ Raised by RouteService when it already holds maxPending queries (back-pressure): retry later """
+
+
+class RouteService(object):
+    """ asyncio front-end answering (root, destination, routingType) route queries of a Graph. Routes run in a
+        thread pool executor through Graph.routeResult(), so the event loop is never blocked by routing.
+
+        Concurrent queries for the same root and routingType (on the same topology version) are coalesced into
+        one route whose RouteResult answers every waiting destination. At most maxPending queries are held at
+        once, beyond that a query raises RouteServiceBusy at once rather than queueing without bound.
+    """
+
+    def __init__(self, graph, maxWorkers=4, maxPending=1024):
+        self.graph = graph
+        self.maxPending = maxPending
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers)
+        self.inFlight = {}  # (rootName, routingType, topologyVersion): future of the RouteResult being routed
+        self.pending = 0  # queries being answered
+        self.routes = 0  # routes run
+        self.coalesced = 0  # queries answered by a route already running for another query
+        self.rejected = 0  # queries refused for back-pressure
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *excInfo):
+        self.close()
+
+    def close(self):
+        """ Waits for the running routes and shuts the executor down """
+        self.executor.shutdown(wait=True)
+
+    async def query(self, rootName, destName, routingType):
+        """ Returns the (path, cost, bw, hops) route from rootName to destName optimized for routingType, as
+            Graph.getPathAndParamsNode() would after routing from rootName
+        """
+        assert (rootName in self.graph.nodeIndex), " - Provided Root Node %s: is not a defined node" % rootName
+        assert (destName in self.graph.nodeIndex), " - Provided Root Node %s: is not a defined node" % destName
+        if self.pending >= self.maxPending:
+            self.rejected += 1
+            raise RouteServiceBusy("%i route queries pending" % self.pending)
+
+        self.pending += 1
+        try:
+            routeKey = (rootName, routingType, self.graph.topologyVersion)
+            routeFuture = self.inFlight.get(routeKey)
+            if routeFuture is None:
+                routeFuture = asyncio.get_running_loop().run_in_executor(self.executor, self.graph.routeResult,
+                                                                         rootName, routingType)
+                self.inFlight[routeKey] = routeFuture
+                routeFuture.add_done_callback(lambda done: self.inFlight.pop(routeKey, None))
+                self.routes += 1
+            else:
+                self.coalesced += 1
+            # shielded so a cancelled query doesn't cancel the route other queries wait for
+            routeResult = await asyncio.shield(routeFuture)
+            return routeResult.getPathAndParams(destName)
+        finally:
+            self.pending -= 1
+
+    async def handle(self, request):
+        """ Answers a JSON encoded request {"root": ..., "dest": ..., "routingType": Routing name} with a JSON
+            encoded response {"path": ..., "cost": ..., "bandwidth": ..., "hops": ...}, or {"error": "busy"} /
+            {"error": "badRequest", "message": ...}. This is the service's wire format.
+        """
+        try:
+            request = json.loads(request)
+            path, cost, bw, hopCnt = await self.query(request["root"], request["dest"],
+                                                      Routing[request["routingType"]])
+        except RouteServiceBusy:
+            return json.dumps({"error": "busy"})
+        except (AssertionError, KeyError, TypeError, ValueError) as error:
+            return json.dumps({"error": "badRequest", "message": str(error)})
+        return json.dumps({"path": path, "cost": cost, "bandwidth": bw, "hops": hopCnt})
+
+
+class InProcessRouteClient(object):
+    """ Client of a RouteService in the same process: requests go through the service's JSON wire format
+        (RouteService.handle()) as they would over the network, without any network.
+    """
+
+    def __init__(self, service):
+        self.service = service
+
+    async def route(self, rootName, destName, routingType):
+        """ Returns the (path, cost, bw, hops) route from rootName to destName optimized for routingType """
+        response = json.loads(await self.service.handle(json.dumps({"root": rootName, "dest": destName,
+                                                                    "routingType": routingType.name})))
+        if response.get("error") == "busy":
+            raise RouteServiceBusy("route service busy")
+        assert ("error" not in response), " - Bad route request: %s" % response.get("message")
+        return response["path"], response["cost"], response["bandwidth"], response["hops"]
+
 
 if __name__ == "__main__":
     logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
@@ -1,6 +1,17 @@
 # Module test_graphingBFS.py
 from graphingBFS import *
+import asyncio
+import contextlib
+import csv
+import io
+import json
 import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
 import unittest
 
 class Test(unittest.TestCase):
@@ -181,10 +192,17 @@ class Test(unittest.TestCase):
 
         directed = True  # bool: optionally False for Undirected graph
 
-        with self.assertRaises(AssertionError):
+        with self.assertRaises(UndefinedAdjacencyError):
             graph = Graph(nodeAdjDict, directed, logger)
             graph.routeFromN1toN2( 'a', 'c', Routing.bestBandwidth)  # 'a' is root node
 
+        # every dangling reference is reported, also when running optimized (python -O)
+        nodeAdjDict.update({'e': [('d', 8), ('y', 1)], 'g': [('f', 10), ('z', 2)]})
+        with self.assertRaises(UndefinedAdjacencyError) as raised:
+            Graph(nodeAdjDict, directed, logger)
+        self.assertEqual(raised.exception.danglingRefs, [('a', 'z'), ('e', 'y'), ('g', 'z')])
+        self.assertIn("'e' -> 'y'", str(raised.exception))
+
     def test2_assertBadPath(self):
         logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
         logger = logging.getLogger("Graphing")
@@ -213,5 +231,1044 @@ class Test(unittest.TestCase):
             graph = Graph(nodeAdjDict, directed, logger)
             graph.routeFromN1toN2('a', 'z', Routing.bestBandwidth)  # 'a' is root node
 
+    def test3_predecessorIndex(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # The reverse adjacency index must hold exactly the incoming edges of each node, for both graph types
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10)]}
+
+        for directed in (True, False):
+            graph = Graph(nodeAdjDict, directed, logger)
+            graph.routeFromN1toN2('a', 'c', Routing.leastCost)
+            incoming = {nodeNm: [] for nodeNm in nodeAdjDict.keys()}
+            for nodeNm, node in graph.nodeObjDict.items():
+                for adjNode, adjNodeEdgeVal in node.adjacencies:
+                    incoming[adjNode.name].append((nodeNm, adjNodeEdgeVal))
+            for nodeNm, node in graph.nodeObjDict.items():
+                self.assertEqual([(predNode.name, edgeVal) for predNode, edgeVal in node.predecessors],
+                                 incoming[nodeNm])
+
+    def test4_engines(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # On the reference graph the priority queue engines must agree with the legacy BFS for every root
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10)]}
+
+        for directed in (True, False):
+            graph = Graph(nodeAdjDict, directed, logger)
+            for rootNm in nodeAdjDict.keys():
+                for routingType in Routing:
+                    graph.routeFromN1toN2(rootNm, rootNm, routingType, Engine.legacyBfs)
+                    legacy = [graph.getPathAndParamsNode(nodeNm) for nodeNm in nodeAdjDict.keys()]
+                    graph.routeFromN1toN2(rootNm, rootNm, routingType)
+                    self.assertEqual([graph.getPathAndParamsNode(nodeNm) for nodeNm in nodeAdjDict.keys()], legacy)
+
+        # 'b' is first reached directly at cost 10 and its downstream node 'e' is enqueued before the cheaper
+        # a-c-d-b route is found. The legacy BFS never revisits 'b', Dijkstra finalizes it at cost 3.
+        nodeAdjDict = {'a': [('b', 10), ('c', 1)], 'b': [('e', 1)], 'c': [('d', 1)], 'd': [('b', 1)], 'e': []}
+        graph = Graph(nodeAdjDict, True, logger)
+        graph.routeFromN1toN2('a', 'e', Routing.leastCost, Engine.legacyBfs)
+        self.assertTestResult(graph, 'b', ['a', 'b'], 10, 10, 1)
+        graph.routeFromN1toN2('a', 'e', Routing.leastCost)
+        self.assertTestResult(graph, 'b', ['a', 'c', 'd', 'b'], 3, 1, 3)
+        self.assertTestResult(graph, 'e', ['a', 'c', 'd', 'b', 'e'], 4, 1, 4)
+
+        # widest path: the direct 2 unit pipe loses to the 5 unit pipes via 'c' and 'd'
+        nodeAdjDict = {'a': [('b', 2), ('c', 5)], 'b': [('e', 5)], 'c': [('d', 5)], 'd': [('b', 5)], 'e': []}
+        graph = Graph(nodeAdjDict, True, logger)
+        graph.routeFromN1toN2('a', 'e', Routing.bestBandwidth)
+        self.assertTestResult(graph, 'e', ['a', 'c', 'd', 'b', 'e'], 20, 5, 4)
+
+    def test5_connectedTopologyCache(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # 'd' and 'e' only appear as adjacencies, undirected they must still link back to 'b' and 'c'
+        nodeAdjDict = {'a': [], 'b': [('a', 20), ('d', 1)], 'c': [('b', 4), ('e', 11)], 'd': [], 'e': [],
+                       'f': [('a', 2)]}
+        graph = Graph(nodeAdjDict, False, logger)
+        graph.routeFromN1toN2('d', 'e', Routing.leastCost)
+        self.assertTestResult(graph, 'e', ['d', 'b', 'c', 'e'], 16, 1, 3)
+        self.assertTestResult(graph, 'f', ['d', 'b', 'a', 'f'], 23, 1, 3)
+
+        # re-routing reuses the topology connected for the same edge merge policy (minHopCount merges as cost)
+        adjacencies = graph.nodeObjDict['b'].adjacencies
+        graph.routeFromN1toN2('a', 'e', Routing.minHopCount)
+        self.assertIs(graph.nodeObjDict['b'].adjacencies, adjacencies)
+        graph.routeFromN1toN2('a', 'e', Routing.bestBandwidth)
+        self.assertIsNot(graph.nodeObjDict['b'].adjacencies, adjacencies)
+        graph.routeFromN1toN2('a', 'e', Routing.leastCost)
+        self.assertIs(graph.nodeObjDict['b'].adjacencies, adjacencies)
+        self.assertEqual(len(graph.connectedTopologies), 2)
+
+        # dropped caches are rebuilt on next use, the graph and its routes are unchanged
+        graph.dropTopologyCaches()
+        self.assertEqual((len(graph.compactTopologies), len(graph.connectedTopologies)), (0, 0))
+        graph.connectAdj()
+        self.assertIsNot(graph.nodeObjDict['b'].adjacencies, adjacencies)
+        graph.routeFromN1toN2('d', 'e', Routing.leastCost)
+        self.assertTestResult(graph, 'e', ['d', 'b', 'c', 'e'], 16, 1, 3)
+
+        # directed, the user adjacencies are shared by both policies unless parallel edges need merging
+        graph = Graph({'a': [('b', 5)], 'b': [('c', 2)], 'c': []}, True, logger)
+        self.assertIs(graph.compactTopology(Routing.leastCost), graph.compactTopology(Routing.bestBandwidth))
+        graph.routeFromN1toN2('a', 'c', Routing.leastCost)
+        adjacencies = graph.nodeObjDict['a'].adjacencies
+        graph.routeFromN1toN2('a', 'c', Routing.bestBandwidth)
+        self.assertIs(graph.nodeObjDict['a'].adjacencies, adjacencies)
+
+        for compact in (False, True):
+            graph = Graph({'a': [('b', 5), ('c', 1), ('b', 2)], 'b': [('c', 2), ('c', 7)], 'c': []}, True, logger,
+                          compact=compact)
+            self.assertEqual(list(graph.compactTopology(Routing.leastCost).weights), [2, 1, 2])
+            self.assertEqual(list(graph.compactTopology(Routing.bestBandwidth).weights), [5, 1, 7])
+            graph.routeFromN1toN2('a', 'c', Routing.bestBandwidth)
+            self.assertTestResult(graph, 'c', ['a', 'b', 'c'], 12, 5, 2)
+            graph.routeFromN1toN2('a', 'c', Routing.leastCost)
+            self.assertTestResult(graph, 'b', ['a', 'b'], 2, 2, 1)
+            graph.setEdge('a', 'b', 0)  # sets both parallel edges
+            self.assertTestResult(graph, 'b', ['a', 'b'], 0, 0, 1)
+            graph.removeNode('b')
+            self.assertTestResult(graph, 'c', ['a', 'c'], 1, 1, 1)
+
+    def test6_routeFromMany(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # batch routing, serial and over a process pool, must match routeFromN1toN2 called for each root
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10)]}
+        roots = list(nodeAdjDict.keys())
+
+        for directed in (True, False):
+            graph = Graph(nodeAdjDict, directed, logger)
+            for routingType in Routing:
+                serial = graph.routeFromMany(roots, routingType)
+                pooled = graph.routeFromMany(roots, routingType, workers=2)
+                self.assertEqual(serial, pooled)
+                for rootNm in roots:
+                    graph.routeFromN1toN2(rootNm, rootNm, routingType)
+                    for nodeNm in nodeAdjDict.keys():
+                        self.assertEqual(graph.getPathAndParamsTable(serial[rootNm], nodeNm),
+                                         graph.getPathAndParamsNode(nodeNm))
+
+    def test7_compactBackend(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # the compact (CSR, no node objects) backend must return the same paths and parameters
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10)]}
+
+        for directed in (True, False):
+            graph = Graph(nodeAdjDict, directed, logger)
+            compactGraph = Graph(nodeAdjDict, directed, logger, compact=True)
+            self.assertEqual(compactGraph.nodeObjDict, {})
+            self.assertEqual(compactGraph.getPathAndParamsNode('a'), graph.getPathAndParamsNode('a'))
+            for rootNm in nodeAdjDict.keys():
+                for routingType in Routing:
+                    graph.routeFromN1toN2(rootNm, 'a', routingType)
+                    compactGraph.routeFromN1toN2(rootNm, 'a', routingType)
+                    for nodeNm in nodeAdjDict.keys():
+                        self.assertEqual(compactGraph.getPathAndParamsNode(nodeNm), graph.getPathAndParamsNode(nodeNm))
+
+        with self.assertRaises(AssertionError):
+            compactGraph.routeFromN1toN2('a', 'c', Routing.leastCost, Engine.legacyBfs)
+
+    @unittest.skipIf(numpy is None, "NumPy not installed")
+    def test8_vectorisedBfs(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # the NumPy frontier BFS must pick the same upstream nodes as the FIFO BFS, including on ties
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10)]}
+        rand = random.Random(7)
+        randomAdjDict = {i: [(rand.randrange(300), rand.randint(1, 50)) for _ in range(rand.randrange(4))]
+                         for i in range(300)}
+
+        for adjDict in (nodeAdjDict, randomAdjDict):
+            for directed in (True, False):
+                graph = Graph(adjDict, directed, logger)
+                for rootNm in list(adjDict.keys())[:10]:
+                    graph.routeFromN1toN2(rootNm, rootNm, Routing.minHopCount)
+                    expected = [graph.getPathAndParamsNode(nodeNm) for nodeNm in adjDict.keys()]
+                    graph.routeFromN1toN2(rootNm, rootNm, Routing.minHopCount, Engine.vectorised)
+                    self.assertEqual([graph.getPathAndParamsNode(nodeNm) for nodeNm in adjDict.keys()], expected)
+
+        with self.assertRaises(AssertionError):
+            graph.routeFromN1toN2(0, 1, Routing.leastCost, Engine.vectorised)
+
+    def test9_streamingLoaders(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # graphs streamed from an edge list or adjacency lines file must route like the dictionary built graph
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10)]}
+
+        with tempfile.TemporaryDirectory() as tmpDir:
+            edgeListPath = os.path.join(tmpDir, "graph.edges")
+            with open(edgeListPath, "w") as edgeFile:
+                edgeFile.write("# node adjNode edgeValue\n")
+                for nodeNm, adjacencies in nodeAdjDict.items():
+                    for adjNm, edgeVal in adjacencies:
+                        edgeFile.write("%s %s %s\n" % (nodeNm, adjNm, edgeVal))
+            adjLinesPath = os.path.join(tmpDir, "graph.jsonl")
+            with open(adjLinesPath, "w") as adjFile:
+                for nodeNm, adjacencies in nodeAdjDict.items():
+                    adjFile.write(json.dumps({nodeNm: adjacencies}) + "\n")
+
+            for directed in (True, False):
+                graph = Graph(nodeAdjDict, directed, logger)
+                loadedGraphs = [Graph.fromEdgeList(edgeListPath, directed, logger),
+                                Graph.fromAdjacencyLines(adjLinesPath, directed, logger),
+                                Graph.fromAdjacencyLines(adjLinesPath, directed, logger, compact=False)]
+                for rootNm in nodeAdjDict.keys():
+                    for routingType in Routing:
+                        graph.routeFromN1toN2(rootNm, 'a', routingType)
+                        for loadedGraph in loadedGraphs:
+                            loadedGraph.routeFromN1toN2(rootNm, 'a', routingType)
+                            for nodeNm in nodeAdjDict.keys():
+                                self.assertEqual(loadedGraph.getPathAndParamsNode(nodeNm),
+                                                 graph.getPathAndParamsNode(nodeNm))
+
+            # edges listed out of source order are grouped per node, every dangling adjacency is reported
+            with open(edgeListPath, "w") as edgeFile:
+                edgeFile.write("a b 2.5\nb c 1\na c 4\nd\n")
+            graph = Graph.fromEdgeList(edgeListPath, True, logger)
+            self.assertEqual(graph.nodeNames, ('a', 'b', 'c', 'd'))
+            graph.routeFromN1toN2('a', 'c', Routing.leastCost)
+            self.assertTestResult(graph, 'c', ['a', 'b', 'c'], 3.5, 1, 2)
+            self.assertTestResult(graph, 'd', ['d'], -1, 999, -1)
+
+            with open(adjLinesPath, "w") as adjFile:
+                adjFile.write('{"a": [["z", 3], ["b", 1]]}\n{"b": [["y", 1]]}\n')
+            with self.assertRaises(UndefinedAdjacencyError) as raised:
+                Graph.fromAdjacencyLines(adjLinesPath, True, logger)
+            self.assertIn("'z'", str(raised.exception))
+            self.assertIn("'y'", str(raised.exception))
+
+    def test10_snapshot(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # a graph reloaded from a snapshot, mapped or read, must route byte for byte like the graph saved
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10.5)]}
+
+        with tempfile.TemporaryDirectory() as tmpDir:
+            snapshotPath = os.path.join(tmpDir, "graph.snapshot")
+            for directed in (True, False):
+                graph = Graph(nodeAdjDict, directed, logger)
+                graph.save(snapshotPath)
+                loadedGraphs = [Graph.load(snapshotPath, logger), Graph.load(snapshotPath, logger, mmap=False),
+                                Graph.load(snapshotPath, logger, compact=False)]
+                for loadedGraph in loadedGraphs:
+                    self.assertEqual(loadedGraph.directed, directed)
+                    self.assertEqual(loadedGraph.nodeNames, graph.nodeNames)
+                for rootNm in nodeAdjDict.keys():
+                    for routingType in Routing:
+                        graph.routeFromN1toN2(rootNm, 'a', routingType)
+                        for loadedGraph in loadedGraphs:
+                            loadedGraph.routeFromN1toN2(rootNm, 'a', routingType)
+                            for field in ("upstream", "valueToRoot", "lowestBwPipeToRoot", "numHopsFromRoot"):
+                                self.assertEqual(getattr(loadedGraph.routeTable, field).tobytes(),
+                                                 getattr(graph.routeTable, field).tobytes())
+                            for nodeNm in nodeAdjDict.keys():
+                                self.assertEqual(loadedGraph.getPathAndParamsNode(nodeNm),
+                                                 graph.getPathAndParamsNode(nodeNm))
+
+                # the mapped topology still goes to worker processes
+                self.assertEqual(loadedGraphs[0].routeFromMany(['a', 'c'], Routing.leastCost, workers=2),
+                                 graph.routeFromMany(['a', 'c'], Routing.leastCost))
+                del loadedGraphs
+
+            # the merged topologies of a directed graph with parallel edges are saved, not merged again on load
+            graph = Graph(dict(nodeAdjDict, a=[('b', 3), ('b', 1)]), True, logger)
+            graph.save(snapshotPath)
+            loadedGraph = Graph.load(snapshotPath, logger)
+            for mergePolicy, cost in (("min", 1), ("max", 3)):
+                self.assertIsInstance(loadedGraph.compactTopologies[(True, mergePolicy)].weights, memoryview)
+                self.assertEqual(list(loadedGraph.compactTopologies[(True, mergePolicy)].weights[:1]), [cost])
+            loadedGraph.routeFromN1toN2('a', 'd', Routing.leastCost)
+            self.assertEqual(loadedGraph.getPathAndParamsNode('d'), (['a', 'b', 'd'], 10, 1, 2))
+            del loadedGraph
+
+            with open(snapshotPath, "wb") as snapshotFile:
+                snapshotFile.write(b"not a graph snapshot at all, just some text")
+            with self.assertRaises(AssertionError):
+                Graph.load(snapshotPath, logger)
+
+
+    def test11_incrementalRerouting(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # a link failure on the sample graph: d can no longer reach b directly, so it goes round through c
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10.5)]}
+        graph = Graph(nodeAdjDict, True, logger)
+        graph.routeFromN1toN2('a', 'd', Routing.leastCost)
+        self.assertEqual(graph.getPathAndParamsNode('d'), (['a', 'b', 'd'], 12, 3, 2))
+        self.assertEqual(graph.removeEdge('b', 'd'), ['d'])
+        self.assertEqual(graph.getPathAndParamsNode('d'), (['a', 'b', 'c', 'd'], 15, 3, 3))
+        self.assertEqual(graph.setEdge('b', 'd', 1), ['d'])
+        self.assertEqual(graph.getPathAndParamsNode('d'), (['a', 'b', 'd'], 4, 1, 2))
+        graph.addNode('h')
+        self.assertEqual(graph.getPathAndParamsNode('h'), (['h'], -1, 999, -1))
+        self.assertEqual(graph.setEdge('d', 'h', 2), ['h'])
+        self.assertEqual(graph.getPathAndParamsNode('h'), (['a', 'b', 'd', 'h'], 6, 1, 3))
+        self.assertEqual(graph.removeNode('b'), ['b', 'c', 'd', 'h'])
+        self.assertEqual(graph.getPathAndParamsNode('h'), (['h'], -1, 999, -1))
+
+        # on random graphs every repaired route must be as good as a full re-route of the changed topology and
+        # the nodes reported changed must be exactly the nodes whose route differs
+        optimised = {Routing.leastCost: "valueToRoot", Routing.bestBandwidth: "lowestBwPipeToRoot",
+                     Routing.minHopCount: "numHopsFromRoot"}
+        for seed in range(12):
+            rand = random.Random(seed)
+            names = ["n%i" % i for i in range(30)]
+            nodeAdjDict = {nodeName: [(rand.choice(names), rand.choice([1, 2, 3, 4.5])) for _ in range(2)]
+                           for nodeName in names}
+            routingType = list(Routing)[seed % 3]
+            for compact in (False, True):
+                graph = Graph(nodeAdjDict, seed % 2 == 0, logger, compact=compact)
+                graph.routeFromN1toN2('n0', 'n1', routingType)
+                for step in range(25):
+                    before = graph.routeTable
+                    change = rand.random()
+                    if change < 0.5:
+                        changedNames = graph.setEdge(rand.choice(graph.nodeNames), rand.choice(graph.nodeNames),
+                                                     rand.choice([1, 2, 3, 4.5]))
+                    elif change < 0.85:
+                        changedNames = graph.removeEdge(rand.choice(graph.nodeNames), rand.choice(graph.nodeNames))
+                    elif change < 0.92:
+                        changedNames = graph.addNode("added%i" % step)
+                    else:
+                        changedNames = graph.removeNode(rand.choice(graph.nodeNames[1:]))
+                    full = routeTopology(graph.compactTopology(routingType), graph.nodeIndex['n0'], routingType)
+                    self.assertEqual(list(getattr(graph.routeTable, optimised[routingType])),
+                                     list(getattr(full, optimised[routingType])))
+                    diff = [nodeName for nodeIdx, nodeName in enumerate(graph.nodeNames)
+                            if nodeIdx < len(before.upstream) and
+                            any(getattr(graph.routeTable, field)[nodeIdx] != getattr(before, field)[nodeIdx]
+                                for field in ("upstream", "valueToRoot", "lowestBwPipeToRoot", "numHopsFromRoot"))]
+                    self.assertEqual(sorted(changedNames), sorted(diff))
+                    for nodeName in graph.nodeNames:
+                        path, value, bandwidth, hops = graph.getPathAndParamsNode(nodeName)
+                        self.assertEqual(hops, len(path) - 1 if hops != -1 else -1)
+
+    def test12_routeCache(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10.5)]}
+        for compact in (False, True):
+            graph = Graph(nodeAdjDict, False, logger, compact=compact)
+            reference = Graph(nodeAdjDict, False, logger, compact=compact)
+
+            # alternating roots and routing types are answered from the cache once routed
+            for _ in range(2):
+                for rootNm in ('a', 'e'):
+                    for routingType in Routing:
+                        graph.routeFromN1toN2(rootNm, 'd', routingType)
+                        reference.routeFromN1toN2(rootNm, 'd', routingType)
+                        reference.routeCache.clear()
+                        for nodeNm in nodeAdjDict.keys():
+                            self.assertEqual(graph.getPathAndParamsNode(nodeNm), reference.getPathAndParamsNode(nodeNm))
+            self.assertEqual((graph.routeCache.misses, graph.routeCache.hits, len(graph.routeCache)), (6, 6, 6))
+
+            # an explicit root and routing type doesn't re-route the graph
+            reference.routeFromN1toN2('a', 'd', Routing.bestBandwidth)
+            self.assertEqual(graph.getPathAndParamsNode('d', 'a', Routing.bestBandwidth),
+                             reference.getPathAndParamsNode('d'))
+            self.assertEqual(graph.getPathAndParamsNode('c', 'a'),
+                             graph.getPathAndParamsNode('c', 'a', Routing.minHopCount))
+            self.assertEqual(graph.rootNodeName, 'e')
+            self.assertEqual(graph.routeCache.misses, 6)
+
+            # a graph change drops the cached routes but the repaired current one
+            graph.removeEdge('b', 'd')
+            self.assertEqual(len(graph.routeCache), 1)
+            linkDown = {nodeName: [adj for adj in adjacencies if (nodeName, adj[0]) not in (('b', 'd'), ('d', 'b'))]
+                        for nodeName, adjacencies in nodeAdjDict.items()}
+            reference = Graph(linkDown, False, logger)
+            reference.routeFromN1toN2('a', 'd', Routing.leastCost)
+            self.assertEqual(graph.getPathAndParamsNode('d', 'a', Routing.leastCost),
+                             reference.getPathAndParamsNode('d'))
+            self.assertEqual(graph.routeCache.misses, 7)
+
+        # the least recently used routes are evicted to stay in the memory budget
+        graph = Graph(nodeAdjDict, True, logger, compact=True)
+        tableBytes = 4 * 8 * len(nodeAdjDict)
+        graph.routeCache.resize(2 * tableBytes)
+        self.assertEqual(sorted(graph.routeFromMany(['a', 'b', 'c'], Routing.minHopCount).keys()), ['a', 'b', 'c'])
+        self.assertEqual((len(graph.routeCache), graph.routeCache.nbytes, graph.routeCache.evictions),
+                         (2, 2 * tableBytes, 1))
+        graph.routeTableFrom('b', Routing.minHopCount)
+        graph.routeTableFrom('a', Routing.minHopCount)
+        self.assertEqual((graph.routeCache.hits, graph.routeCache.misses, graph.routeCache.evictions), (1, 4, 2))
+        graph.routeCache.resize(tableBytes - 1)
+        self.assertEqual((len(graph.routeCache), graph.routeCache.evictions), (0, 4))
+
+    def test13_quietExport(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10.5)]}
+
+        # a quiet graph prints no banner and prints paths without pausing
+        graph = Graph(nodeAdjDict, True, logger, quiet=True)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            graph.routeFromN1toN2('a', 'c', Routing.leastCost)
+            start = time.perf_counter()
+            graph.printPaths()
+            elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 0.05 * len(nodeAdjDict))
+        self.assertEqual(output.getvalue().count("\n"), len(nodeAdjDict))
+        self.assertNotIn("Graph Selected", output.getvalue())
+
+        # otherwise the banner names the routing type connected by a route, whatever built the topology first
+        loudGraph = Graph(nodeAdjDict, False, logger)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            loudGraph.kShortestPaths('a', 'c', Routing.bestBandwidth, 2)
+            loudGraph.routeFromMany(['a'], Routing.leastCost)
+            self.assertEqual(output.getvalue(), "")
+            loudGraph.routeFromN1toN2('a', 'c', Routing.bestBandwidth)
+        self.assertEqual(output.getvalue(), "Undirected Graph Selected based on Best-bandwidth: \n")
+
+        with tempfile.TemporaryDirectory() as tmpDir:
+            exportPath = os.path.join(tmpDir, "paths")
+            graph.exportPaths(exportPath)
+            with open(exportPath, newline="") as exportFile:
+                rows = list(csv.reader(exportFile))
+            self.assertEqual(rows[0], ["root", "node", "path", "cost", "bandwidth", "hops"])
+            self.assertEqual(rows[1:], [['a', nodeNm, " ".join(nodePath), str(cost), str(bw), str(hopCnt)]
+                                        for nodeNm, (nodePath, cost, bw, hopCnt)
+                                        in ((nodeNm, graph.getPathAndParamsNode(nodeNm)) for nodeNm in nodeAdjDict)])
+
+            # another root and routing type, answered from its route table, as JSON lines
+            graph.exportPaths(exportPath, "jsonl", 'f', Routing.bestBandwidth)
+            with open(exportPath) as exportFile:
+                records = [json.loads(line) for line in exportFile]
+            for nodeNm, record in zip(nodeAdjDict, records):
+                self.assertEqual((record["root"], record["node"]), ('f', nodeNm))
+                self.assertEqual((record["path"], record["cost"], record["bandwidth"], record["hops"]),
+                                 graph.getPathAndParamsNode(nodeNm, 'f', Routing.bestBandwidth))
+            self.assertEqual(records[6]["path"], ['f', 'g'])
+            self.assertEqual(graph.rootNodeName, 'a')
+
+            with self.assertRaises(AssertionError):
+                graph.exportPaths(exportPath, "xml")
+
+    def test14_bulkPaths(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        rand = random.Random(14)
+        names = ["n%i" % i for i in range(200)]
+        nodeAdjDict = {nodeName: [(rand.choice(names), rand.randint(1, 9)) for _ in range(2)] for nodeName in names}
+        for compact, engine in ((False, Engine.legacyBfs), (False, Engine.default), (True, Engine.default)):
+            graph = Graph(nodeAdjDict, True, logger, compact=compact, quiet=True)
+            # before routing every node is alone on its path
+            self.assertEqual(list(graph.iterPaths()), [(nodeNm, [nodeNm], -1, 999, -1) for nodeNm in names])
+            for routingType in Routing:
+                graph.routeFromN1toN2('n0', 'n1', routingType, engine)
+                bulkPaths = list(graph.iterPaths())
+                self.assertEqual(sorted(nodeNm for nodeNm, *params in bulkPaths), sorted(names))
+                generated = set()
+                for nodeNm, path, cost, bw, hopCnt in bulkPaths:
+                    self.assertEqual((path, cost, bw, hopCnt), graph.getPathAndParamsNode(nodeNm))
+                    self.assertTrue(len(path) == 1 or path[-2] in generated)  # tree-walk order from the root
+                    generated.add(nodeNm)
+                self.assertEqual(bulkPaths[0][0], 'n0')
+
+                parents = graph.parentArray()
+                for nodeNm, path, *params in bulkPaths:
+                    self.assertEqual(names[parents[graph.nodeIndex[nodeNm]]], path[-2] if len(path) > 1 else nodeNm)
+                with self.assertRaises(TypeError):
+                    parents[0] = 1
+
+        # another root from the route cache, and streamed to a file in tree-walk order
+        self.assertEqual(list(graph.iterPaths('n5', Routing.leastCost)),
+                         [(nodeNm, *graph.getPathAndParamsNode(nodeNm, 'n5', Routing.leastCost))
+                          for nodeNm, *params in graph.iterPaths('n5', Routing.leastCost)])
+        with tempfile.TemporaryDirectory() as tmpDir:
+            exportPath = os.path.join(tmpDir, "paths")
+            graph.exportPaths(exportPath, "jsonl", 'n5', Routing.leastCost, stream=True)
+            with open(exportPath) as exportFile:
+                records = [json.loads(line) for line in exportFile]
+            self.assertEqual([(record["node"], record["path"], record["cost"], record["bandwidth"], record["hops"])
+                              for record in records], list(graph.iterPaths('n5', Routing.leastCost)))
+
+    def test15_pointToPoint(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10.5)]}
+        graph = Graph(nodeAdjDict, True, logger, quiet=True)
+        self.assertEqual(graph.routePointToPoint('a', 'c', Routing.leastCost), (['a', 'b', 'c'], 8, 3, 2))
+        self.assertEqual(graph.routePointToPoint('e', 'a', Routing.bestBandwidth),
+                         (['e', 'd', 'c', 'b', 'a'], 42.0, 5.0, 4))
+        self.assertEqual(graph.routePointToPoint('a', 'f', Routing.minHopCount), (['f'], -1, 999, -1))
+        self.assertEqual(graph.routePointToPoint('d', 'd', Routing.leastCost), (['d'], 0, 999, 0))
+        self.assertEqual(graph.rootNodeName, "")
+
+        # the optimized value agrees with the full route, the path is a path of the graph with those values
+        optimised = {Routing.leastCost: 1, Routing.bestBandwidth: 2, Routing.minHopCount: 3}
+        for seed in range(40):
+            rand = random.Random(seed)
+            names = ["n%i" % i for i in range(rand.randint(2, 40))]
+            nodeAdjDict = {nodeName: [(rand.choice(names), rand.choice([0, 1, 2, 3, 4.5])) for _ in range(2)]
+                           for nodeName in names}
+            graph = Graph(nodeAdjDict, seed % 2 == 0, logger, compact=True, quiet=True)
+            for routingType in Routing:
+                topology = graph.compactTopology(routingType)
+                for _ in range(5):
+                    node1Name, node2Name = rand.choice(names), rand.choice(names)
+                    full = graph.getPathAndParamsNode(node2Name, node1Name, routingType)
+                    path, cost, bw, hopCnt = graph.routePointToPoint(node1Name, node2Name, routingType)
+                    self.assertEqual((path, cost, bw, hopCnt)[optimised[routingType]], full[optimised[routingType]])
+                    self.assertEqual(hopCnt == -1, full[3] == -1)
+                    if hopCnt == -1:
+                        continue
+                    self.assertEqual((path[0], path[-1], hopCnt), (node1Name, node2Name, len(path) - 1))
+                    edgeVals = [min((topology.weights[edge] for edge in range(topology.offsets[nodeIdx],
+                                                                             topology.offsets[nodeIdx + 1])
+                                     if topology.targets[edge] == adjNodeIdx),
+                                    key=lambda edgeVal: -edgeVal if routingType == Routing.bestBandwidth else edgeVal)
+                                for nodeIdx, adjNodeIdx in zip((graph.nodeIndex[nodeNm] for nodeNm in path),
+                                                               (graph.nodeIndex[nodeNm] for nodeNm in path[1:]))]
+                    if routingType != Routing.minHopCount:
+                        self.assertEqual((cost, bw), (sum(edgeVals), min([999] + edgeVals)))
+
+    def test16_profiling(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10.5)]}
+        graph = Graph(nodeAdjDict, True, logger, quiet=True)
+        graph.routeFromN1toN2('a', 'c', Routing.leastCost)
+        graph.getPathAndParamsNode()
+        self.assertEqual(graph.stats, {})  # off by default
+
+        graph.profiling = True
+        engines = [Engine.default, Engine.legacyBfs] + ([Engine.vectorised] if numpy is not None else [])
+        for engine in engines:
+            for routingType in Routing if engine != Engine.vectorised else [Routing.minHopCount]:
+                graph.routeCache.clear()
+                graph.routeFromN1toN2('a', 'c', routingType, engine)
+                stats = graph.stats
+                self.assertEqual((stats["engine"], stats["routingType"]), (engine.name, routingType.name))
+                for phase in ("validateSeconds", "connectSeconds", "routeSeconds", "applySeconds"):
+                    self.assertGreaterEqual(stats.get(phase, 0), 0)
+                self.assertFalse(stats["routeCacheHit"])
+                # a, b, c and d are reached: each is dequeued (plus stale heap entries) and its adjacencies relaxed
+                self.assertGreaterEqual(stats["nodesDequeued"], 4)
+                self.assertEqual(stats["edgesRelaxed"], 1 + 3 + 2 + 2)
+                self.assertGreaterEqual(stats["upstreamUpdates"], 3)
+                self.assertGreaterEqual(stats["peakQueueLength"], 1)
+                if engine == Engine.legacyBfs:
+                    self.assertEqual(stats["predecessorsScanned"], 1 + 3 + 2 + 3)
+                for nodeNm in nodeAdjDict.keys():
+                    graph.getPathAndParamsNode(nodeNm)
+                self.assertEqual(stats["pathsTraced"], len(nodeAdjDict))
+                self.assertGreater(stats["backtrackSeconds"], 0)
+                if engine == Engine.vectorised:  # each level's frontier is enqueued and dequeued once
+                    self.assertEqual((stats["nodesDequeued"], stats["upstreamUpdates"], stats["peakQueueLength"]),
+                                     (4, 3, 2))
+
+        # the sharded engine counts its shard queues; a node's edges are relaxed again after each label update
+        graph.shard(2)
+        try:
+            for routingType in Routing:
+                graph.routeCache.clear()
+                graph.routeFromN1toN2('a', 'c', routingType, Engine.sharded)
+                stats = graph.stats
+                self.assertFalse(stats["routeCacheHit"])
+                self.assertGreaterEqual(stats["nodesDequeued"], 4)
+                self.assertGreaterEqual(stats["edgesRelaxed"], 1 + 3 + 2 + 2)
+                self.assertGreaterEqual(stats["upstreamUpdates"], 3)
+                self.assertGreaterEqual(stats["peakQueueLength"], 1)
+        finally:
+            graph.closeShards()
+
+        # least-cost from a reaches every node over its final upstream node first, so nothing is dequeued twice
+        graph.routeCache.clear()
+        graph.routeFromN1toN2('a', 'c', Routing.leastCost)
+        self.assertEqual((graph.stats["nodesDequeued"], graph.stats["upstreamUpdates"]), (4, 3))
+        graph.routeFromN1toN2('a', 'c', Routing.leastCost)
+        self.assertTrue(graph.stats["routeCacheHit"])
+        self.assertNotIn("pathsTraced", graph.stats)
+
+    def test17_concurrentRouteResults(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        rand = random.Random(17)
+        names = ["n%i" % i for i in range(150)]
+        nodeAdjDict = {nodeName: [(rand.choice(names), rand.randint(1, 9)) for _ in range(3)] for nodeName in names}
+        for compact in (True, False):  # node objects are rewritten by every route, readers must not see it
+            graph = Graph(nodeAdjDict, False, logger, compact=compact, quiet=True)
+            topologies = {0: {routingType: graph.compactTopology(routingType) for routingType in Routing}}
+            optimised = {Routing.leastCost: "valueToRoot", Routing.bestBandwidth: "lowestBwPipeToRoot",
+                         Routing.minHopCount: "numHopsFromRoot"}
+            seen, reads, failures, done = [], [], [], threading.Event()
+
+            def writer():  # routes and changes the graph, recording the topologies of every version
+                writerRand = random.Random(1)
+                for step in range(150):
+                    if step % 3 == 0:
+                        graph.setEdge(writerRand.choice(names), writerRand.choice(names), writerRand.randint(1, 9))
+                    elif step % 3 == 1:
+                        graph.removeEdge(writerRand.choice(names), writerRand.choice(names))
+                    else:
+                        graph.routeFromN1toN2(writerRand.choice(names), 'n0', writerRand.choice(list(Routing)))
+                    topologies[graph.topologyVersion] = {routingType: graph.compactTopology(routingType)
+                                                         for routingType in Routing}
+                done.set()
+
+            def reader(readerSeed):  # reads the published route, or routes its own roots, while the writer runs
+                readerRand = random.Random(readerSeed)
+                try:
+                    while not done.is_set():
+                        if readerSeed % 3 == 2:  # the last route through the node name interface
+                            nodeNm = readerRand.choice(names)
+                            before = graph.routeResult()
+                            pathAndParams = graph.getPathAndParamsNode(nodeNm)
+                            if before is not None and graph.routeResult() is before:  # no route published meanwhile
+                                self.assertEqual(pathAndParams, before.getPathAndParams(nodeNm))
+                                reads.append(pathAndParams)
+                            continue
+                        if readerSeed % 3:
+                            result = graph.routeResult()
+                            if result is None:
+                                continue
+                        else:
+                            result = graph.routeResult(readerRand.choice(names), readerRand.choice(list(Routing)))
+                        for nodeNm in readerRand.sample(names, 5):
+                            path, cost, bw, hopCnt = result.getPathAndParams(nodeNm)
+                            self.assertEqual(path[0], result.root if hopCnt != -1 else nodeNm)
+                            self.assertEqual(len(path) - 1, hopCnt if hopCnt != -1 else 0)
+                        seen.append(result)
+                except Exception as error:
+                    failures.append(error)
+
+            switchInterval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-5)  # switch threads often
+            try:
+                threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader, args=(readerSeed,))
+                                                                for readerSeed in range(4)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                sys.setswitchinterval(switchInterval)
+
+            self.assertEqual(failures, [])
+            self.assertGreater(len(seen), 20)
+            self.assertGreater(len(reads), 20)
+            # every result is a whole route of the topology of its version
+            for result in seen:
+                full = routeTopology(topologies[result.topologyVersion][result.routingType],
+                                     graph.nodeIndex[result.root], result.routingType)
+                self.assertEqual(list(getattr(result.routeTable, optimised[result.routingType])),
+                                 list(getattr(full, optimised[result.routingType])))
+
+        # a reader arriving during a change waits on the write lock, instead of spinning, then routes the change
+        class CountingLock:
+            def __init__(self, lock):
+                self.lock, self.readerWaits = lock, 0
+
+            def __enter__(self):
+                if threading.current_thread() is not threading.main_thread():
+                    self.readerWaits += 1
+                return self.lock.__enter__()
+
+            def __exit__(self, *excInfo):
+                return self.lock.__exit__(*excInfo)
+
+        graph._writeLock = CountingLock(graph._writeLock)
+        results = []
+        with graph._editing():
+            graph.setEdge('n1', 'n2', 1)
+            thread = threading.Thread(target=lambda: results.append(graph.routeResult('n1', Routing.leastCost)))
+            thread.start()
+            thread.join(0.3)
+            self.assertTrue(thread.is_alive())
+            self.assertEqual(graph._writeLock.readerWaits, 1)
+        thread.join()
+        self.assertEqual(results[0].topologyVersion, graph.topologyVersion)
+        self.assertEqual(results[0].getPathAndParams('n2')[1], 1)
+
+    def test18_routeService(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        rand = random.Random(18)
+        names = ["n%i" % i for i in range(500)]
+        nodeAdjDict = {nodeName: [(rand.choice(names), rand.randint(1, 9)) for _ in range(3)] for nodeName in names}
+        graph = Graph(nodeAdjDict, True, logger, compact=True, quiet=True)
+
+        async def burst():
+            async with RouteService(graph, maxWorkers=2, maxPending=120) as service:
+                # a burst for two roots is answered by one route per root and routing type
+                queries = [(rootNm, destNm, routingType) for rootNm in ('n1', 'n2') for routingType in Routing
+                           for destNm in names[:20]]
+                answers = await asyncio.gather(*(service.query(*query) for query in queries))
+                for (rootNm, destNm, routingType), answer in zip(queries, answers):
+                    self.assertEqual(answer, graph.getPathAndParamsNode(destNm, rootNm, routingType))
+                self.assertEqual((service.routes, service.coalesced, service.pending), (6, 114, 0))
+                self.assertEqual(service.inFlight, {})
+
+                # back-pressure: beyond maxPending queries are refused straight away
+                answers = await asyncio.gather(*(service.query('n3', destNm, Routing.leastCost)
+                                                 for destNm in names[:130]), return_exceptions=True)
+                self.assertEqual([isinstance(answer, RouteServiceBusy) for answer in answers],
+                                 [False] * 120 + [True] * 10)
+                self.assertEqual(service.rejected, 10)
+
+                # the in-process client goes through the JSON wire format
+                client = InProcessRouteClient(service)
+                self.assertEqual(await client.route('n1', 'n7', Routing.bestBandwidth),
+                                 tuple(json.loads(json.dumps(graph.getPathAndParamsNode('n7', 'n1',
+                                                                                        Routing.bestBandwidth)))))
+                with self.assertRaises(AssertionError):
+                    await client.route('n1', 'nowhere', Routing.minHopCount)
+                service.maxPending = 0
+                with self.assertRaises(RouteServiceBusy):
+                    await client.route('n1', 'n7', Routing.minHopCount)
+
+        asyncio.run(burst())
+
+    def test19_alternatePaths(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # the shortest route s-a-b-t blocks a backup, the disjoint pair has to be s-b-t and s-a-t instead
+        nodeAdjDict = {'s': [('a', 1), ('b', 3)], 'a': [('s', 1), ('b', 1), ('t', 4)],
+                       'b': [('s', 3), ('a', 1), ('t', 1)], 't': [('a', 4), ('b', 1)], 'u': []}
+        graph = Graph(nodeAdjDict, False, logger, compact=True, quiet=True)
+        self.assertEqual(graph.kShortestPaths('s', 't', Routing.leastCost, 5),
+                         [(['s', 'a', 'b', 't'], 3, 1, 3), (['s', 'b', 't'], 4, 1, 2), (['s', 'a', 't'], 5, 1, 2),
+                          (['s', 'b', 'a', 't'], 8, 1, 3)])
+        self.assertEqual(graph.kShortestPaths('s', 't', Routing.minHopCount, 2)[1][3], 2)
+        self.assertEqual(graph.kShortestPaths('s', 'u', Routing.leastCost, 3), [])
+        for routingType in Routing:
+            for nodeDisjoint in (False, True):
+                self.assertEqual(graph.disjointPaths('s', 't', routingType, nodeDisjoint),
+                                 [(['s', 'b', 't'], 4, 1, 2), (['s', 'a', 't'], 5, 1, 2)])
+            self.assertEqual(graph.disjointPaths('s', 'u', routingType), [])
+        self.assertRaises(AssertionError, graph.kShortestPaths, 's', 't', Routing.leastCost, 0)
+
+        graph = Graph({'x': [('y', 2)], 'y': [('z', 3)], 'z': []}, True, logger, quiet=True)
+        self.assertEqual(graph.disjointPaths('x', 'z', Routing.bestBandwidth), [(['x', 'y', 'z'], 5, 2, 2)])
+        self.assertEqual(graph.kShortestPaths('x', 'z', Routing.bestBandwidth, 3), [(['x', 'y', 'z'], 5, 2, 2)])
+
+        def allPaths(nodeName, targetName, path):  # every loopless path by brute force
+            if nodeName == targetName:
+                yield list(path)
+            for adjName, _ in mergedAdjs[nodeName].items():
+                if adjName not in path:
+                    path.append(adjName)
+                    yield from allPaths(adjName, targetName, path)
+                    path.pop()
+
+        def links(path):
+            pathLinks = set(zip(path, path[1:]))
+            return pathLinks if directed else pathLinks | set(zip(path[1:], path))
+
+        # against every loopless path of small random graphs: the k best values and the best disjoint pair
+        for seed in range(60):
+            rand = random.Random(seed)
+            names = ["n%i" % i for i in range(rand.randint(2, 7))]
+            nodeAdjDict = {nodeName: [(adjName, rand.randint(1, 9))  # no parallel edges, those would be disjoint
+                                      for adjName in rand.sample(names, min(3, len(names)))] for nodeName in names}
+            directed = seed % 2 == 0
+            graph = Graph(nodeAdjDict, directed, logger, compact=True, quiet=True)
+            for routingType in Routing:
+                topology = graph.compactTopology(routingType)
+                mergedAdjs = {nodeName: {} for nodeName in names}
+                for nodeIdx, nodeName in enumerate(names):
+                    for edge in range(topology.offsets[nodeIdx], topology.offsets[nodeIdx + 1]):
+                        mergedAdjs[nodeName][names[topology.targets[edge]]] = topology.weights[edge]
+
+                def value(path):
+                    edgeVals = [mergedAdjs[nodeName][adjName] for nodeName, adjName in zip(path, path[1:])]
+                    if routingType == Routing.leastCost:
+                        return sum(edgeVals)
+                    return -min(edgeVals) if routingType == Routing.bestBandwidth else len(edgeVals)
+
+                node1Name, node2Name = rand.sample(names, 2)
+                paths = list(allPaths(node1Name, node2Name, [node1Name]))
+                routes = graph.kShortestPaths(node1Name, node2Name, routingType, 4)
+                self.assertEqual([value(path) for path, _, _, _ in routes], sorted(value(path) for path in paths)[:4])
+                self.assertEqual(len({tuple(path) for path, _, _, _ in routes}), len(routes))
+                for nodeDisjoint in (False, True):
+                    pairs = [(value(path1), value(path2), path1, path2) for path1 in paths for path2 in paths
+                             if path1 < path2 and not links(path1) & links(path2)
+                             and not (nodeDisjoint and set(path1[1:-1]) & set(path2[1:-1]))]
+                    routes = graph.disjointPaths(node1Name, node2Name, routingType, nodeDisjoint)
+                    self.assertEqual(len(routes), 2 if pairs else min(len(paths), 1))
+                    if not pairs:
+                        continue
+                    (path1, _, _, _), (path2, _, _, _) = routes
+                    self.assertIn(sorted([path1, path2]), [list(pair[2:]) for pair in pairs])
+                    if routingType == Routing.bestBandwidth:
+                        self.assertEqual(max(value(path1), value(path2)), min(max(pair[:2]) for pair in pairs))
+                    else:
+                        self.assertEqual(value(path1) + value(path2), min(sum(pair[:2]) for pair in pairs))
+
+    def test20_bandwidthConstrained(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # a-c-d is cheap but thin, a-b-d fat and dear, a-e-f-d fat and cheaper with a hop more
+        nodeAdjDict = {'a': [('b', 10), ('c', 1), ('e', 6)], 'b': [('d', 10)], 'c': [('d', 1)], 'd': [],
+                       'e': [('f', 6), ('f', 2)], 'f': [('d', 6)]}
+        for directed in (True, False):
+            graph = Graph(nodeAdjDict, directed, logger, compact=True, quiet=True)
+            self.assertEqual(graph.routeConstrained('a', 'd', 0), (['a', 'c', 'd'], 2, 1, 2))
+            self.assertEqual(graph.routeConstrained('a', 'd', 5), (['a', 'e', 'f', 'd'], 18, 6, 3))
+            self.assertEqual(graph.routeConstrained('a', 'd', 5, maxHops=2), (['a', 'b', 'd'], 20, 10, 2))
+            self.assertEqual(graph.routeConstrained('a', 'd', 5, maxHops=1), (['d'], -1, 999, -1))
+            self.assertEqual(graph.routeConstrained('a', 'd', 10.5), (['d'], -1, 999, -1))
+            self.assertEqual(graph.routeConstrained('b', 'b', 99), (['b'], 0, 999, 0))
+            self.assertEqual(graph.rootNodeName, "")
+
+            # thresholds between two edge values share a bucket, the filtered edges keep the wider parallel edge
+            self.assertIs(graph.bandwidthTopology(3), graph.bandwidthTopology(6))
+            self.assertEqual(sorted(graph.bandwidthTopology(3).weights * (2 if directed else 1)), [6] * 6 + [10] * 4)
+            self.assertEqual(list(graph.bandwidthTopologies), [1, None, 6])  # least recently used first
+            for minBw in range(20):
+                graph.bandwidthTopology(minBw)
+            self.assertEqual(list(graph.bandwidthTopologies), [1, 2, 6, 10, None])
+            graph.setEdge('c', 'd', 7)
+            self.assertEqual(list(graph.bandwidthTopologies), [])
+            self.assertEqual(graph.routeConstrained('a', 'd', 5), (['a', 'e', 'f', 'd'], 18, 6, 3))
+            graph.setEdge('a', 'c', 7)
+            self.assertEqual(graph.routeConstrained('a', 'd', 5), (['a', 'c', 'd'], 14, 7, 2))
+
+        # against every loopless path of small random graphs
+        for seed in range(60):
+            rand = random.Random(seed)
+            names = ["n%i" % i for i in range(rand.randint(2, 7))]
+            nodeAdjDict = {nodeName: [(rand.choice(names), rand.randint(1, 9)) for _ in range(rand.randint(0, 3))]
+                           for nodeName in names}
+            directed = seed % 2 == 0
+            graph = Graph(nodeAdjDict, directed, logger, compact=True, quiet=True)
+            arcs = {nodeName: [] for nodeName in names}
+            for nodeName in names:
+                for adjName, adjEdgeVal in nodeAdjDict[nodeName]:
+                    arcs[nodeName].append((adjName, adjEdgeVal))
+                    if not directed:
+                        arcs[adjName].append((nodeName, adjEdgeVal))
+
+            def costs(nodeName, targetName, path, cost):  # the cost of every loopless path within the limits
+                if nodeName == targetName:
+                    yield cost
+                elif maxHops is None or len(path) <= maxHops:
+                    for adjName, adjEdgeVal in arcs[nodeName]:
+                        if adjEdgeVal >= minBw and adjName not in path:
+                            yield from costs(adjName, targetName, path + [adjName], cost + adjEdgeVal)
+
+            for _ in range(5):
+                node1Name, node2Name = rand.choice(names), rand.choice(names)
+                minBw, maxHops = rand.choice([0, 3, 4.5, 7]), rand.choice([None, 1, 2, 3])
+                path, cost, bw, hopCnt = graph.routeConstrained(node1Name, node2Name, minBw, maxHops)
+                self.assertEqual(None if hopCnt == -1 else cost,
+                                 min(costs(node1Name, node2Name, [node1Name], 0), default=None))
+                if hopCnt > 0:
+                    self.assertEqual((path[0], path[-1], hopCnt), (node1Name, node2Name, len(path) - 1))
+                    self.assertGreaterEqual(bw, minBw)
+                    self.assertLessEqual(hopCnt, 99 if maxHops is None else maxHops)
+
+    def test21_shardedRouting(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        # the partitioner keeps the two rings apart and the shards balanced
+        ring = {"r%i" % i: [("r%i" % ((i + 1) % 8), 1)] for i in range(8)}
+        ring.update({"s%i" % i: [("s%i" % ((i + 1) % 8), 1)] for i in range(8)})
+        graph = Graph(ring, False, logger, compact=True, quiet=True)
+        parts = partitionTopology(graph.compactTopology(Routing.leastCost), 2)
+        self.assertEqual(len({parts[graph.nodeIndex["r%i" % i]] for i in range(8)}), 1)
+        self.assertEqual(sorted(parts), [0] * 8 + [1] * 8)
+        self.assertRaises(AssertionError, graph.routeFromN1toN2, "r0", "r1", Routing.leastCost, Engine.sharded)
+
+        # sharded routes optimize every node as well as a single process route, whatever the partition
+        optimised = {Routing.leastCost: 1, Routing.bestBandwidth: 2, Routing.minHopCount: 3}
+        for seed in range(8):
+            rand = random.Random(seed)
+            names = ["n%i" % i for i in range(rand.randint(2, 40))]
+            nodeAdjDict = {nodeName: [(rand.choice(names), rand.choice([0, 1, 2, 3.5, 7])) for _ in range(3)]
+                           for nodeName in names}
+            graph = Graph(nodeAdjDict, seed % 2 == 0, logger, compact=seed % 4 < 2, quiet=True)
+            single = Graph(nodeAdjDict, seed % 2 == 0, logger, compact=True, quiet=True)
+            if seed % 3 == 0:
+                graph.shard(3, partition={nodeName: rand.randrange(3) for nodeName in names})  # e.g. by region
+            else:
+                graph.shard(rand.randint(1, 4))
+            try:
+                for step in range(4):
+                    if step == 3:  # the shards follow graph changes
+                        graph.addNode("new")
+                        single.addNode("new")
+                        for changedGraph in (graph, single):
+                            changedGraph.setEdge(names[0], "new", 1)
+                            changedGraph.setEdge(names[-1], names[0], 0)
+                    for routingType in Routing:
+                        rootName = rand.choice(names)
+                        graph.routeFromN1toN2(rootName, rootName, routingType, Engine.sharded)
+                        single.routeFromN1toN2(rootName, rootName, routingType)
+                        for nodeName in single.nodeNames:
+                            path, cost, bw, hopCnt = graph.getPathAndParamsNode(nodeName)
+                            expected = single.getPathAndParamsNode(nodeName)
+                            self.assertEqual((path, cost, bw, hopCnt)[optimised[routingType]],
+                                             expected[optimised[routingType]])
+                            self.assertEqual(hopCnt == -1, expected[3] == -1)
+                            self.assertEqual(len(path) - 1, max(hopCnt, 0))
+            finally:
+                graph.closeShards()
+            self.assertIsNone(graph.shardOf)
+
+    def test22_contractionHierarchy(self):
+        logging.basicConfig(format='%(asctime)s %(name)-s - %(levelname)s - %(message)s', datefmt='%d-%b-%y %H:%M:%S')
+        logger = logging.getLogger("Graphing")
+        logger.setLevel(logging.CRITICAL)
+        print("\n")
+
+        nodeAdjDict = {'a': [('b', 3)], 'b': [('a', 5), ('c', 5), ('d', 9)], 'c': [('b', 23), ('d', 7)],
+                       'd': [('b', 1), ('c', 6)], 'e': [('d', 8)], 'f': [('g', 8)], 'g': [('f', 10.5)]}
+        graph = Graph(nodeAdjDict, True, logger, quiet=True)
+        graph.buildContractionHierarchy()
+        self.assertTrue(graph.contractionHierarchyUsed)
+        self.assertEqual(graph.routePointToPoint('a', 'c', Routing.leastCost), (['a', 'b', 'c'], 8, 3, 2))
+        self.assertEqual(graph.routePointToPoint('e', 'a', Routing.leastCost), (['e', 'd', 'b', 'a'], 14, 1, 3))
+        self.assertEqual(graph.routePointToPoint('a', 'f', Routing.leastCost), (['f'], -1, 999, -1))
+        self.assertEqual(graph.routePointToPoint('d', 'd', Routing.leastCost), (['d'], 0, 999, 0))
+
+        # the index dies with the topology it was built for, a saved one only loads for the same topology
+        with tempfile.TemporaryDirectory() as tmpDir:
+            hierarchyPath = os.path.join(tmpDir, "graph.hierarchy")
+            graph.saveContractionHierarchy(hierarchyPath)
+            graph.setEdge('a', 'c', 1)
+            self.assertIsNone(graph.contractionHierarchy)
+            self.assertEqual(graph.routePointToPoint('a', 'c', Routing.leastCost), (['a', 'c'], 1, 1, 1))
+            self.assertRaises(AssertionError, graph.loadContractionHierarchy, hierarchyPath)
+            graph = Graph(nodeAdjDict, True, logger, compact=True, quiet=True)
+            graph.loadContractionHierarchy(hierarchyPath, mmap=False)
+            self.assertEqual(graph.routePointToPoint('a', 'c', Routing.leastCost), (['a', 'b', 'c'], 8, 3, 2))
+
+        # indexed queries agree with the search, on grids and on random graphs with parallel edges and self loops
+        for seed in range(16):
+            rand = random.Random(seed)
+            if seed % 4 == 0:
+                side = rand.randint(2, 9)
+                names = ["%i,%i" % (row, col) for row in range(side) for col in range(side)]
+                nodeAdjDict = {"%i,%i" % (row, col): [("%i,%i" % ((row + 1) % side, col), rand.randint(1, 9)),
+                                                      ("%i,%i" % (row, (col + 1) % side), rand.randint(1, 9))]
+                               for row in range(side) for col in range(side)}
+            else:
+                names = ["n%i" % i for i in range(rand.randint(2, 60))]
+                nodeAdjDict = {nodeName: [(rand.choice(names), rand.choice([0, 1, 2, 3, 4.5]))
+                                          for _ in range(rand.randint(0, 4))] for nodeName in names}
+            graph = Graph(nodeAdjDict, seed % 2 == 0, logger, compact=True, quiet=True)
+            indexed = Graph(nodeAdjDict, seed % 2 == 0, logger, compact=seed % 3 == 0, quiet=True)
+            indexed.buildContractionHierarchy(coreDegree=rand.choice([2, 4, 16]))
+            with tempfile.TemporaryDirectory() as tmpDir:
+                if seed % 4 in (1, 2):  # directed and undirected
+                    hierarchyPath = os.path.join(tmpDir, "graph.hierarchy")
+                    indexed.saveContractionHierarchy(hierarchyPath)
+                    indexed = Graph(nodeAdjDict, seed % 2 == 0, logger, compact=True, quiet=True)
+                    indexed.loadContractionHierarchy(hierarchyPath)
+                topology = graph.compactTopology(Routing.leastCost)
+                for _ in range(20):
+                    node1Name, node2Name = rand.choice(names), rand.choice(names)
+                    expected = graph.routePointToPoint(node1Name, node2Name, Routing.leastCost)
+                    pathIdxs, cost, bw, hopCnt = contractionHierarchyRoute(indexed.contractionHierarchy,
+                                                                           graph.nodeIndex[node1Name],
+                                                                           graph.nodeIndex[node2Name])
+                    path = [graph.nodeNames[nodeIdx] for nodeIdx in pathIdxs]
+                    self.assertEqual(cost, expected[1])
+                    self.assertEqual(hopCnt == -1, expected[3] == -1)
+                    if hopCnt == -1:
+                        continue
+                    self.assertEqual((path[0], path[-1], hopCnt), (node1Name, node2Name, len(path) - 1))
+                    edgeVals = [min(topology.weights[edge] for edge in range(topology.offsets[nodeIdx],
+                                                                            topology.offsets[nodeIdx + 1])
+                                    if topology.targets[edge] == adjNodeIdx)
+                                for nodeIdx, adjNodeIdx in zip((graph.nodeIndex[nodeNm] for nodeNm in path),
+                                                               (graph.nodeIndex[nodeNm] for nodeNm in path[1:]))]
+                    self.assertEqual((cost, bw), (sum(edgeVals), min([999] + edgeVals)))
+                del indexed  # release the mapping before the directory goes
+
+        # a dense graph leaves a large core, slower to search than the graph: queries keep to the search
+        rand = random.Random(22)
+        names = ["n%i" % i for i in range(200)]
+        nodeAdjDict = {nodeName: [(rand.choice(names), rand.randint(1, 100)) for _ in range(6)] for nodeName in names}
+        graph = Graph(nodeAdjDict, False, logger, compact=True, quiet=True)
+        indexed = Graph(nodeAdjDict, False, logger, compact=True, quiet=True)
+        hierarchy = indexed.buildContractionHierarchy(coreDegree=4)
+        self.assertGreater(sum(hierarchy.inCore), HIERARCHY_CORE_SHARE * len(names))
+        self.assertFalse(indexed.contractionHierarchyUsed)
+        for _ in range(20):
+            node1Name, node2Name = rand.choice(names), rand.choice(names)
+            self.assertEqual(indexed.routePointToPoint(node1Name, node2Name, Routing.leastCost),
+                             graph.routePointToPoint(node1Name, node2Name, Routing.leastCost))
+            self.assertEqual(contractionHierarchyRoute(hierarchy, graph.nodeIndex[node1Name],
+                                                       graph.nodeIndex[node2Name])[1],
+                             graph.routePointToPoint(node1Name, node2Name, Routing.leastCost)[1])
+
 
 unittest.main(verbosity=2)